@@ -0,0 +1,42 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'room_snapshots',
+        sa.Column('room_id', sa.String(32), sa.ForeignKey('rooms.room_id', ondelete='CASCADE'), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('code', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('room_id', 'version', name='pk_room_snapshots')
+    )
+    op.create_table(
+        'room_edits',
+        sa.Column('room_id', sa.String(32), sa.ForeignKey('rooms.room_id', ondelete='CASCADE'), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('ops', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('room_id', 'version', name='pk_room_edits')
+    )
+    # every existing document becomes its room's version 0 snapshot
+    op.execute(
+        "INSERT INTO room_snapshots (room_id, version, code) "
+        "SELECT room_id, 0, code FROM rooms WHERE code IS NOT NULL AND code <> ''"
+    )
+
+
+def downgrade():
+    # keep each room's newest snapshot; edits logged after it cannot be replayed in SQL
+    op.execute(
+        "UPDATE rooms SET code = s.code FROM ("
+        "SELECT DISTINCT ON (room_id) room_id, code FROM room_snapshots ORDER BY room_id, version DESC"
+        ") AS s WHERE rooms.room_id = s.room_id"
+    )
+    op.drop_table('room_edits')
+    op.drop_table('room_snapshots')
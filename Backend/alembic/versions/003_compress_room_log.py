@@ -0,0 +1,39 @@
+from alembic import op
+import sqlalchemy as sa
+import zlib
+
+
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+# table -> its plain text column; large rows keep their text zlib-compressed in `compressed` instead
+TABLES = {'room_snapshots': 'code', 'room_edits': 'ops'}
+
+
+def upgrade():
+    for table, column in TABLES.items():
+        op.add_column(table, sa.Column('compressed', sa.LargeBinary(), nullable=True))
+        op.alter_column(table, column, existing_type=sa.Text(), nullable=True)
+        op.create_check_constraint(
+            f'ck_{table}_one_payload', table, f'({column} IS NULL) <> (compressed IS NULL)'
+        )
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table, column in TABLES.items():
+        # Postgres cannot inflate zlib itself, so compressed rows are rewritten from here
+        rows = bind.execute(sa.text(
+            f'SELECT room_id, version, compressed FROM {table} WHERE compressed IS NOT NULL'
+        )).fetchall()
+        for room_id, version, data in rows:
+            bind.execute(
+                sa.text(f'UPDATE {table} SET {column} = :text, compressed = NULL '
+                        'WHERE room_id = :room_id AND version = :version'),
+                {'text': zlib.decompress(data).decode('utf-8'), 'room_id': room_id, 'version': version},
+            )
+        op.drop_constraint(f'ck_{table}_one_payload', table, type_='check')
+        op.alter_column(table, column, existing_type=sa.Text(), nullable=False)
+        op.drop_column(table, 'compressed')
@@ -1,221 +1,194 @@
 # app/api/autocomplete.py
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import re
+from typing import AsyncIterator, Optional
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.document import Rope
+from app.core.metrics import registry
+from app.core.pool import PoolSaturated, WorkerPool
+from app.core.symbols import SymbolIndex
+from app.core.websocket_manager import RoomState, manager
+from app.services.suggestions.base import SuggestionEngine
+from app.services.suggestions.registry import get_engine, loaded_languages, resolve_language, suggest
+import asyncio
+import time
 
 router = APIRouter()
 
 class AutocompleteRequest(BaseModel):
-    code: str
+    # Either the whole document, or the room whose live document to use
+    code: Optional[str] = None
+    roomId: Optional[str] = None
+    # Room mode: the document version cursorPosition refers to (default: current)
+    version: Optional[int] = None
     cursorPosition: int
-    language: str = "python"
+    # Suggestion engine to use (default: the room's language, else python)
+    language: Optional[str] = None
 
 class AutocompleteResponse(BaseModel):
     suggestion: str
+    # Room mode: the document version the suggestion was computed against
+    version: Optional[int] = None
 
-# Common Python imports
-COMMON_IMPORTS = [
-    "os", "sys", "json", "datetime", "random", "math", "collections",
-    "itertools", "functools", "operator", "re", "pathlib", "typing"
-]
-
-# Common Python patterns
-PATTERNS = {
-    "import ": COMMON_IMPORTS[0],  # Default to first common import
-    "from ": "module import ",
-    "def ": "function_name():\n    pass",
-    "class ": "ClassName:\n    def __init__(self):\n        pass",
-    "if ": "condition:\n    pass",
-    "elif ": "condition:\n    pass",
-    "else:": "\n    pass",
-    "for ": "item in iterable:\n    pass",
-    "while ": "condition:\n    pass",
-    "try:": "\n    pass\nexcept Exception as e:\n    pass",
-    "with ": "open('file.txt') as f:\n    pass",
-    "async def ": "function_name():\n    return",
-    "lambda ": "x: x",
-    "@": "decorator\n",
-    "# ": "",  # Comment - no suggestion
-}
-
-def get_line_context(code: str, cursor: int) -> tuple[str, str, int]:
-    """Extract the current line and context around cursor."""
-    lines = code[:cursor].split('\n')
-    current_line = lines[-1] if lines else ""
-    before_lines = '\n'.join(lines[:-1]) if len(lines) > 1 else ""
-    line_number = len(lines) - 1
-    return current_line, before_lines, line_number
-
-def get_indentation(line: str) -> str:
-    """Get the indentation string for a line."""
-    return re.match(r'^(\s*)', line).group(1) if line else ""
-
-def detect_context(before_cursor: str, current_line: str) -> str:
-    """Detect what the user is trying to write based on context."""
-    stripped = current_line.rstrip()
-    
-    # Check for incomplete statements
-    if stripped.endswith("(") and not stripped.endswith("()"):
-        return ")"  # Complete parentheses
-    
-    if stripped.endswith("[") and not stripped.endswith("[]"):
-        return "]"  # Complete brackets
-    
-    if stripped.endswith("{") and not stripped.endswith("{}"):
-        return "}"  # Complete braces
-    
-    # Check for string quotes
-    if stripped.count('"') % 2 == 1 and not stripped.endswith('\\"'):
-        return '"'
-    if stripped.count("'") % 2 == 1 and not stripped.endswith("\\'"):
-        return "'"
-    
-    # Check for common patterns
-    for pattern, suggestion in PATTERNS.items():
-        if stripped.endswith(pattern) or stripped == pattern.rstrip():
+def get_cursor_window(code: str, cursor: int) -> tuple[str, bool]:
+    """
+    Return the current line up to the cursor, and whether it is the first line.
+    Only that line is touched: its start is found by searching back from the cursor,
+    so the cost doesn't grow with the size of the document.
+    """
+    line_start = code.rfind('\n', 0, cursor) + 1
+    return code[line_start:cursor], line_start == 0
+
+def get_rope_cursor_window(document: Rope, cursor: int) -> tuple[str, bool]:
+    """get_cursor_window for a room's rope; O(log n) plus the length of the line."""
+    line, _ = document.offset_to_line(cursor)
+    return document.substring(document.line_start(line), cursor), line == 0
+
+# Suggestions are a pure function of (language, first_line, current line); see suggest_for_line
+suggestion_cache = LRUCache(settings.AUTOCOMPLETE_CACHE_SIZE, settings.AUTOCOMPLETE_CACHE_TTL_S)
+
+# Longer lines are rare and mostly unique, so they skip the cache instead of crowding it
+CACHE_MAX_LINE = 256
+
+# The engines run here, off the event loop; the cache stays on the loop
+suggestion_pool = WorkerPool(
+    settings.AUTOCOMPLETE_EXECUTOR, settings.AUTOCOMPLETE_WORKERS, settings.AUTOCOMPLETE_MAX_PENDING
+)
+
+# end to end, per transport (http, ws); cancelled WS requests are not counted
+autocomplete_seconds = registry.histogram(
+    "autocomplete_request_seconds", "Autocomplete requests, until the answer is sent", ("transport",)
+)
+# one engine lookup: cache hit, computed on the pool, or given up (saturated, timeout)
+lookup_seconds = registry.histogram(
+    "autocomplete_lookup_seconds", "Suggestion lookups for one line, by outcome", ("outcome",)
+)
+
+async def suggest_for_line(current_line: str, first_line: bool, language: str | None = None) -> str:
+    """
+    Cached suggestion for the current line (up to the cursor). Empty, and not cached,
+    if the worker pool is saturated or misses AUTOCOMPLETE_DEADLINE_MS.
+    """
+    started = time.perf_counter()
+    language = resolve_language(language)
+    key = None
+    if len(current_line) <= CACHE_MAX_LINE:
+        # Trailing whitespace never changes the result: the rules look at the right-stripped
+        # line, and a whitespace-only line gets a fixed suggestion without indentation
+        key = (language, first_line, current_line.rstrip())
+        suggestion = suggestion_cache.get(key)
+        if suggestion is not None:
+            lookup_seconds.observe(time.perf_counter() - started, "cached")
             return suggestion
-    
-    # Check for incomplete function calls
-    if re.search(r'\w+\([^)]*$', stripped):
-        return ")"
-    
-    # Check for incomplete list/dict comprehensions
-    if re.search(r'\[.*for.*$', stripped):
-        return " in iterable]"
-    if re.search(r'\{.*for.*$', stripped):
-        return " in iterable}"
-    
-    # Check for incomplete operators
-    if stripped.endswith("=") and not stripped.endswith("==") and not stripped.endswith("!="):
-        return " value"
-    
-    # Check for incomplete comparisons
-    if stripped.endswith("and ") or stripped.endswith("or "):
-        return "condition"
-    
-    # Check for incomplete return/yield
-    if stripped.endswith("return ") or stripped.endswith("yield "):
-        return "value"
-    
-    # Check for incomplete raise
-    if stripped.endswith("raise "):
-        return "Exception('message')"
-    
-    # Check for incomplete assert
-    if stripped.endswith("assert "):
-        return "condition, 'message'"
-    
-    # Check for incomplete with statement
-    if stripped.endswith("with ") and "as" not in stripped:
-        return "open('file.txt') as f:"
-    
-    # Check for incomplete try/except
-    if stripped.endswith("try:"):
-        return "\n    pass\nexcept Exception as e:\n    pass"
-    
-    # Check for incomplete if/elif
-    if stripped.endswith("if ") or stripped.endswith("elif "):
-        return "condition:\n    pass"
-    
-    # Check for incomplete for loop
-    if stripped.endswith("for "):
-        return "item in iterable:\n    pass"
-    
-    # Check for incomplete while loop
-    if stripped.endswith("while "):
-        return "condition:\n    pass"
-    
-    # Check for incomplete class definition
-    if stripped.endswith("class "):
-        return "ClassName:\n    def __init__(self):\n        pass"
-    
-    # Check for incomplete function definition
-    if stripped.endswith("def ") or stripped.endswith("async def "):
-        return "function_name():\n    pass"
-    
-    # Check for incomplete import
-    if stripped.endswith("import "):
-        return COMMON_IMPORTS[0]
-    
-    if stripped.endswith("from "):
-        return "module import "
-    
-    # Check for decorator
-    if stripped.endswith("@"):
-        return "decorator\n"
-    
-    return None
 
-def get_smart_suggestion(code: str, cursor: int) -> str:
-    """Generate a smart suggestion based on code context."""
-    before_cursor = code[:cursor]
-    current_line, before_lines, line_num = get_line_context(code, cursor)
-    indentation = get_indentation(current_line)
-    
-    # Try to detect context
-    suggestion = detect_context(before_cursor, current_line)
-    
-    if suggestion:
-        # Apply indentation if suggestion spans multiple lines
-        if '\n' in suggestion:
-            lines = suggestion.split('\n')
-            indented_lines = [lines[0]] + [indentation + line for line in lines[1:]]
-            return '\n'.join(indented_lines)
-        return suggestion
-    
-    # Fallback: analyze the last few words
-    words = current_line.strip().split()
-    if not words:
-        # Empty line - suggest common patterns
-        if line_num == 0:
-            return "def main():\n    pass\n\nif __name__ == '__main__':\n    main()"
-        return "# Add your code here"
-    
-    last_word = words[-1].lower()
-    
-    # Keyword-based suggestions
-    keyword_suggestions = {
-        "if": " condition:\n    pass",
-        "elif": " condition:\n    pass",
-        "else": ":",
-        "for": " item in iterable:\n    pass",
-        "while": " condition:\n    pass",
-        "def": " function_name():\n    pass",
-        "class": " ClassName:\n    def __init__(self):\n        pass",
-        "try": ":",
-        "except": " Exception as e:\n    pass",
-        "finally": ":",
-        "with": " open('file.txt') as f:\n    pass",
-        "import": " os",
-        "from": " module import ",
-        "return": " value",
-        "yield": " value",
-        "raise": " Exception('message')",
-        "assert": " condition, 'message'",
-    }
-    
-    if last_word in keyword_suggestions:
-        suggestion = keyword_suggestions[last_word]
-        if '\n' in suggestion:
-            lines = suggestion.split('\n')
-            indented_lines = [lines[0]] + [indentation + line for line in lines[1:]]
-            return '\n'.join(indented_lines)
-        return suggestion
-    
-    # Default: no suggestion
+    try:
+        suggestion = await suggestion_pool.run(
+            suggest, language, current_line, first_line, timeout=settings.AUTOCOMPLETE_DEADLINE_MS / 1000
+        )
+    except PoolSaturated:
+        lookup_seconds.observe(time.perf_counter() - started, "saturated")
+        return ""
+    except asyncio.TimeoutError:
+        lookup_seconds.observe(time.perf_counter() - started, "timeout")
+        return ""
+    lookup_seconds.observe(time.perf_counter() - started, "computed")
+    if key is not None:
+        suggestion_cache.put(key, suggestion)
+    return suggestion
+
+def complete_identifier(index: SymbolIndex, current_line: str, engine: SuggestionEngine) -> str:
+    """Rest of a name defined in the document, if the line ends part-way through one."""
+    start = len(current_line)
+    while start and (current_line[start - 1].isalnum() or current_line[start - 1] == "_"):
+        start -= 1
+    word = current_line[start:]
+    # attribute names after "." aren't indexed
+    if len(word) < 2 or not word.isidentifier() or word in engine.RESERVED or current_line[start - 1:start] == ".":
+        return ""
+    for name in index.complete(word, limit=2):
+        if name != word:
+            return name[len(word):]
     return ""
 
+def room_cursor_window(room_state: RoomState, cursor: int, version: int | None = None) -> tuple[str, bool] | None:
+    """
+    get_cursor_window against a room's live document. `cursor` is an offset in
+    `version` (default: the current one) and is mapped forward over newer edits.
+    Returns None if that version is too old to map.
+    """
+    if version is not None and version != room_state.version:
+        cursor = room_state.history.rebase_offset(version, cursor)
+        if cursor is None:
+            return None
+    return get_rope_cursor_window(room_state.document, cursor)
+
+async def iter_room_suggestions(
+    room_state: RoomState, current_line: str, first_line: bool, language: str | None = None
+) -> AsyncIterator[str]:
+    """Non-empty suggestions for a room's cursor line, best and cheapest first."""
+    language = language or room_state.language
+    # Names the users defined beat the generic rules while a word is being typed
+    completion = complete_identifier(await room_state.symbol_index(), current_line, get_engine(language))
+    if completion:
+        yield completion
+    suggestion = await suggest_for_line(current_line, first_line, language)
+    if suggestion.strip():
+        yield suggestion
+
+async def get_smart_suggestion(code: str, cursor: int, language: str | None = None) -> str:
+    """Generate a smart suggestion based on code context."""
+    current_line, first_line = get_cursor_window(code, cursor)
+    return await suggest_for_line(current_line, first_line, language)
+
 @router.post("/autocomplete", response_model=AutocompleteResponse)
 async def autocomplete(req: AutocompleteRequest):
-    """Enhanced autocomplete with context-aware suggestions."""
-    code = req.code or ""
-    cursor = req.cursorPosition or len(code)
+    """
+    Enhanced autocomplete with context-aware suggestions.
+
+    With `roomId`, the suggestion is computed against the room's in-memory document,
+    so the client doesn't need to upload it. `cursorPosition` is taken in `version`
+    and mapped onto the current version if edits have landed since. If the room isn't
+    held by this worker, `code` is used when given.
+
+    `language` picks the suggestion engine (python, javascript, typescript, go; other
+    languages only get brackets and quotes closed). Rooms default to their own language.
+
+    Suggestions are computed on a worker pool (AUTOCOMPLETE_EXECUTOR) so slow analysis
+    never stalls the WebSockets on this worker. When the pool is full or too slow the
+    suggestion is empty.
+    """
+    started = time.perf_counter()
+    try:
+        room_state = manager.get(req.roomId) if req.roomId else None
+
+        if room_state is not None:
+            window = room_cursor_window(room_state, req.cursorPosition, req.version)
+            if window is None:
+                raise HTTPException(status_code=409, detail="Document version is no longer available")
+            suggestions = iter_room_suggestions(room_state, *window, req.language)
+            suggestion = await anext(suggestions, "")
+            await suggestions.aclose()
+            return {"suggestion": suggestion, "version": room_state.version}
+
+        if req.code is None:
+            raise HTTPException(status_code=404, detail="Room not loaded; send the code instead")
+
+        code = req.code
+        cursor = req.cursorPosition or len(code)
     
-    suggestion = get_smart_suggestion(code, cursor)
+        suggestion = await get_smart_suggestion(code, cursor, req.language)
     
-    # If no suggestion found, provide a helpful default
-    if suggestion and suggestion.strip() != "":
-        return {"suggestion": suggestion}
+        # If no suggestion found, provide a helpful default
+        if suggestion and suggestion.strip() != "":
+            return {"suggestion": suggestion}
     
-    # Otherwise, return empty string (no suggestion)
-    return {"suggestion": ""}
+        # Otherwise, return empty string (no suggestion)
+        return {"suggestion": ""}
+    finally:
+        autocomplete_seconds.observe(time.perf_counter() - started, "http")
+
+@router.get("/autocomplete/stats")
+async def autocomplete_stats():
+    """Suggestion cache and worker pool counters and the engines loaded so far, for monitoring."""
+    return {**suggestion_cache.stats(), "engines": loaded_languages(), "pool": suggestion_pool.stats()}
@@ -0,0 +1,45 @@
+# app/api/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.api.autocomplete import suggestion_cache, suggestion_pool
+from app.core.metrics import registry
+from app.core.websocket_manager import manager
+from app.services.rooms import room_directory
+
+router = APIRouter()
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry.stats_collector("room_manager", "Room manager", manager.stats)
+registry.stats_collector("persist", "Write-behind flusher", manager.flusher.stats)
+registry.stats_collector("room_directory", "Room directory cache", room_directory.stats)
+registry.stats_collector("autocomplete_cache", "Suggestion cache", suggestion_cache.stats)
+registry.stats_collector("autocomplete_pool", "Suggestion worker pool", suggestion_pool.stats)
+
+
+@registry.collector
+def _connection_metrics():
+    # only rooms someone is connected to, so idle rooms don't leave a series each
+    rooms = [room for room in manager.rooms.values() if room.connections]
+    yield "ws_room_connections", "gauge", "WebSocket connections per room on this worker", [
+        ({"room": room.room_id}, len(room.connections)) for room in rooms
+    ]
+    outboxes = [connection.outbox for room in rooms for connection in room.connections.values()]
+    yield "ws_send_queue_frames", "gauge", "Frames queued and not yet written, over all connections", [
+        ({}, sum(len(outbox.queue) for outbox in outboxes))
+    ]
+    yield "ws_send_overflows", "gauge", "Times a connection's queue hit its high-water mark, over open connections", [
+        ({}, sum(outbox.overflows for outbox in outboxes))
+    ]
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Metrics of this worker in the Prometheus text format. Counters and histograms are
+    kept as the events happen; everything else is read off current state here, so
+    nothing is computed unless something scrapes. With several workers, each one
+    reports only its own rooms and connections.
+    """
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -1,9 +1,10 @@
 # app/api/rooms.py
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.core.websocket_manager import manager
-from app.services.rooms import get_room_by_room_id, get_room_code  # helpers
+from app.services.rooms import load_document, lookup_room, lookup_rooms, room_directory  # helpers
+from app.schemas.room import MAX_BATCH_LOOKUP, RoomBatchResponse
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -13,13 +14,32 @@ class RoomResponse(BaseModel):
     code: str
     language: str | None = "python"
 
+@router.get("/rooms", response_model=RoomBatchResponse)
+async def get_rooms(ids: str = Query(..., description="Comma-separated room ids"), db: AsyncSession = Depends(get_db)):
+    """Metadata (no code) of many rooms at once, answered from the room cache and one query."""
+    room_ids = list(dict.fromkeys(room_id for room_id in (part.strip() for part in ids.split(",")) if room_id))
+    if len(room_ids) > MAX_BATCH_LOOKUP:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_LOOKUP} room ids per request")
+
+    rooms = await lookup_rooms(db, room_ids)
+    return {
+        "rooms": [{"roomId": room_id, "language": room.language} for room_id, room in rooms.items() if room],
+        "missing": [room_id for room_id, room in rooms.items() if not room],
+    }
+
+@router.get("/rooms/stats")
+async def room_stats():
+    """Rooms held in memory by this worker, join and eviction counters and the room cache, for monitoring."""
+    return {**manager.stats(), "directory": room_directory.stats()}
+
 @router.get("/rooms/{room_id}", response_model=RoomResponse)
 async def get_room(room_id: str, db: AsyncSession = Depends(get_db)):
-    # check DB existence
-    room = await get_room_by_room_id(db, room_id)
+    # existence and language from the room directory cache when possible
+    room = await lookup_room(db, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
 
-    # prefer in-memory code if present
-    code = manager.get_code(room_id) or room.code or ""
+    # prefer in-memory code if present; otherwise rebuild it from the snapshot and edit log
+    room_state = manager.get(room_id)
+    code = room_state.code if room_state else (await load_document(db, room_id)).code
     return {"roomId": room_id, "code": code, "language": room.language}
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends
-from app.services.rooms import create_room
-from app.schemas.room import RoomCreateResponse
+from app.services.rooms import create_room, create_rooms
+from app.schemas.room import RoomBulkCreateRequest, RoomBulkCreateResponse, RoomCreateResponse
 from app.db.session import AsyncSessionLocal
 
 router = APIRouter()
@@ -15,3 +15,10 @@ async def get_db():
 async def create_room_endpoint(db=Depends(get_db)):
     room_id = await create_room(db)
     return RoomCreateResponse(roomId=room_id)
+
+
+@router.post("/rooms/bulk", response_model=RoomBulkCreateResponse)
+async def create_rooms_endpoint(request: RoomBulkCreateRequest, db=Depends(get_db)):
+    """Provision up to MAX_BULK_ROOMS rooms in one transaction."""
+    room_ids = await create_rooms(db, request.count, request.language)
+    return RoomBulkCreateResponse(roomIds=room_ids)
@@ -1,38 +1,87 @@
 # app/api/websocket.py
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.core.websocket_manager import manager
+from app.api.autocomplete import autocomplete_seconds, iter_room_suggestions, room_cursor_window
+from app.core.codec import ProtocolError, decode_client_message, negotiate, receive_frame
+from app.core.compression import COMPRESS_MIN_LENGTH, compress_for_wire
+from app.core.metrics import registry
+from app.core.outbox import Outbox
+from app.core.pubsub import BusUnavailable
+from app.core.websocket_manager import RoomState, manager
 from app.db.session import AsyncSessionLocal
-from app.services.rooms import save_room_code, get_room_code
-from datetime import datetime
+from app.schemas.websocket import AutocompleteRequestPayload
+from app.services.rooms import StoredDocument, load_document, lookup_room
 
-import json
+import asyncio
 import logging
+import time
 import uuid
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-async def send_message(websocket: WebSocket, message: dict):
-    """Helper to send a properly formatted message."""
+messages_received = registry.counter("ws_messages_received_total", "Valid WebSocket messages from clients", ("type",))
+messages_rejected = registry.counter("ws_messages_rejected_total", "Client frames answered with an ERROR", ("code",))
+
+def send_message(outbox: Outbox, message: dict):
+    """Helper to queue a properly formatted message on a connection."""
     try:
-        await websocket.send_text(json.dumps(message))
+        outbox.send_message(message)
     except Exception as e:
         logger.exception("Failed to send message: %s", e)
 
-async def send_error(websocket: WebSocket, room_id: str, message: str, code: str = "UNKNOWN_ERROR"):
+def send_error(outbox: Outbox, room_id: str, message: str, code: str = "UNKNOWN_ERROR", payload: dict | None = None):
     """Send an error message to the client."""
     error_msg = {
         "type": "ERROR",
         "roomId": room_id,
-        "payload": {},
+        "payload": payload or {},
         "message": message,
         "code": code
     }
-    await send_message(websocket, error_msg)
+    send_message(outbox, error_msg)
+
+async def stream_autocomplete(outbox: Outbox, room_state: RoomState, request: AutocompleteRequestPayload):
+    """
+    Answer an AUTOCOMPLETE_REQUEST with one AUTOCOMPLETE_RESULT per suggestion, as each
+    is found; the last one has done=true. Between results it yields to the event loop,
+    which is where a newer request from the same client cancels it.
+    """
+    room_id = room_state.room_id
+    started = time.perf_counter()
+    try:
+        window = room_cursor_window(room_state, request.cursor, request.version)
+        if window is None:
+            send_error(outbox, room_id, "Document version is no longer available", "STALE_VERSION",
+                       {"requestId": request.requestId})
+            return
+
+        version = room_state.version
+
+        def result(suggestion: str, done: bool) -> dict:
+            return {
+                "type": "AUTOCOMPLETE_RESULT",
+                "roomId": room_id,
+                "payload": {"requestId": request.requestId, "suggestion": suggestion, "version": version, "done": done}
+            }
+
+        # held back one step so the last result can carry done=true
+        previous = None
+        async for suggestion in iter_room_suggestions(room_state, *window, request.language):
+            if previous is not None:
+                send_message(outbox, result(previous, False))
+            previous = suggestion
+            await asyncio.sleep(0)
+        send_message(outbox, result(previous or "", True))
+        autocomplete_seconds.observe(time.perf_counter() - started, "ws")
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Autocomplete failed for room %s", room_id)
+        send_error(outbox, room_id, "Autocomplete failed", "AUTOCOMPLETE_FAILED", {"requestId": request.requestId})
 
 @router.websocket("/ws/{room_id}")
-async def websocket_endpoint(websocket: WebSocket, room_id: str):
+async def websocket_endpoint(websocket: WebSocket, room_id: str, compress: str | None = None):
     """
     WebSocket endpoint for realtime code editing.
     
@@ -40,133 +89,149 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
     
     Client Messages:
     - CODE_UPDATE: {"type": "CODE_UPDATE", "roomId": "...", "payload": {"code": "...", "cursor": 22}}
+    - CODE_PATCH: {"type": "CODE_PATCH", "roomId": "...", "payload": {"version": 3, "edits": [{"offset": 10, "deleteLength": 0, "insertText": "x"}], "cursor": 11}}
     - CURSOR_UPDATE: {"type": "CURSOR_UPDATE", "roomId": "...", "payload": {"cursor": 22, "selectionStart": 10, "selectionEnd": 20}}
+    - AUTOCOMPLETE_REQUEST: {"type": "AUTOCOMPLETE_REQUEST", "roomId": "...", "payload": {"requestId": "7", "cursor": 48, "version": 12, "language": "python"}}
     - PING: {"type": "PING", "roomId": "...", "payload": {}}
     
     Server Messages:
-    - INIT: {"type": "INIT", "roomId": "...", "payload": {"code": "...", "cursor": 0}, "connectionCount": 1}
-    - CODE_UPDATE: {"type": "CODE_UPDATE", "roomId": "...", "payload": {"code": "...", "cursor": 22}, "timestamp": "..."}
-    - CURSOR_UPDATE: {"type": "CURSOR_UPDATE", "roomId": "...", "payload": {"cursor": 22}, "userId": "..."}
+    - INIT: {"type": "INIT", "roomId": "...", "payload": {"code": "...", "cursor": 0, "version": 3}, "connectionCount": 1, "userId": "..."}
+    - CODE_UPDATE: {"type": "CODE_UPDATE", "roomId": "...", "payload": {"code": "...", "cursor": 22, "version": 4}, "timestamp": "..."}
+    - CODE_PATCH: {"type": "CODE_PATCH", "roomId": "...", "payload": {"version": 4, "edits": [...], "cursor": 11}, "userId": "...", "timestamp": "..."}
+    - CODE_PATCH_ACK: {"type": "CODE_PATCH_ACK", "roomId": "...", "payload": {"version": 4}}
+    - SNAPSHOT: {"type": "SNAPSHOT", "roomId": "...", "payload": {"code": "...", "version": 4}}
+    - CURSOR_BATCH: {"type": "CURSOR_BATCH", "roomId": "...", "payload": {"cursors": [{"userId": "...", "cursor": 22, "selectionStart": null, "selectionEnd": null}]}}
+    - AUTOCOMPLETE_RESULT: {"type": "AUTOCOMPLETE_RESULT", "roomId": "...", "payload": {"requestId": "7", "suggestion": "...", "version": 13, "done": true}}
     - USER_JOINED: {"type": "USER_JOINED", "roomId": "...", "payload": {}, "connectionCount": 2}
     - USER_LEFT: {"type": "USER_LEFT", "roomId": "...", "payload": {}, "connectionCount": 1}
     - ERROR: {"type": "ERROR", "roomId": "...", "payload": {}, "message": "...", "code": "..."}
     - PONG: {"type": "PONG", "roomId": "...", "payload": {}}
+
+    CODE_PATCH carries only the edits. The payload version is the document version the
+    edits were made against; the broadcast carries the version they produced. Patches
+    against an older version are rebased over the edits they missed (see app/core/ot.py),
+    so the broadcast edits may differ from the ones sent. A patch too old to rebase gets
+    a SNAPSHOT instead.
+
+    AUTOCOMPLETE_REQUEST is answered from the room's live document. Results stream back
+    as they are found, and a new request cancels the one still in flight, whose
+    remaining results are never sent.
+
+    Framing is negotiated with Sec-WebSocket-Protocol: "pairprog.msgpack" sends the same
+    messages as MessagePack in binary frames, "pairprog.json" or no subprotocol is JSON
+    in text frames. Every client message is validated against app/schemas/websocket.py.
+
+    Connecting with ?compress=zlib opts into a compressed INIT for large documents: the
+    payload then has "encoding" ("zlib", raw bytes in MessagePack, or "zlib-base64" in
+    JSON) and "code" holds the compressed UTF-8 text.
     """
     # Generate a unique user ID for this connection
     user_id = str(uuid.uuid4())[:8]
     
-    # Accept the connection
-    await websocket.accept()
-    logger.info("WebSocket connection accepted: room=%s, user=%s", room_id, user_id)
-
-    # Create a database session for this WebSocket connection
-    async with AsyncSessionLocal() as db:
-        # Fetch current code from in-memory cache or DB fallback
-        room_state = manager.get(room_id)
-        if not room_state:
-            # Try DB
-            code = await get_room_code(db, room_id)
-            room_state = manager.get_or_create(room_id, code or "")
-
-        # Register connection
-        connection_count_before = len(room_state.connections)
-        room_state.connections.add(websocket)
-        connection_count_after = len(room_state.connections)
-        
-        logger.info("WebSocket connected: room=%s, user=%s, connections=%d", 
-                   room_id, user_id, connection_count_after)
+    # Accept the connection with the first framing the client offered that we support
+    codec, subprotocol = negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+    logger.info("WebSocket connection accepted: room=%s, user=%s, codec=%s", room_id, user_id, codec.name)
 
-        # Send INIT message with current code
-        try:
-            init_message = {
-                "type": "INIT",
-                "roomId": room_id,
-                "payload": {
-                    "code": room_state.code,
-                    "cursor": 0
-                },
-                "connectionCount": connection_count_after
-            }
-            await send_message(websocket, init_message)
-        except Exception as e:
-            logger.exception("Failed to send init message: %s", e)
-
-        # Notify other users that someone joined (if not the first connection)
-        if connection_count_before > 0:
-            user_joined_msg = {
-                "type": "USER_JOINED",
-                "roomId": room_id,
-                "payload": {"userId": user_id},
-                "connectionCount": connection_count_after
-            }
-            await room_state.broadcast(user_joined_msg, exclude=websocket)
+    async def load_room() -> tuple[StoredDocument, str | None]:
+        # Borrow a connection only for the load; the socket itself holds none
+        async with AsyncSessionLocal() as db:
+            room = await lookup_room(db, room_id)
+            if room is None:
+                return StoredDocument("", 0, 0, persisted=False), None
+            return await load_document(db, room_id), room.language
+
+    # In-memory room (possibly synced from another worker) or DB fallback; sockets joining
+    # the same cold room at once share one load
+    try:
+        room_state = await manager.join(room_id, load_room)
+    except BusUnavailable as e:
+        # can't sync with the other workers; 1013 tells the client to try again later
+        logger.warning("Could not join room %s: %s", room_id, e)
+        await websocket.close(code=1013)
+        return
 
+    # Clients that ask (?compress=zlib) get a large document compressed in INIT. Done before
+    # registering, so nothing is broadcast to this socket ahead of INIT; if an edit lands
+    # meanwhile the plain document goes out instead.
+    compressed, compressed_version = None, None
+    if compress == "zlib" and len(room_state.document) >= COMPRESS_MIN_LENGTH:
+        compressed_version = room_state.version
         try:
-            while True:
-                text = await websocket.receive_text()
-                try:
-                    data = json.loads(text)
-                except json.JSONDecodeError:
-                    await send_error(websocket, room_id, "Invalid JSON format", "INVALID_JSON")
-                    continue
+            compressed = await asyncio.to_thread(compress_for_wire, room_state.code, codec.binary)
+        except BaseException:
+            # the room stays pinned until we connect or let go of it
+            manager.release_join(room_id)
+            raise
+
+    # Register connection
+    # Everything for this socket goes through its outbox so frames stay in order
+    connection = manager.connect(room_state, websocket, user_id, codec)
+    outbox = connection.outbox
+    connection_count_after = room_state.connection_count
+    
+    logger.info("WebSocket connected: room=%s, user=%s, connections=%d", 
+               room_id, user_id, connection_count_after)
 
-                # Validate message structure
-                if not isinstance(data, dict):
-                    await send_error(websocket, room_id, "Message must be a JSON object", "INVALID_MESSAGE")
-                    continue
+    # Send INIT message with current code
+    version = room_state.version
+    try:
+        payload = {"code": room_state.code, "cursor": 0, "version": version}
+        if compressed and compressed_version == version:
+            payload.update(compressed)
+        init_message = {
+            "type": "INIT",
+            "roomId": room_id,
+            "payload": payload,
+            "connectionCount": connection_count_after,
+            "userId": user_id
+        }
+        send_message(outbox, init_message)
+    except Exception as e:
+        logger.exception("Failed to send init message: %s", e)
 
-                msg_type = data.get("type")
-                msg_room_id = data.get("roomId")
+    # Notify other users (on every worker) that someone joined
+    await manager.announce_join(room_id, user_id, version)
 
-                # Validate room ID matches
-                if msg_room_id != room_id:
-                    await send_error(websocket, room_id, f"Room ID mismatch. Expected {room_id}, got {msg_room_id}", "ROOM_ID_MISMATCH")
-                    continue
+    # At most one autocomplete in flight per connection; a newer request cancels it
+    autocomplete_task: asyncio.Task | None = None
 
-                payload = data.get("payload", {})
+    try:
+        while True:
+            frame = await receive_frame(websocket)
+            connection.seen()
+            try:
+                # Decoded with this connection's codec and checked against the schemas
+                msg_type, payload = decode_client_message(codec, frame, room_id)
+            except ProtocolError as e:
+                messages_rejected.inc(e.code)
+                send_error(outbox, room_id, e.message, e.code)
+                continue
+            messages_received.inc(msg_type)
 
+            try:
                 if msg_type == "CODE_UPDATE":
-                    new_code = payload.get("code", "")
-                    cursor = payload.get("cursor")
-                    
-                    # Update in-memory state
-                    await manager.update_code(room_id, new_code)
-
-                    # Broadcast to others in same room
-                    code_update_msg = {
-                        "type": "CODE_UPDATE",
-                        "roomId": room_id,
-                        "payload": {
-                            "code": new_code,
-                            "cursor": cursor
-                        },
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
-                    await room_state.broadcast(code_update_msg, exclude=websocket)
-                    
-                    # Persist code to DB (async, don't block)
-                    try:
-                        await save_room_code(db, room_id, new_code)
-                    except Exception:
-                        logger.exception("Failed to save room code to DB")
+                    # Applied and broadcast to others in the same room, on every worker,
+                    # in bus order; persisted by the manager's write-behind flusher
+                    await manager.update_code(room_id, payload.code, user_id, payload.cursor)
+
+                elif msg_type == "CODE_PATCH":
+                    # The sender gets CODE_PATCH_ACK (or a SNAPSHOT), the others only the delta
+                    edits = [(e.offset, e.deleteLength, e.insertText) for e in payload.edits]
+                    await manager.apply_patch(room_id, user_id, payload.version, edits, payload.cursor)
 
                 elif msg_type == "CURSOR_UPDATE":
-                    cursor = payload.get("cursor")
-                    selection_start = payload.get("selectionStart")
-                    selection_end = payload.get("selectionEnd")
-                    
-                    # Broadcast cursor position to others
-                    cursor_update_msg = {
-                        "type": "CURSOR_UPDATE",
-                        "roomId": room_id,
-                        "payload": {
-                            "cursor": cursor,
-                            "selectionStart": selection_start,
-                            "selectionEnd": selection_end
-                        },
-                        "userId": user_id
-                    }
-                    await room_state.broadcast(cursor_update_msg, exclude=websocket)
+                    # Coalesced per user and broadcast as a CURSOR_BATCH at CURSOR_FLUSH_HZ
+                    await manager.move_cursor(room_id, user_id, {
+                        "cursor": payload.cursor,
+                        "selectionStart": payload.selectionStart,
+                        "selectionEnd": payload.selectionEnd
+                    })
+
+                elif msg_type == "AUTOCOMPLETE_REQUEST":
+                    if autocomplete_task is not None and not autocomplete_task.done():
+                        autocomplete_task.cancel()
+                    autocomplete_task = asyncio.create_task(stream_autocomplete(outbox, room_state, payload))
 
                 elif msg_type == "PING":
                     # Respond to ping with pong
@@ -175,47 +240,45 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
                         "roomId": room_id,
                         "payload": {}
                     }
-                    await send_message(websocket, pong_msg)
+                    send_message(outbox, pong_msg)
 
                 else:
-                    await send_error(websocket, room_id, f"Unknown message type: {msg_type}", "UNKNOWN_MESSAGE_TYPE")
-
-        except WebSocketDisconnect:
-            # Remove connection
-            manager.remove_connection(room_id, websocket)
-            connection_count_after = manager.connection_count(room_id)
-            
-            logger.info("WebSocket disconnected: room=%s, user=%s, connections=%d", 
-                       room_id, user_id, connection_count_after)
-
-            # Notify other users that someone left
-            if connection_count_after > 0:
-                user_left_msg = {
-                    "type": "USER_LEFT",
-                    "roomId": room_id,
-                    "payload": {"userId": user_id},
-                    "connectionCount": connection_count_after
-                }
-                await room_state.broadcast(user_left_msg, exclude=None)
-
-            # If this was the last connection for this room, persist the code to DB
-            if connection_count_after == 0:
-                current_code = manager.get_code(room_id)
-                try:
-                    await save_room_code(db, room_id, current_code)
-                    logger.info("Saved room %s code to DB on last disconnect", room_id)
-                except Exception:
-                    logger.exception("Failed to save room code to DB")
-
-        except Exception as e:
-            # Any other error
-            manager.remove_connection(room_id, websocket)
-            logger.exception("Websocket endpoint error for room %s, user %s", room_id, user_id)
-            
-            connection_count_after = manager.connection_count(room_id)
+                    send_error(outbox, room_id, f"Unknown message type: {msg_type}", "UNKNOWN_MESSAGE_TYPE")
+
+            except BusUnavailable as e:
+                # Not applied on any worker; the socket stays open
+                logger.warning("Dropped %s from user %s in room %s: %s", msg_type, user_id, room_id, e)
+                if msg_type in ("CODE_UPDATE", "CODE_PATCH"):
+                    send_error(outbox, room_id, "Edit not applied, please retry", "BUS_UNAVAILABLE")
+                if msg_type == "CODE_PATCH":
+                    # its ACK will never come; the snapshot replaces the client's pending edits
+                    send_message(outbox, room_state.snapshot_message())
+
+    except WebSocketDisconnect:
+        # Remove connection; USER_LEFT goes out from every worker holding the room
+        connection_count_after = await manager.leave(room_id, websocket, user_id)
+        
+        logger.info("WebSocket disconnected: room=%s, user=%s, connections=%d", 
+                   room_id, user_id, connection_count_after)
+
+        # If this was the last connection for this room, write its pending edits to the DB
+        if connection_count_after == 0:
+            try:
+                await manager.flusher.flush([room_id])
+                logger.info("Saved room %s edits to DB on last disconnect", room_id)
+            except Exception:
+                logger.exception("Failed to save room edits to DB")
+
+    except Exception as e:
+        # Any other error
+        logger.exception("Websocket endpoint error for room %s, user %s", room_id, user_id)
+        try:
+            connection_count_after = await manager.leave(room_id, websocket, user_id)
             if connection_count_after == 0:
-                current_code = manager.get_code(room_id)
-                try:
-                    await save_room_code(db, room_id, current_code)
-                except Exception:
-                    logger.exception("Failed to save room code to DB after error")
+                await manager.flusher.flush([room_id])
+        except Exception:
+            logger.exception("Failed to save room edits to DB after error")
+
+    finally:
+        if autocomplete_task is not None:
+            autocomplete_task.cancel()
@@ -0,0 +1,163 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Tuple
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
+from app.schemas.websocket import (
+    AutocompleteRequestPayload,
+    CodePatchPayload,
+    CodeUpdatePayload,
+    CursorUpdatePayload,
+)
+import json
+
+try:
+    import orjson
+except ImportError:  # plain json is a few times slower but behaves the same
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # the binary subprotocol is simply not offered
+    msgpack = None
+
+
+def dumps(obj) -> bytes:
+    """Compact UTF-8 JSON; used for text frames and pub/sub events."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: str | bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class CodecError(Exception):
+    pass
+
+
+class Codec(ABC):
+    """How messages on one WebSocket are framed. Each connection picks one at accept time."""
+
+    name = ""
+    # error code sent back for frames that don't decode
+    error_code = "INVALID_FRAME"
+    # whether messages may carry bytes values as is
+    binary = False
+
+    @abstractmethod
+    def encode(self, message: dict) -> str | bytes:
+        """str goes out as a text frame, bytes as a binary frame."""
+
+    @abstractmethod
+    def decode(self, frame: str | bytes):
+        """The message as Python values; raises CodecError on a malformed frame."""
+
+
+class JsonCodec(Codec):
+    name = "json"
+    error_code = "INVALID_JSON"
+
+    def encode(self, message: dict) -> str:
+        return dumps(message).decode("utf-8")
+
+    def decode(self, frame: str | bytes):
+        try:
+            return loads(frame)
+        except ValueError:
+            raise CodecError("Invalid JSON format")
+
+
+class MsgpackCodec(Codec):
+    """Same messages as JSON, as MessagePack maps in binary frames."""
+
+    name = "msgpack"
+    error_code = "INVALID_MSGPACK"
+    binary = True
+
+    def encode(self, message: dict) -> bytes:
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, frame: str | bytes):
+        if isinstance(frame, str):
+            raise CodecError("Expected a binary MessagePack frame")
+        try:
+            return msgpack.unpackb(frame, raw=False)
+        except (ValueError, TypeError):
+            raise CodecError("Invalid MessagePack frame")
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec() if msgpack is not None else None
+
+# Sec-WebSocket-Protocol value -> codec; a client that asks for none of these gets plain JSON
+SUBPROTOCOLS: Dict[str, Codec] = {"pairprog.json": JSON}
+if MSGPACK is not None:
+    SUBPROTOCOLS["pairprog.msgpack"] = MSGPACK
+
+
+def negotiate(offered: Iterable[str]) -> Tuple[Codec, str | None]:
+    """Pick the first subprotocol the client offered that we support; returns (codec, subprotocol to accept)."""
+    for subprotocol in offered:
+        codec = SUBPROTOCOLS.get(subprotocol)
+        if codec is not None:
+            return codec, subprotocol
+    return JSON, None
+
+
+async def receive_frame(websocket: WebSocket) -> str | bytes:
+    """Like receive_text, but returns binary frames as bytes instead of failing on them."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    text = message.get("text")
+    return text if text is not None else message["bytes"]
+
+
+# Client message type -> payload schema (None: payload is ignored)
+CLIENT_PAYLOADS = {
+    "CODE_UPDATE": CodeUpdatePayload,
+    "CODE_PATCH": CodePatchPayload,
+    "CURSOR_UPDATE": CursorUpdatePayload,
+    "AUTOCOMPLETE_REQUEST": AutocompleteRequestPayload,
+    "PING": None,
+}
+
+
+class ProtocolError(Exception):
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def decode_client_message(codec: Codec, frame: str | bytes, room_id: str) -> Tuple[str, BaseModel | None]:
+    """
+    Decode and validate one client frame against the message schemas.
+    Returns (type, payload model); raises ProtocolError with the code to send back.
+    """
+    try:
+        data = codec.decode(frame)
+    except CodecError as e:
+        raise ProtocolError(str(e), codec.error_code)
+
+    if not isinstance(data, dict):
+        raise ProtocolError("Message must be an object", "INVALID_MESSAGE")
+
+    msg_room_id = data.get("roomId")
+    if msg_room_id != room_id:
+        raise ProtocolError(f"Room ID mismatch. Expected {room_id}, got {msg_room_id}", "ROOM_ID_MISMATCH")
+
+    msg_type = data.get("type")
+    if not isinstance(msg_type, str) or msg_type not in CLIENT_PAYLOADS:
+        raise ProtocolError(f"Unknown message type: {msg_type}", "UNKNOWN_MESSAGE_TYPE")
+
+    schema = CLIENT_PAYLOADS[msg_type]
+    if schema is None:
+        return msg_type, None
+    try:
+        return msg_type, schema.model_validate(data.get("payload") or {})
+    except ValidationError:
+        raise ProtocolError(f"Invalid {msg_type} payload", "INVALID_PAYLOAD")
@@ -0,0 +1,44 @@
+from typing import Tuple
+import base64
+import zlib
+
+# Text shorter than this many characters is stored and sent as is
+COMPRESS_MIN_LENGTH = 4096
+# Stored copies are written once and read on every recovery: favor ratio.
+# The INIT frame is compressed per join while the client waits: favor speed.
+STORAGE_LEVEL = 6
+WIRE_LEVEL = 1
+# Keep the plain text unless compression saves at least this fraction of it
+MIN_SAVING = 0.1
+
+
+def pack(text: str) -> Tuple[str | None, bytes | None]:
+    """(text, None) for short or incompressible text, else (None, zlib-compressed UTF-8)."""
+    if len(text) < COMPRESS_MIN_LENGTH:
+        return text, None
+    raw = text.encode("utf-8")
+    data = zlib.compress(raw, STORAGE_LEVEL)
+    if len(data) > len(raw) * (1 - MIN_SAVING):
+        return text, None
+    return None, data
+
+
+def unpack(text: str | None, data: bytes | None) -> str:
+    """Inverse of pack()."""
+    return text if data is None else zlib.decompress(data).decode("utf-8")
+
+
+def compress_for_wire(text: str, binary: bool) -> dict | None:
+    """
+    INIT payload fields carrying `text` compressed, or None when it is not worth it.
+    Binary framings carry the zlib bytes as is; JSON carries them base64-encoded.
+    """
+    if len(text) < COMPRESS_MIN_LENGTH:
+        return None
+    raw = text.encode("utf-8")
+    data = zlib.compress(raw, WIRE_LEVEL)
+    if len(data) > len(raw) * (1 - MIN_SAVING):
+        return None
+    if binary:
+        return {"code": data, "encoding": "zlib"}
+    return {"code": base64.b64encode(data).decode("ascii"), "encoding": "zlib-base64"}
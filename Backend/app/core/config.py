@@ -4,6 +4,62 @@ class Settings(BaseSettings):
     DATABASE_URL: str   # Loaded from .env
     ENV: str = "development"
 
+    # Per-connection outbound queue: frames queued before the slow-consumer policy kicks in,
+    # and the policy itself ("coalesce" to one SNAPSHOT, or "disconnect")
+    WS_SEND_QUEUE_HIGH_WATER: int = 256
+    WS_SLOW_CONSUMER_POLICY: str = "coalesce"
+
+    # Cursor moves are coalesced per user and sent as one CURSOR_BATCH per tick
+    CURSOR_FLUSH_HZ: float = 20.0
+
+    # Room event bus shared by worker processes: "memory://" (single process),
+    # "redis://host:port" or "unix:///path/to.sock" (Redis or the bundled RespBroker)
+    PUBSUB_URL: str = "memory://"
+    # How long a worker joining a room waits for another worker's copy of it
+    PUBSUB_SYNC_TIMEOUT_MS: int = 500
+
+    # Autocomplete suggestion cache: entries kept (LRU beyond that) and their lifetime
+    AUTOCOMPLETE_CACHE_SIZE: int = 4096
+    AUTOCOMPLETE_CACHE_TTL_S: float = 300.0
+    # Where suggestions are computed: "thread" or "process" pool, or "inline" on the event loop.
+    # Threads still share the GIL with the event loop; "process" isolates CPU-heavy analysis.
+    # Requests beyond MAX_PENDING, or not answered within DEADLINE_MS, get an empty suggestion.
+    AUTOCOMPLETE_EXECUTOR: str = "thread"
+    AUTOCOMPLETE_WORKERS: int = 2
+    AUTOCOMPLETE_MAX_PENDING: int = 64
+    AUTOCOMPLETE_DEADLINE_MS: int = 200
+
+    # Database engine / connection pool
+    # logs every statement; db_query_seconds on /metrics has the timings without the noise
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0     # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800       # seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+
+    # In-memory rooms: a room nobody on this worker is connected to is dropped after
+    # ROOM_IDLE_TTL_S, or sooner (least recently used first) while all documents together
+    # exceed ROOM_MEMORY_BUDGET_BYTES. Dropped rooms are reloaded from the DB on the next join.
+    ROOM_IDLE_TTL_S: float = 600.0
+    ROOM_MEMORY_BUDGET_BYTES: int = 256 * 1024 * 1024
+    ROOM_EVICT_INTERVAL_S: float = 30.0
+
+    # Which room ids exist, cached in front of the rooms table for GET /rooms/{room_id} and
+    # WebSocket joins: rooms found are remembered for ROOM_CACHE_TTL_S, ids not found for
+    # ROOM_CACHE_NEGATIVE_TTL_S (short, since another worker may create the room meanwhile)
+    ROOM_CACHE_SIZE: int = 10000
+    ROOM_CACHE_TTL_S: float = 300.0
+    ROOM_CACHE_NEGATIVE_TTL_S: float = 5.0
+
+    # Persistence: accepted edits are appended to the room_edits log, written at most once per
+    # PERSIST_FLUSH_INTERVAL_MS. A room gets a full snapshot in room_snapshots once it is
+    # PERSIST_SNAPSHOT_EVERY versions past its last one, so recovery replays at most that many
+    # edits; every PERSIST_COMPACT_INTERVAL_S the edits older snapshots cover are deleted.
+    PERSIST_FLUSH_INTERVAL_MS: int = 500
+    PERSIST_SNAPSHOT_EVERY: int = 500
+    PERSIST_COMPACT_INTERVAL_S: float = 60.0
+
     class Config:
         env_file = ".env"
 
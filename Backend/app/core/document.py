@@ -0,0 +1,269 @@
+from typing import List, Tuple
+
+# Leaves are split to at most this many characters; adjacent small leaves are merged on join
+LEAF_SIZE = 1024
+
+
+class _Leaf:
+    __slots__ = ("text", "length", "newlines", "height")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.length = len(text)
+        self.newlines = text.count("\n")
+        self.height = 0
+
+
+class _Node:
+    __slots__ = ("left", "right", "length", "newlines", "height")
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.length = left.length + right.length
+        self.newlines = left.newlines + right.newlines
+        self.height = max(left.height, right.height) + 1
+
+
+def _rotate_left(node: _Node) -> _Node:
+    right = node.right
+    return _Node(_Node(node.left, right.left), right.right)
+
+
+def _rotate_right(node: _Node) -> _Node:
+    left = node.left
+    return _Node(left.left, _Node(left.right, node.right))
+
+
+def _join_right(left: _Node, right):
+    # left is taller than right by more than one level
+    inner = left.right
+    if inner.height <= right.height + 1:
+        merged = _Node(inner, right)
+        if merged.height <= left.left.height + 1:
+            return _Node(left.left, merged)
+        return _rotate_left(_Node(left.left, _rotate_right(merged)))
+    merged = _join_right(inner, right)
+    joined = _Node(left.left, merged)
+    if merged.height <= left.left.height + 1:
+        return joined
+    return _rotate_left(joined)
+
+
+def _join_left(left, right: _Node):
+    # right is taller than left by more than one level
+    inner = right.left
+    if inner.height <= left.height + 1:
+        merged = _Node(left, inner)
+        if merged.height <= right.right.height + 1:
+            return _Node(merged, right.right)
+        return _rotate_right(_Node(_rotate_left(merged), right.right))
+    merged = _join_left(left, inner)
+    joined = _Node(merged, right.right)
+    if merged.height <= right.right.height + 1:
+        return joined
+    return _rotate_right(joined)
+
+
+def _join(left, right):
+    """Concatenate two balanced trees, keeping the AVL height invariant."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.height == 0 and right.height == 0 and left.length + right.length <= LEAF_SIZE:
+        return _Leaf(left.text + right.text)
+    if left.height > right.height + 1:
+        return _join_right(left, right)
+    if right.height > left.height + 1:
+        return _join_left(left, right)
+    return _Node(left, right)
+
+
+def _split(node, offset: int):
+    """Split a tree into (text before offset, text from offset on)."""
+    if node is None:
+        return None, None
+    if node.height == 0:
+        if offset <= 0:
+            return None, node
+        if offset >= node.length:
+            return node, None
+        return _Leaf(node.text[:offset]), _Leaf(node.text[offset:])
+    if offset < node.left.length:
+        left, right = _split(node.left, offset)
+        return left, _join(right, node.right)
+    if offset > node.left.length:
+        left, right = _split(node.right, offset - node.left.length)
+        return _join(node.left, left), right
+    return node.left, node.right
+
+
+def _edit_leaf(node, offset: int, length: int, text: str):
+    """
+    Apply a replace that falls inside a single leaf by rewriting that leaf and the path
+    to it. Heights don't change, so the tree stays balanced. Returns None when the edit
+    spans leaves, would overflow LEAF_SIZE or empty the leaf.
+    """
+    if node.height == 0:
+        size = node.length - length + len(text)
+        if offset + length > node.length or not 0 < size <= LEAF_SIZE:
+            return None
+        return _Leaf(node.text[:offset] + text + node.text[offset + length:])
+    left_length = node.left.length
+    if offset + length <= left_length:
+        left = _edit_leaf(node.left, offset, length, text)
+        return _Node(left, node.right) if left is not None else None
+    if offset >= left_length:
+        right = _edit_leaf(node.right, offset - left_length, length, text)
+        return _Node(node.left, right) if right is not None else None
+    return None
+
+
+def _build(text: str):
+    if not text:
+        return None
+    level = [_Leaf(text[i:i + LEAF_SIZE]) for i in range(0, len(text), LEAF_SIZE)]
+    while len(level) > 1:
+        paired = [_join(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired[-1] = _join(paired[-1], level[-1])
+        level = paired
+    return level[0]
+
+
+class Rope:
+    """
+    Balanced rope holding a room's document.
+
+    Inserts and deletes split and re-join the tree in O(log n) instead of copying the
+    whole buffer. The flat string is only built on demand (INIT, REST reads,
+    persistence) and cached until the next edit.
+    """
+
+    __slots__ = ("_root", "_text")
+
+    def __init__(self, text: str = ""):
+        self._root = _build(text)
+        self._text: str | None = text
+
+    def __len__(self) -> int:
+        return self._root.length if self._root else 0
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = "".join(self._leaves(self._root))
+        return self._text
+
+    @staticmethod
+    def _leaves(node) -> List[str]:
+        out: List[str] = []
+        stack = [node] if node else []
+        while stack:
+            node = stack.pop()
+            if node.height == 0:
+                out.append(node.text)
+            else:
+                stack.append(node.right)
+                stack.append(node.left)
+        return out
+
+    @property
+    def line_count(self) -> int:
+        return (self._root.newlines if self._root else 0) + 1
+
+    def insert(self, offset: int, text: str):
+        if not 0 <= offset <= len(self):
+            raise IndexError("insert offset out of range")
+        if not text:
+            return
+        left, right = _split(self._root, offset)
+        self._root = _join(_join(left, _build(text)), right)
+        self._text = None
+
+    def delete(self, offset: int, length: int):
+        if offset < 0 or length < 0 or offset + length > len(self):
+            raise IndexError("delete range out of range")
+        if not length:
+            return
+        left, rest = _split(self._root, offset)
+        _, right = _split(rest, length)
+        self._root = _join(left, right)
+        self._text = None
+
+    def replace(self, offset: int, delete_length: int, text: str):
+        if self._root is not None and offset >= 0 and delete_length >= 0 and offset + delete_length <= len(self):
+            # typing and small edits stay inside one leaf instead of fragmenting the tree
+            root = _edit_leaf(self._root, offset, delete_length, text)
+            if root is not None:
+                self._root = root
+                self._text = None
+                return
+        self.delete(offset, delete_length)
+        self.insert(offset, text)
+
+    def substring(self, start: int, end: int) -> str:
+        """Text in [start, end) without materializing the whole document."""
+        start = max(start, 0)
+        end = min(end, len(self))
+        if start >= end:
+            return ""
+        if self._text is not None:
+            return self._text[start:end]
+        out: List[str] = []
+        stack = [(self._root, 0)]
+        while stack:
+            node, base = stack.pop()
+            if base >= end or base + node.length <= start:
+                continue
+            if node.height == 0:
+                out.append(node.text[max(start - base, 0):end - base])
+            else:
+                stack.append((node.right, base + node.left.length))
+                stack.append((node.left, base))
+        return "".join(out)
+
+    def lines(self, first: int, last: int) -> List[str]:
+        """Zero-based lines first..last (inclusive), without their newlines."""
+        end = self.line_start(last + 1)
+        if last + 1 < self.line_count:
+            end -= 1
+        return self.substring(self.line_start(first), end).split("\n")
+
+    def offset_to_line(self, offset: int) -> Tuple[int, int]:
+        """Zero-based (line, column) of an offset."""
+        offset = min(max(offset, 0), len(self))
+        line = 0
+        node = self._root
+        remaining = offset
+        while node is not None and node.height > 0:
+            if remaining < node.left.length:
+                node = node.left
+            else:
+                remaining -= node.left.length
+                line += node.left.newlines
+                node = node.right
+        if node is not None:
+            line += node.text.count("\n", 0, remaining)
+        return line, offset - self.line_start(line)
+
+    def line_start(self, line: int) -> int:
+        """Offset of the first character of a zero-based line."""
+        if line <= 0 or self._root is None:
+            return 0
+        if line >= self.line_count:
+            return len(self)
+        # find the offset just past the line-th newline
+        node = self._root
+        base = 0
+        while node.height > 0:
+            if line <= node.left.newlines:
+                node = node.left
+            else:
+                line -= node.left.newlines
+                base += node.left.length
+                node = node.right
+        pos = -1
+        for _ in range(line):
+            pos = node.text.index("\n", pos + 1)
+        return base + pos + 1
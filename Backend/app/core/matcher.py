@@ -0,0 +1,78 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+
+class SuffixTrie:
+    """
+    Trie over reversed strings. One walk back from the end of a text yields every
+    registered suffix it ends with, in O(longest suffix) whatever the text length.
+    """
+
+    def __init__(self):
+        # char -> child node; the None key holds the values of suffixes ending here
+        self.root: dict = {}
+
+    def add(self, suffix: str, value):
+        node = self.root
+        for ch in reversed(suffix):
+            node = node.setdefault(ch, {})
+        node.setdefault(None, []).append(value)
+
+    def matches(self, text: str) -> Iterator:
+        node = self.root
+        for i in range(len(text) - 1, -1, -1):
+            node = node.get(text[i])
+            if node is None:
+                return
+            yield from node.get(None, ())
+
+
+class RuleMatcher:
+    """
+    Ordered, first-match-wins rules over one line of text, compiled once.
+
+    Suffix and exact-match rules are resolved together by one SuffixTrie walk and a
+    dict lookup; the remaining rules are predicates that must run in linear time.
+    Predicates only run while no suffix rule with higher priority has matched.
+    """
+
+    def __init__(self):
+        # values are (priority, False for an `unless` veto)
+        self.suffixes = SuffixTrie()
+        self.exact: Dict[str, int] = {}
+        self.tests: List[Tuple[int, Callable[[str], bool]]] = []
+        self.results: List[str] = []
+
+    def _next(self, result: str) -> int:
+        self.results.append(result)
+        return len(self.results) - 1
+
+    def suffix(self, text: str, result: str, unless: Iterable[str] = (), or_equals: str | None = None):
+        """Match lines ending with `text` but none of `unless` (or equal to `or_equals`)."""
+        priority = self._next(result)
+        self.suffixes.add(text, (priority, True))
+        for veto in unless:
+            self.suffixes.add(veto, (priority, False))
+        if or_equals is not None:
+            self.exact.setdefault(or_equals, priority)
+
+    def test(self, predicate: Callable[[str], bool], result: str):
+        self.tests.append((self._next(result), predicate))
+
+    def _best_suffix(self, line: str) -> int | None:
+        matched, vetoed = set(), set()
+        for priority, positive in self.suffixes.matches(line):
+            (matched if positive else vetoed).add(priority)
+        matched -= vetoed
+        exact = self.exact.get(line)
+        if exact is not None:
+            matched.add(exact)
+        return min(matched, default=None)
+
+    def match(self, line: str) -> str | None:
+        best = self._best_suffix(line)
+        for priority, predicate in self.tests:
+            if best is not None and best < priority:
+                break
+            if predicate(line):
+                return self.results[priority]
+        return self.results[best] if best is not None else None
@@ -0,0 +1,194 @@
+from typing import Dict, Iterable, List, Tuple
+
+# An op is (offset, delete_length, insert_text). After normalize() every op is either a
+# pure delete (n, ""), or a pure insert (0, text), which keeps transform() small.
+Op = Tuple[int, int, str]
+
+# Rebasing a patch costs O(ops in the versions it missed); anything older is resynced
+HISTORY_LIMIT = 500
+
+
+def normalize(edits: Iterable[Op]) -> List[Op]:
+    """Split Monaco-style replace edits into pure deletes and inserts, dropping no-ops."""
+    ops: List[Op] = []
+    for offset, delete_length, insert_text in edits:
+        if delete_length:
+            ops.append((offset, delete_length, ""))
+        if insert_text:
+            ops.append((offset, 0, insert_text))
+    return ops
+
+
+def _shrink_delete(offset: int, length: int, other_offset: int, other_length: int) -> List[Op]:
+    # the part of a delete that survives another delete, in post-delete coordinates
+    end, other_end = offset + length, other_offset + other_length
+    if end <= other_offset:
+        return [(offset, length, "")]
+    if offset >= other_end:
+        return [(offset - other_length, length, "")]
+    remaining = length - (min(end, other_end) - max(offset, other_offset))
+    return [(min(offset, other_offset), remaining, "")] if remaining else []
+
+
+def _transform_pair(a: Op, b: Op) -> Tuple[List[Op], List[Op]]:
+    """
+    Transform two ops made against the same document.
+    Returns (a', b') where a' applies after b and b' applies after a.
+    b has priority: inserts at the same offset put b's text first.
+    """
+    a_offset, a_delete, a_text = a
+    b_offset, b_delete, b_text = b
+
+    if a_text and b_text:
+        if a_offset < b_offset:
+            return [a], [(b_offset + len(a_text), 0, b_text)]
+        return [(a_offset + len(b_text), 0, a_text)], [b]
+
+    if a_text:
+        b_end = b_offset + b_delete
+        if a_offset <= b_offset:
+            return [a], [(b_offset + len(a_text), b_delete, "")]
+        if a_offset >= b_end:
+            return [(a_offset - b_delete, 0, a_text)], [b]
+        # insert lands inside the deleted range: keep it, delete around it
+        return (
+            [(b_offset, 0, a_text)],
+            [(b_offset, a_offset - b_offset, ""), (b_offset + len(a_text), b_end - a_offset, "")],
+        )
+
+    if b_text:
+        a_end = a_offset + a_delete
+        if b_offset <= a_offset:
+            return [(a_offset + len(b_text), a_delete, "")], [b]
+        if b_offset >= a_end:
+            return [a], [(b_offset - a_delete, 0, b_text)]
+        return (
+            [(a_offset, b_offset - a_offset, ""), (a_offset + len(b_text), a_end - b_offset, "")],
+            [(a_offset, 0, b_text)],
+        )
+
+    return (
+        _shrink_delete(a_offset, a_delete, b_offset, b_delete),
+        _shrink_delete(b_offset, b_delete, a_offset, a_delete),
+    )
+
+
+def transform(a_ops: List[Op], b_ops: List[Op]) -> Tuple[List[Op], List[Op]]:
+    """
+    Transform two op sequences made against the same document.
+    Returns (a', b'): a' applies after b_ops, b' applies after a_ops, and b_ops win ties.
+    """
+    if not a_ops or not b_ops:
+        return list(a_ops), list(b_ops)
+    if len(a_ops) == 1 and len(b_ops) == 1:
+        return _transform_pair(a_ops[0], b_ops[0])
+    if len(b_ops) == 1:
+        b_parts = b_ops
+        a_out: List[Op] = []
+        for a in a_ops:
+            a_parts, b_parts = transform([a], b_parts)
+            a_out.extend(a_parts)
+        return a_out, b_parts
+    a_parts = a_ops
+    b_out: List[Op] = []
+    for b in b_ops:
+        a_parts, b_parts = transform(a_parts, [b])
+        b_out.extend(b_parts)
+    return a_parts, b_out
+
+
+class EditHistory:
+    """
+    Server-authoritative OT history for one room.
+
+    Every accepted patch gets the next version and is kept here so a patch made
+    against an older version can be rebased over what it missed. Clients follow the
+    usual one-patch-in-flight protocol: send a patch, wait for CODE_PATCH_ACK, and
+    transform pending local edits against incoming CODE_PATCH ops with the server's
+    ops winning ties (the same `transform` the server uses).
+    """
+
+    __slots__ = ("version", "limit", "entries", "floor", "client_versions")
+
+    def __init__(self, version: int = 0, limit: int = HISTORY_LIMIT):
+        self.version = version
+        self.limit = limit
+        # (version, ops) for every version newer than `floor`. A list, not a deque: an empty
+        # deque preallocates ~700 bytes, and most rooms are idle with no entries at all.
+        self.entries: List[Tuple[int, List[Op]]] = []
+        self.floor = version
+        # client id -> latest version that client is known to have
+        self.client_versions: Dict[str, int] = {}
+
+    def to_state(self) -> dict:
+        """JSON-friendly copy, so another process can make exactly the same rebase decisions."""
+        return {
+            "version": self.version,
+            "floor": self.floor,
+            "entries": [[version, [list(op) for op in ops]] for version, ops in self.entries],
+            "clients": dict(self.client_versions),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict, limit: int = HISTORY_LIMIT) -> "EditHistory":
+        history = cls(state["version"], limit)
+        history.floor = state["floor"]
+        history.entries.extend((version, [tuple(op) for op in ops]) for version, ops in state["entries"])
+        history.client_versions.update(state["clients"])
+        return history
+
+    def rebase(self, base_version: int, ops: List[Op]) -> List[Op] | None:
+        """Transform ops made against `base_version` to apply on the current version."""
+        if base_version > self.version or base_version < self.floor:
+            return None
+        for version, applied in self.entries:
+            if version > base_version:
+                ops, _ = transform(ops, applied)
+        return ops
+
+    def rebase_offset(self, base_version: int, offset: int) -> int | None:
+        """Map a position (e.g. a cursor) in `base_version` onto the current version."""
+        if base_version > self.version or base_version < self.floor:
+            return None
+        for version, applied in self.entries:
+            if version <= base_version:
+                continue
+            for op_offset, delete_length, insert_text in applied:
+                if insert_text:
+                    if op_offset <= offset:
+                        offset += len(insert_text)
+                elif op_offset < offset:
+                    offset -= min(delete_length, offset - op_offset)
+        return offset
+
+    def record(self, ops: List[Op]) -> int:
+        self.version += 1
+        self.entries.append((self.version, ops))
+        if len(self.entries) > self.limit:
+            self.floor, _ = self.entries.pop(0)
+        return self.version
+
+    def reset(self) -> int:
+        """Record a whole-document replace; nothing from before it can be rebased."""
+        self.version += 1
+        self.entries.clear()
+        self.floor = self.version
+        return self.version
+
+    def seen(self, client_id: str, version: int):
+        self.client_versions[client_id] = version
+        self.compact()
+
+    def forget(self, client_id: str):
+        self.client_versions.pop(client_id, None)
+        self.compact()
+
+    def compact(self):
+        """Drop entries every connected client has already moved past."""
+        oldest = min(self.client_versions.values(), default=self.version)
+        drop = 0
+        while drop < len(self.entries) and self.entries[drop][0] <= oldest:
+            drop += 1
+        if drop:
+            self.floor, _ = self.entries[drop - 1]
+            del self.entries[:drop]
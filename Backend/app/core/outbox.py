@@ -0,0 +1,110 @@
+from collections import deque
+from typing import Callable, Deque
+from fastapi import WebSocket
+from app.core.codec import Codec
+from app.core.metrics import registry
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# What to do when a connection's queue reaches the high-water mark
+POLICY_COALESCE = "coalesce"      # drop queued frames and send one fresh SNAPSHOT instead
+POLICY_DISCONNECT = "disconnect"  # close the socket; the client reconnects and gets INIT
+
+# frames queued, per message type; broadcasts count one per recipient
+messages_sent = registry.counter("ws_messages_sent_total", "WebSocket messages queued to clients", ("type",))
+
+
+class Outbox:
+    """
+    Bounded outbound queue for one WebSocket, drained by its own writer task.
+
+    send() never awaits, so a slow client can't stall whoever is broadcasting, and
+    frames from one room leave in the order they were queued. When the socket
+    fails, the connection is evicted through `on_closed`.
+    """
+
+    __slots__ = (
+        "websocket", "codec", "high_water", "policy", "snapshot", "on_closed",
+        "queue", "closed", "overflows", "_wakeup", "_task",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        codec: Codec,
+        high_water: int,
+        policy: str,
+        snapshot: Callable[[], dict],
+        on_closed: Callable[[WebSocket], None],
+    ):
+        self.websocket = websocket
+        # framing negotiated for this connection; frames are encoded with it
+        self.codec = codec
+        self.high_water = high_water
+        self.policy = policy
+        self.snapshot = snapshot
+        self.on_closed = on_closed
+        self.queue: Deque[str | bytes] = deque()
+        self.closed = False
+        self.overflows = 0
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    def send(self, data: str | bytes) -> bool:
+        """Queue a frame already encoded with `codec`. Returns False if the connection is gone."""
+        if self.closed:
+            return False
+        if len(self.queue) >= self.high_water:
+            self.overflows += 1
+            if self.policy == POLICY_DISCONNECT:
+                logger.warning("Disconnecting slow consumer (%d frames queued)", len(self.queue))
+                self.close(code=1013)
+                return False
+            # everything queued is superseded by the current document
+            self.queue.clear()
+            data = self.codec.encode(self.snapshot())
+        self.queue.append(data)
+        self._wakeup.set()
+        return True
+
+    def send_message(self, message: dict) -> bool:
+        if not self.send(self.codec.encode(message)):
+            return False
+        messages_sent.inc(message["type"])
+        return True
+
+    async def _writer(self):
+        try:
+            while True:
+                while self.queue:
+                    data = self.queue.popleft()
+                    if isinstance(data, bytes):
+                        await self.websocket.send_bytes(data)
+                    else:
+                        await self.websocket.send_text(data)
+                self._wakeup.clear()
+                await self._wakeup.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.info("Send failed, evicting connection")
+            self.close()
+
+    def close(self, code: int | None = None):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        self.on_closed(self.websocket)
+        if code is not None:
+            asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
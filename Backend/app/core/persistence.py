@@ -0,0 +1,148 @@
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+from app.core.ot import Op
+from app.db.session import AsyncSessionLocal
+from app.services.rooms import compact_room_logs, save_room_log
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindFlusher:
+    """
+    Writes room edits to the append-only edit log.
+
+    Accepted edits are only buffered; a background task writes everything buffered once
+    per interval in a single multi-row INSERT, off the WebSocket receive loops. A room
+    whose newest snapshot is `snapshot_every` or more versions old gets a new one in the
+    same transaction, so recovery never replays a long tail, and every `compact_interval`
+    seconds the edits and snapshots that newer snapshots cover are deleted.
+    """
+
+    def __init__(
+        self,
+        get_document: Callable[[str], Tuple[str, int] | None],
+        interval: float,
+        snapshot_every: int,
+        compact_interval: float,
+    ):
+        # (code, version) of a room, or None for rooms that are no longer in memory
+        self.get_document = get_document
+        self.interval = interval
+        self.snapshot_every = snapshot_every
+        self.compact_interval = compact_interval
+        # room_id -> (version, ops) not yet written, in version order
+        self.pending: Dict[str, List[Tuple[int, List[Op]]]] = {}
+        # room_id -> version of its newest snapshot that we know of
+        self.snapshot_versions: Dict[str, int] = {}
+        # rooms snapshotted since the last compaction
+        self.compactable: Set[str] = set()
+        self._task: asyncio.Task | None = None
+        # serializes flushes so edits reach the log in the order they were accepted
+        self._lock = asyncio.Lock()
+
+        self.edits_logged = 0
+        self.edits_written = 0
+        self.snapshots_written = 0
+        self.edits_compacted = 0
+        self.batches = 0
+        self.failures = 0
+
+    def log(self, room_id: str, version: int, ops: List[Op]):
+        self.edits_logged += 1
+        self.pending.setdefault(room_id, []).append((version, ops))
+
+    def loaded(self, room_id: str, snapshot_version: int):
+        """A room was rebuilt from the snapshot at `snapshot_version`."""
+        self.snapshot_versions[room_id] = snapshot_version
+
+    def forget(self, room_id: str):
+        self.snapshot_versions.pop(room_id, None)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and write out everything still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await self.compact()
+        logger.info("Write-behind stats: %s", self.stats())
+
+    async def _run(self):
+        last_compaction = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+                if time.monotonic() - last_compaction >= self.compact_interval:
+                    last_compaction = time.monotonic()
+                    await self.compact()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    async def flush(self, room_ids: Iterable[str] | None = None):
+        """Write pending edits (of all rooms, or just `room_ids`) and any snapshots now due."""
+        async with self._lock:
+            if room_ids is None:
+                taken, self.pending = self.pending, {}
+            else:
+                taken = {room_id: self.pending.pop(room_id) for room_id in room_ids if room_id in self.pending}
+            if not taken:
+                return
+
+            edits = [(room_id, version, ops) for room_id, entries in taken.items() for version, ops in entries]
+            snapshots = {}
+            for room_id in taken:
+                document = self.get_document(room_id)
+                if document is not None and document[1] - self.snapshot_versions.get(room_id, 0) >= self.snapshot_every:
+                    snapshots[room_id] = document
+
+            try:
+                async with AsyncSessionLocal() as db:
+                    await save_room_log(db, edits, snapshots)
+            except Exception:
+                # put them back in front of anything logged meanwhile so the next flush retries
+                self.failures += 1
+                for room_id, entries in taken.items():
+                    self.pending[room_id] = entries + self.pending.get(room_id, [])
+                raise
+
+            for room_id, (_, version) in snapshots.items():
+                self.snapshot_versions[room_id] = version
+            self.compactable.update(snapshots)
+            self.batches += 1
+            self.edits_written += len(edits)
+            self.snapshots_written += len(snapshots)
+            logger.debug("Logged %d edit(s) and %d snapshot(s) to DB", len(edits), len(snapshots))
+
+    async def compact(self):
+        """Trim the log of every room snapshotted since the last compaction."""
+        rooms, self.compactable = self.compactable, set()
+        if not rooms:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                self.edits_compacted += await compact_room_logs(db, rooms)
+        except Exception:
+            self.compactable.update(rooms)
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "edits_logged": self.edits_logged,
+            "edits_written": self.edits_written,
+            "snapshots_written": self.snapshots_written,
+            "edits_compacted": self.edits_compacted,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dirty_rooms": len(self.pending),
+        }
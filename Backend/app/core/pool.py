@@ -0,0 +1,119 @@
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable
+import asyncio
+import threading
+
+
+class PoolSaturated(Exception):
+    """Raised instead of queueing when the pool already has `max_pending` jobs."""
+
+
+class WorkerPool:
+    """
+    Runs CPU-bound functions off the event loop with a bound on queued work.
+
+    mode is "thread", "process" (functions and arguments must be picklable) or
+    "inline" (run on the event loop, as before; no deadline can be enforced).
+    A job counts as pending from submission until its worker is done with it, even
+    if the caller gave up on it at its deadline, so a pool stuck on slow jobs sheds
+    new ones instead of growing an unbounded backlog.
+    """
+
+    def __init__(self, mode: str = "thread", workers: int = 2, max_pending: int = 64):
+        if mode not in ("thread", "process", "inline"):
+            raise ValueError(f"Unknown worker pool mode: {mode!r}")
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max_pending
+        # created on first use, so an idle process never starts workers
+        self.executor: Executor | None = None
+        # done-callbacks run on worker threads, so the counters below share a lock
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.peak_pending = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.failed = 0
+
+    def _executor(self) -> Executor:
+        if self.executor is None:
+            if self.mode == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="worker-pool")
+        return self.executor
+
+    def _admit(self):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated()
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+    def _release(self, failed: bool | None):
+        """A job left the pool; failed is None if it was cancelled before running."""
+        with self._lock:
+            self.pending -= 1
+            if failed is None:
+                return
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def _finished(self, future: Future):
+        self._release(None if future.cancelled() else future.exception() is not None)
+
+    async def run(self, fn: Callable, *args, timeout: float | None = None):
+        """
+        Result of fn(*args). Raises PoolSaturated if the pool is full, and
+        asyncio.TimeoutError if no result arrives within `timeout` seconds.
+        """
+        self._admit()
+        if self.mode == "inline":
+            try:
+                result = fn(*args)
+            except Exception:
+                self._release(True)
+                raise
+            self._release(False)
+            return result
+
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._finished)
+        try:
+            # cancelling the wrapper (deadline, or the caller being cancelled) also
+            # drops the job if no worker has picked it up yet
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                # jobs waiting for a free worker
+                "queue_depth": max(0, self.pending - self.workers) if self.mode != "inline" else 0,
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "failed": self.failed,
+            }
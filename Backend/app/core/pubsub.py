@@ -0,0 +1,414 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Deque, Dict, List
+from urllib.parse import urlparse
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Called with each message's payload, in publish order, on the subscriber's event loop
+Handler = Callable[[bytes], None]
+
+# How long PUBLISH and SUBSCRIBE wait for the broker's reply before the connection is
+# treated as broken and reopened
+REPLY_TIMEOUT_S = 2.0
+# Delay between attempts to reopen a lost connection: doubles from MIN up to MAX
+RECONNECT_MIN_S = 0.1
+RECONNECT_MAX_S = 5.0
+
+
+class BusUnavailable(ConnectionError):
+    """The message was not published, or the channel not subscribed: the bus is unreachable."""
+
+
+class PubSub(ABC):
+    """
+    Message bus that RoomManager uses to share room events between worker processes.
+
+    Every subscriber of a channel sees that channel's messages in the same order,
+    including the ones it published itself. Messages published while a subscriber is
+    reconnecting are lost to it; `on_resubscribed` is called once its channels are back,
+    so the owner can catch up.
+    """
+
+    on_resubscribed: Callable[[], None] | None = None
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def subscribe(self, channel: str, handler: Handler):
+        pass
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str, handler: Handler):
+        pass
+
+    @abstractmethod
+    async def publish(self, channel: str, data: bytes) -> int:
+        """Returns how many subscribers the message was delivered to."""
+
+
+class InProcessPubSub(PubSub):
+    """Single-process bus; delivery is deferred with call_soon so nested publishes keep their order."""
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Handler]] = {}
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self.handlers.setdefault(channel, []).append(handler)
+
+    async def unsubscribe(self, channel: str, handler: Handler):
+        handlers = self.handlers.get(channel, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self.handlers.pop(channel, None)
+
+    async def publish(self, channel: str, data: bytes) -> int:
+        handlers = list(self.handlers.get(channel, ()))
+        loop = asyncio.get_running_loop()
+        for handler in handlers:
+            loop.call_soon(_deliver, handler, data)
+        return len(handlers)
+
+
+def _deliver(handler: Handler, data: bytes):
+    try:
+        handler(data)
+    except Exception:
+        logger.exception("Pub/sub handler failed")
+
+
+# --- Redis protocol (RESP2) ---------------------------------------------------
+
+class RespError(Exception):
+    pass
+
+
+def _encode_command(*args) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(out)
+
+
+def _encode_push(*items) -> bytes:
+    out = [b"*%d\r\n" % len(items)]
+    for item in items:
+        if isinstance(item, int):
+            out.append(b":%d\r\n" % item)
+        else:
+            out.append(b"$%d\r\n%s\r\n" % (len(item), item))
+    return b"".join(out)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body
+    if prefix == b"-":
+        raise RespError(body.decode("utf-8", "replace"))
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        size = int(body)
+        if size < 0:
+            return None
+        return (await reader.readexactly(size + 2))[:-2]
+    if prefix == b"*":
+        size = int(body)
+        if size < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(size)]
+    raise RespError(f"unexpected reply prefix {prefix!r}")
+
+
+async def _open_connection(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return await asyncio.open_unix_connection(parsed.path)
+    return await asyncio.open_connection(parsed.hostname or "localhost", parsed.port or 6379)
+
+
+class RespPubSub(PubSub):
+    """
+    Redis-protocol client, for `redis://host:port` or `unix:///path/to.sock`.
+
+    Uses one connection for pipelined PUBLISH calls and one in subscribe mode.
+    Works against Redis itself or the bundled RespBroker.
+
+    A lost connection is reopened in the background, and the subscriber's channels
+    subscribed again. Until then publish() and subscribe() raise BusUnavailable at
+    once rather than wait, and so do calls the broker doesn't answer within `timeout`.
+    """
+
+    def __init__(self, url: str, timeout: float = REPLY_TIMEOUT_S):
+        self.url = url
+        self.timeout = timeout
+        self.handlers: Dict[str, Handler] = {}
+        # None while the connection is down
+        self._pub_writer: asyncio.StreamWriter | None = None
+        self._sub_writer: asyncio.StreamWriter | None = None
+        # False until the subscriber has its channels back after a reconnect
+        self._sub_ready = False
+        self._pending: Deque[asyncio.Future] = deque()
+        self._subscribed: Dict[str, asyncio.Future] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.reconnects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._pub_writer is not None and self._sub_ready
+
+    async def start(self):
+        # the first connections must work: a worker that can't reach the bus shouldn't start
+        publisher = await _open_connection(self.url)
+        subscriber = await _open_connection(self.url)
+        self._tasks = [
+            asyncio.create_task(self._run_publisher(publisher)),
+            asyncio.create_task(self._run_subscriber(subscriber)),
+        ]
+        self._sub_ready = True
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def publish(self, channel: str, data: bytes) -> int:
+        writer = self._pub_writer
+        # we'd miss our own message while our channels are not subscribed again
+        if writer is None or not self._sub_ready:
+            raise BusUnavailable("pub/sub connection is down")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        writer.write(_encode_command("PUBLISH", channel, data))
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # replies come in order, so every later PUBLISH would wait behind this one
+            writer.close()
+            raise BusUnavailable("pub/sub broker did not answer PUBLISH")
+
+    async def subscribe(self, channel: str, handler: Handler):
+        writer = self._sub_writer
+        if writer is None:
+            raise BusUnavailable("pub/sub subscriber connection is down")
+        self.handlers[channel] = handler
+        confirmed = asyncio.get_running_loop().create_future()
+        self._subscribed[channel] = confirmed
+        writer.write(_encode_command("SUBSCRIBE", channel))
+        # the broker must have registered us before we publish anything that expects replies
+        try:
+            await asyncio.wait_for(confirmed, self.timeout)
+        except (asyncio.TimeoutError, BusUnavailable) as e:
+            if self.handlers.get(channel) is handler:
+                del self.handlers[channel]
+            if isinstance(e, asyncio.TimeoutError):
+                writer.close()
+            raise BusUnavailable(f"could not subscribe to {channel}") from e
+
+    async def unsubscribe(self, channel: str, handler: Handler):
+        if self.handlers.get(channel) is handler:
+            del self.handlers[channel]
+            # when down there is nothing to do: reconnecting only resubscribes `handlers`
+            if self._sub_writer is not None:
+                self._sub_writer.write(_encode_command("UNSUBSCRIBE", channel))
+
+    async def _reconnect(self, role: str):
+        delay = RECONNECT_MIN_S
+        while True:
+            try:
+                connection = await _open_connection(self.url)
+            except OSError as e:
+                logger.warning("Pub/sub %s connection failed (%s), retrying in %.1fs", role, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_S)
+                continue
+            self.reconnects += 1
+            logger.info("Pub/sub %s connection restored", role)
+            return connection
+
+    async def _run_publisher(self, connection):
+        while True:
+            reader, self._pub_writer = connection
+            try:
+                await self._read_replies(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                logger.error("Pub/sub publish connection lost: %s", e)
+            finally:
+                self._pub_writer.close()
+                self._pub_writer = None
+                while self._pending:
+                    future = self._pending.popleft()
+                    if not future.done():
+                        future.set_exception(BusUnavailable("pub/sub publish connection lost"))
+            connection = await self._reconnect("publish")
+
+    async def _run_subscriber(self, connection):
+        reconnected = False
+        while True:
+            reader, self._sub_writer = connection
+            # whatever was published while we were away is lost to us
+            resubscribe = asyncio.create_task(self._resubscribe(self._sub_writer)) if reconnected else None
+            try:
+                await self._read_messages(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                logger.error("Pub/sub subscriber connection lost: %s", e)
+            finally:
+                if resubscribe is not None:
+                    resubscribe.cancel()
+                self._sub_writer.close()
+                self._sub_writer = None
+                self._sub_ready = False
+                for confirmed in self._subscribed.values():
+                    if not confirmed.done():
+                        confirmed.set_exception(BusUnavailable("pub/sub subscriber connection lost"))
+                self._subscribed.clear()
+            connection = await self._reconnect("subscriber")
+            reconnected = True
+
+    async def _resubscribe(self, writer: asyncio.StreamWriter):
+        channels = list(self.handlers)
+        if channels:
+            loop = asyncio.get_running_loop()
+            confirmations = [self._subscribed.setdefault(channel, loop.create_future()) for channel in channels]
+            writer.write(_encode_command("SUBSCRIBE", *channels))
+            try:
+                await asyncio.wait_for(asyncio.gather(*confirmations), self.timeout)
+            except (asyncio.TimeoutError, BusUnavailable):
+                # try again on a fresh connection
+                writer.close()
+                return
+        self._sub_ready = True
+        if self.on_resubscribed is not None:
+            self.on_resubscribed()
+
+    async def _read_replies(self, reader: asyncio.StreamReader):
+        while True:
+            try:
+                reply, error = await _read_reply(reader), None
+            except RespError as e:
+                reply, error = None, e
+            future = self._pending.popleft()
+            # timed out or its publisher went away
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(reply)
+
+    async def _read_messages(self, reader: asyncio.StreamReader):
+        while True:
+            kind, channel, data = await _read_reply(reader)
+            channel = channel.decode("utf-8")
+            if kind == b"message":
+                handler = self.handlers.get(channel)
+                if handler is not None:
+                    _deliver(handler, data)
+            elif kind == b"subscribe":
+                confirmed = self._subscribed.pop(channel, None)
+                if confirmed is not None and not confirmed.done():
+                    confirmed.set_result(None)
+
+
+class RespBroker:
+    """
+    Minimal Redis-compatible pub/sub server (SUBSCRIBE, UNSUBSCRIBE, PUBLISH, PING).
+
+    Lets several workers on one host share rooms over a local socket without
+    running Redis, and serves as the stand-in for Redis in tests.
+    """
+
+    def __init__(self):
+        self.channels: Dict[str, set] = {}
+        self.server: asyncio.AbstractServer | None = None
+        # connected client -> the task serving it
+        self.clients: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    async def start(self, url: str) -> str:
+        """Listen on `redis://host:port` (port 0 picks a free one) or `unix:///path`; returns the bound URL."""
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            self.server = await asyncio.start_unix_server(self._serve, parsed.path)
+            return url
+        self.server = await asyncio.start_server(self._serve, parsed.hostname or "127.0.0.1", parsed.port or 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}"
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            # like a broker going down: connected clients are cut off, not left waiting
+            for writer in self.clients:
+                writer.close()
+            await asyncio.gather(*self.clients.values(), return_exceptions=True)
+            await self.server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: set = set()
+        self.clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                command = await _read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    writer.write(b"-ERR protocol error\r\n")
+                    continue
+                name = command[0].upper()
+                args = command[1:]
+                if name == b"PUBLISH" and len(args) == 2:
+                    receivers = self.channels.get(args[0].decode("utf-8"), ())
+                    frame = _encode_push(b"message", args[0], args[1])
+                    for receiver in receivers:
+                        receiver.write(frame)
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name == b"SUBSCRIBE":
+                    for channel in args:
+                        self.channels.setdefault(channel.decode("utf-8"), set()).add(writer)
+                        subscribed.add(channel.decode("utf-8"))
+                        writer.write(_encode_push(b"subscribe", channel, len(subscribed)))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in args:
+                        self._drop(channel.decode("utf-8"), writer)
+                        subscribed.discard(channel.decode("utf-8"))
+                        writer.write(_encode_push(b"unsubscribe", channel, len(subscribed)))
+                elif name == b"PING":
+                    writer.write(b"+PONG\r\n")
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscribed:
+                self._drop(channel, writer)
+            self.clients.pop(writer, None)
+            writer.close()
+
+    def _drop(self, channel: str, writer: asyncio.StreamWriter):
+        receivers = self.channels.get(channel)
+        if receivers is not None:
+            receivers.discard(writer)
+            if not receivers:
+                del self.channels[channel]
+
+
+def create_pubsub(url: str) -> PubSub:
+    """`memory://` for a single process, `redis://...` or `unix://...` to share rooms across workers."""
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return InProcessPubSub()
+    if scheme in ("redis", "unix"):
+        return RespPubSub(url)
+    raise ValueError(f"Unsupported PUBSUB_URL scheme: {scheme!r}")
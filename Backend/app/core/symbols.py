@@ -0,0 +1,130 @@
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+
+# Distinct names indexed per room; names beyond this are not offered until lines free up
+SYMBOL_INDEX_MAX_NAMES = 5000
+# Longer lines (minified code, pasted data) are not scanned
+MAX_SCANNED_LINE = 1000
+
+
+class PrefixTrie:
+    """Set of words with prefix completion. Nodes are dicts; the None key holds the word ending there."""
+
+    def __init__(self):
+        self.root: dict = {}
+
+    def add(self, word: str):
+        node = self.root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[None] = word
+
+    def remove(self, word: str):
+        path = []
+        node = self.root
+        for ch in word:
+            path.append((node, ch))
+            node = node.get(ch)
+            if node is None:
+                return
+        node.pop(None, None)
+        # prune the branch back up to the first node still in use
+        for parent, ch in reversed(path):
+            if parent[ch]:
+                break
+            del parent[ch]
+
+    def complete(self, prefix: str, limit: int = 10, max_visits: int = 2000) -> List[str]:
+        """Up to `limit` words starting with `prefix`, shortest first."""
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        out: List[str] = []
+        queue = deque([node])
+        visits = 0
+        while queue and len(out) < limit and visits < max_visits:
+            node = queue.popleft()
+            visits += 1
+            for key, child in node.items():
+                if key is None:
+                    out.append(child)
+                else:
+                    queue.append(child)
+        return out[:limit]
+
+
+class SymbolIndex:
+    """
+    Names defined in one room's document, for identifier completion.
+
+    The names found on each line are kept per line, so an edit only re-scans the lines
+    it touched; the trie holds every name currently defined on at least one line.
+    `scan` finds the names on one line and depends on the room's language: it is the
+    scan_line of the room's suggestion engine.
+    """
+
+    def __init__(self, text: str, scan: Callable[[str], List[str]], max_names: int = SYMBOL_INDEX_MAX_NAMES):
+        self.max_names = max_names
+        self.scan = scan
+        # line number -> names that line defines
+        self.lines: List[Tuple[str, ...]] = []
+        # name -> number of lines defining it
+        self.counts: Dict[str, int] = {}
+        self.trie = PrefixTrie()
+        # names skipped because the index was full
+        self.dropped = 0
+        self.replace_lines(0, 0, text.split("\n"))
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def replace_lines(self, start: int, end: int, new_lines: List[str]):
+        """Lines [start, end) of the previous text are now `new_lines`."""
+        for names in self.lines[start:end]:
+            for name in names:
+                self._release(name)
+        self.lines[start:end] = [self._scan(line) for line in new_lines]
+
+    def update(self, old_text: str, new_text: str):
+        """Re-index after a whole-document replace, re-scanning only the lines that changed."""
+        old_lines = old_text.split("\n")
+        new_lines = new_text.split("\n")
+        common = min(len(old_lines), len(new_lines))
+        prefix = 0
+        while prefix < common and old_lines[prefix] == new_lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < common - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+            suffix += 1
+        self.replace_lines(prefix, len(old_lines) - suffix, new_lines[prefix:len(new_lines) - suffix])
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        return self.trie.complete(prefix, limit)
+
+    def _scan(self, line: str) -> Tuple[str, ...]:
+        if len(line) > MAX_SCANNED_LINE:
+            return ()
+        names = [name for name in self.scan(line) if self._retain(name)]
+        return tuple(names) if names else ()
+
+    def _retain(self, name: str) -> bool:
+        count = self.counts.get(name)
+        if count:
+            self.counts[name] = count + 1
+            return True
+        if len(self.counts) >= self.max_names:
+            self.dropped += 1
+            return False
+        self.counts[name] = 1
+        self.trie.add(name)
+        return True
+
+    def _release(self, name: str):
+        count = self.counts[name] - 1
+        if count:
+            self.counts[name] = count
+        else:
+            del self.counts[name]
+            self.trie.remove(name)
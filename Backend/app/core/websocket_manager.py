@@ -1,63 +1,799 @@
-from typing import Dict, Set
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+from datetime import datetime
 from fastapi import WebSocket
+from app.core.document import Rope
+from app.core.config import settings
+from app.core.codec import JSON, Codec, dumps, loads
+from app.core.ot import EditHistory, Op, normalize
+from app.core.metrics import registry
+from app.core.outbox import Outbox, messages_sent
+from app.core.persistence import WriteBehindFlusher
+from app.core.pubsub import BusUnavailable, PubSub, create_pubsub
+from app.core.symbols import SymbolIndex
+from app.services.rooms import StoredDocument
+from app.services.suggestions.registry import DEFAULT_LANGUAGE, get_engine
 import asyncio
-import json
 import logging
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
+broadcast_seconds = registry.histogram(
+    "ws_broadcast_seconds", "Time to encode a message and queue it on every connection of a room", ("type",)
+)
+
+class Connection:
+    """One client socket in a room on this process."""
+
+    __slots__ = ("user_id", "room_id", "websocket", "outbox", "cursor", "last_seen")
+
+    def __init__(self, user_id: str, room_id: str, websocket: WebSocket, outbox: Outbox):
+        self.user_id = user_id
+        self.room_id = room_id
+        self.websocket = websocket
+        # everything sent to this socket goes through here, in order
+        self.outbox = outbox
+        # latest cursor/selection the user sent
+        self.cursor: dict | None = None
+        # monotonic time of the last frame received from the client
+        self.last_seen = time.monotonic()
+
+    def seen(self):
+        self.last_seen = time.monotonic()
+
 class RoomState:
-    def __init__(self, room_id: str, initial_code: str = ""):
+    # one per room ever opened on this worker (until evicted), so no per-instance __dict__
+    __slots__ = (
+        "room_id", "language", "document", "history", "symbols", "connections", "members",
+        "remote_counts", "pending_cursors", "_cursor_task", "_symbols_task", "synced", "sync_buffer", "resync_key",
+        "resync_log", "last_active", "persisted",
+    )
+
+    def __init__(
+        self, room_id: str, initial_code: str = "", language: str = DEFAULT_LANGUAGE, version: int = 0,
+        persisted: bool = True,
+    ):
         self.room_id = room_id
-        self.code = initial_code
-        self.connections: Set[WebSocket] = set()
-        self.lock = asyncio.Lock()
-
-    async def broadcast(self, message: dict, exclude: WebSocket | None = None):
-        data = json.dumps(message)
-        coros = []
-        for conn in list(self.connections):
-            if conn is exclude:
+        # False when the room has no `rooms` row: nothing of it reaches the database, so
+        # evicting it would lose the document
+        self.persisted = persisted
+        # Room.language; picks the suggestion engine and how the symbol index scans lines
+        self.language = language
+        self.document = Rope(initial_code)
+        # versions every accepted change and rebases concurrent CODE_PATCHes; starts at the
+        # version recovered from the edit log, which keys every edit this room logs
+        self.history = EditHistory(version)
+        # names defined in the document; built on first use, dropped when the room goes idle
+        self.symbols: SymbolIndex | None = None
+        self._symbols_task: asyncio.Task | None = None
+        # websocket -> connection, and user_id -> the same connection; this process only
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.members: Dict[str, Connection] = {}
+        # node id -> connection count on that node, from join/leave events
+        self.remote_counts: Dict[str, int] = {}
+        # user_id -> latest cursor/selection not yet sent; flushed by _flush_cursors
+        self.pending_cursors: Dict[str, dict] = {}
+        self._cursor_task: asyncio.Task | None = None
+        # resolved once the room holds the same state as the other nodes
+        self.synced: asyncio.Future = asyncio.get_running_loop().create_future()
+        # events received while syncing, replayed after the state arrives
+        self.sync_buffer: List[dict] | None = None
+        # while resyncing after the bus lost messages: (version, node) of the copy we hold as
+        # of our request, and the edits applied since; see RoomManager._resync
+        self.resync_key: Tuple[int, str] | None = None
+        self.resync_log: List[dict] | None = None
+        # monotonic time of the last join, leave or edit; orders idle rooms for eviction
+        self.last_active = time.monotonic()
+
+    @property
+    def code(self) -> str:
+        # materialized lazily by the rope and cached until the next edit
+        return str(self.document)
+
+    @code.setter
+    def code(self, value: str):
+        if self.symbols is not None:
+            self.symbols.update(str(self.document), value)
+        self.document = Rope(value)
+
+    async def symbol_index(self) -> SymbolIndex:
+        """
+        The index, built on first use. The first build scans every line, so it runs in a
+        thread instead of on the event loop, and callers meanwhile share it.
+        """
+        if self.symbols is not None:
+            return self.symbols
+        if self._symbols_task is None:
+            self._symbols_task = asyncio.create_task(self._build_symbols())
+        return await asyncio.shield(self._symbols_task)
+
+    async def _build_symbols(self) -> SymbolIndex:
+        document, version = self.document, self.version
+        try:
+            index = await asyncio.to_thread(SymbolIndex, self.code, scan=get_engine(self.language).scan_line)
+        finally:
+            self._symbols_task = None
+        # edits only maintain an index that is current; one built from an older text
+        # still answers this lookup but isn't kept
+        if self.symbols is None and self.document is document and self.version == version:
+            self.symbols = index
+        return self.symbols or index
+
+    @property
+    def version(self) -> int:
+        return self.history.version
+
+    @property
+    def connection_count(self) -> int:
+        return len(self.connections) + sum(self.remote_counts.values())
+
+    def add_connection(self, ws: WebSocket, user_id: str, codec: Codec = JSON) -> Connection:
+        outbox = Outbox(
+            ws,
+            codec,
+            high_water=settings.WS_SEND_QUEUE_HIGH_WATER,
+            policy=settings.WS_SLOW_CONSUMER_POLICY,
+            snapshot=self.snapshot_message,
+            on_closed=self._evict,
+        )
+        connection = Connection(user_id, self.room_id, ws, outbox)
+        self.connections[ws] = connection
+        self.members[user_id] = connection
+        self.touch()
+        return connection
+
+    def _evict(self, ws: WebSocket):
+        connection = self.connections.pop(ws, None)
+        if connection and self.members.get(connection.user_id) is connection:
+            del self.members[connection.user_id]
+
+    def discard_connection(self, ws: WebSocket) -> Connection | None:
+        connection = self.connections.pop(ws, None)
+        if connection:
+            connection.outbox.close()
+            if self.members.get(connection.user_id) is connection:
+                del self.members[connection.user_id]
+        self.touch()
+        return connection
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def close(self):
+        """Release what the room holds besides its document; it is being dropped from memory."""
+        if self._cursor_task is not None:
+            self._cursor_task.cancel()
+        if self._symbols_task is not None:
+            self._symbols_task.cancel()
+        self.pending_cursors.clear()
+        self.symbols = None
+
+    def outbox_for(self, user_id: str) -> Outbox | None:
+        connection = self.members.get(user_id)
+        return connection.outbox if connection else None
+
+    def snapshot_message(self) -> dict:
+        return {
+            "type": "SNAPSHOT",
+            "roomId": self.room_id,
+            "payload": {"code": self.code, "version": self.version}
+        }
+
+    def apply_edits(self, edits: List[Op]) -> bool:
+        """
+        Apply (offset, delete_length, insert_text) edits in order.
+        Returns False, leaving the code untouched, if any edit falls outside the document.
+        """
+        length = len(self.document)
+        for offset, delete_length, insert_text in edits:
+            if offset < 0 or delete_length < 0 or offset + delete_length > length:
+                return False
+            length += len(insert_text) - delete_length
+        for offset, delete_length, insert_text in edits:
+            if self.symbols is None:
+                self.document.replace(offset, delete_length, insert_text)
                 continue
-            coros.append(conn.send_text(data))
-        if coros:
-            # send concurrently and ignore individual failures here
-            await asyncio.gather(*coros, return_exceptions=True)
+            # re-index just the lines the edit spans, before and after
+            first, _ = self.document.offset_to_line(offset)
+            last, _ = self.document.offset_to_line(offset + delete_length)
+            self.document.replace(offset, delete_length, insert_text)
+            new_last, _ = self.document.offset_to_line(offset + len(insert_text))
+            self.symbols.replace_lines(first, last + 1, self.document.lines(first, new_last))
+        return True
+
+    def broadcast(self, message: dict, exclude: WebSocket | None = None):
+        """Encode once per codec and queue the same frame on every other connection; never blocks."""
+        started = time.perf_counter()
+        frames: Dict[Codec, str | bytes] = {}
+        sent = 0
+        for connection in list(self.connections.values()):
+            if connection.websocket is not exclude:
+                outbox = connection.outbox
+                data = frames.get(outbox.codec)
+                if data is None:
+                    data = frames[outbox.codec] = outbox.codec.encode(message)
+                sent += outbox.send(data)
+        message_type = message["type"]
+        if sent:
+            messages_sent.inc(message_type, amount=sent)
+        broadcast_seconds.observe(time.perf_counter() - started, message_type)
+
+    def queue_cursor(self, user_id: str, cursor: dict):
+        """Remember a user's latest cursor; it goes out with the next CURSOR_BATCH."""
+        self.pending_cursors[user_id] = cursor
+        connection = self.members.get(user_id)
+        if connection:
+            connection.cursor = cursor
+        if self._cursor_task is None:
+            self._cursor_task = asyncio.create_task(self._flush_cursors())
+
+    def drop_cursor(self, user_id: str):
+        self.pending_cursors.pop(user_id, None)
+
+    async def _flush_cursors(self):
+        interval = 1 / settings.CURSOR_FLUSH_HZ
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                if not self.pending_cursors:
+                    return
+                pending, self.pending_cursors = self.pending_cursors, {}
+                # one frame for everyone; clients skip their own userId
+                self.broadcast({
+                    "type": "CURSOR_BATCH",
+                    "roomId": self.room_id,
+                    "payload": {
+                        "cursors": [{"userId": user_id, **cursor} for user_id, cursor in pending.items()]
+                    }
+                })
+        finally:
+            self._cursor_task = None
 
 class RoomManager:
-    def __init__(self):
+    """
+    Owns the in-memory rooms of this process.
+
+    Every change to a room (edits, joins, leaves, cursors) is published on the room's
+    pub/sub channel and applied when it comes back, on every process that holds the
+    room. The bus delivers each channel in one order to everyone, so all workers
+    apply the same edits in the same order and agree on every version number.
+    """
+
+    def __init__(self, bus: PubSub | None = None):
         # room_id -> RoomState
         self.rooms: Dict[str, RoomState] = {}
+        # user_id -> connection, for every socket on this process
+        self.users: Dict[str, Connection] = {}
+        # identifies this process on the bus
+        self.node_id = uuid.uuid4().hex[:8]
+        self.bus = bus or create_pubsub(settings.PUBSUB_URL)
+        # the bus lost messages while reconnecting: catch every room up again
+        self.bus.on_resubscribed = self._resync_rooms
+        self._handlers: Dict[str, Callable[[bytes], None]] = {}
+        # room_id -> the one load in progress for a room not in memory yet; see join
+        self._hydrating: Dict[str, asyncio.Task] = {}
+        # room_id -> joins not connected yet; those rooms are never evicted, or the joiner
+        # would connect to a copy no longer in self.rooms while the next join loads another
+        self._joining: Dict[str, int] = {}
+        self.hydrations = 0
+        self.joins_coalesced = 0
+        self.resyncs = 0
+        # owns all document writes to the DB; see log_edit
+        self.flusher = WriteBehindFlusher(
+            self._persisted_document,
+            settings.PERSIST_FLUSH_INTERVAL_MS / 1000,
+            settings.PERSIST_SNAPSHOT_EVERY,
+            settings.PERSIST_COMPACT_INTERVAL_S,
+        )
+
+        # eviction of idle rooms; see evict_idle
+        self.idle_ttl = settings.ROOM_IDLE_TTL_S
+        self.memory_budget = settings.ROOM_MEMORY_BUDGET_BYTES
+        self._evictor_task: asyncio.Task | None = None
+        # a sweep started because a newly loaded room put us over the memory budget
+        self._budget_task: asyncio.Task | None = None
+        self._evicting = False
+        self.evicted_idle = 0
+        self.evicted_for_memory = 0
 
-    def get_or_create(self, room_id: str, initial_code: str = "") -> RoomState:
-        if room_id not in self.rooms:
-            self.rooms[room_id] = RoomState(room_id, initial_code)
-        return self.rooms[room_id]
+    async def start(self):
+        await self.bus.start()
+        self.flusher.start()
+        if self._evictor_task is None:
+            self._evictor_task = asyncio.create_task(self._run_evictor())
+
+    async def stop(self):
+        for task in (self._evictor_task, self._budget_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._evictor_task = self._budget_task = None
+        await self.flusher.stop()
+        await self.bus.stop()
+
+    def _persisted_document(self, room_id: str) -> Tuple[str, int] | None:
+        room = self.rooms.get(room_id)
+        return (room.code, room.version) if room else None
+
+    def log_edit(self, room_id: str, version: int, ops: List[Op]):
+        """Queue the ops that produced `version` for the next write to the edit log."""
+        self.flusher.log(room_id, version, ops)
 
     def get(self, room_id: str) -> RoomState | None:
         return self.rooms.get(room_id)
 
-    def remove_connection(self, room_id: str, ws: WebSocket):
+    async def join(self, room_id: str, load: Callable[[], Awaitable[Tuple[StoredDocument, str | None]]]) -> RoomState:
+        """
+        Return the room, loading its (document, language) with `load()` and syncing it with
+        other nodes if this process doesn't hold it yet.
+
+        Concurrent joins of a room that is not in memory share a single load: the first
+        one starts it, the rest await the same task and their `load` is never called.
+        That includes joins arriving while the loaded room is attaching to the bus,
+        so all of them see the load fail if the attach does.
+
+        The room stays pinned in memory until the caller connects to it, or calls
+        release_join if it gives up before that.
+        """
+        self._joining[room_id] = self._joining.get(room_id, 0) + 1
+        try:
+            # the room is in self.rooms while it attaches, so an in-flight load goes first
+            task = self._hydrating.get(room_id)
+            room = self.rooms.get(room_id) if task is None else None
+            if room is None:
+                if task is None:
+                    task = asyncio.create_task(self._hydrate(room_id, load))
+                    self._hydrating[room_id] = task
+                    task.add_done_callback(lambda done: self._hydrated(room_id, done))
+                else:
+                    self.joins_coalesced += 1
+                # shielded: a joiner that disconnects meanwhile must not cancel the others' load
+                room = await asyncio.shield(task)
+            room.touch()
+            await room.synced
+        except BaseException:
+            self.release_join(room_id)
+            raise
+        return room
+
+    def release_join(self, room_id: str):
+        """A join of the room ended: connected, failed or given up."""
+        count = self._joining.get(room_id, 0) - 1
+        if count > 0:
+            self._joining[room_id] = count
+        else:
+            self._joining.pop(room_id, None)
+
+    async def _hydrate(self, room_id: str, load: Callable[[], Awaitable[Tuple[StoredDocument, str | None]]]) -> RoomState:
+        document, language = await load()
+        self.hydrations += 1
+        room = RoomState(room_id, document.code, language or DEFAULT_LANGUAGE, document.version, document.persisted)
+        self.flusher.loaded(room_id, document.snapshot_version)
+        self.rooms[room_id] = room
+        try:
+            await self._attach(room)
+        except Exception as exc:
+            # never synced, so every later join would wait on it forever: the next one reloads,
+            # and anything already waiting on this copy gets the error
+            if not room.synced.done():
+                room.synced.set_exception(exc)
+                room.synced.exception()
+            if self.rooms.get(room_id) is room:
+                del self.rooms[room_id]
+            room.close()
+            self.flusher.forget(room_id)
+            handler = self._handlers.pop(room_id, None)
+            if handler is not None:
+                await self.bus.unsubscribe(self._channel(room_id), handler)
+            raise
+        if self.resident_bytes() > self.memory_budget and not self._evicting and self._budget_task is None:
+            self._budget_task = asyncio.create_task(self.evict_idle())
+            self._budget_task.add_done_callback(self._budget_evicted)
+        return room
+
+    def _budget_evicted(self, task: asyncio.Task):
+        if self._budget_task is task:
+            self._budget_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Room eviction failed", exc_info=task.exception())
+
+    def _hydrated(self, room_id: str, task: asyncio.Task):
+        if self._hydrating.get(room_id) is task:
+            del self._hydrating[room_id]
+        # a failed load is raised to every joiner still waiting; this marks it retrieved
+        # when they all went away, and the next join starts a fresh one
+        if not task.cancelled():
+            task.exception()
+
+    async def _attach(self, room: RoomState):
+        room_id = room.room_id
+        # Ask whoever already holds the room for its state. Everything after our own
+        # request in channel order is buffered and replayed on top of that state.
+        room.sync_buffer = []
+        handler = lambda data: self._on_event(room_id, data)
+        self._handlers[room_id] = handler
+        await self.bus.subscribe(self._channel(room_id), handler)
+        receivers = await self._publish(room_id, {"kind": "sync_request"})
+        if receivers > 1:
+            try:
+                await asyncio.wait_for(asyncio.shield(room.synced), settings.PUBSUB_SYNC_TIMEOUT_MS / 1000)
+            except asyncio.TimeoutError:
+                logger.warning("No state received for room %s, starting from the database copy", room_id)
+        if not room.synced.done():
+            self._finish_sync(room)
+
+    def _resync_rooms(self):
+        for room in self.rooms.values():
+            # rooms still attaching get everything after their own sync_request anyway
+            if room.synced.done():
+                asyncio.create_task(self._resync(room))
+
+    async def _resync(self, room: RoomState):
+        """
+        Catch a room up after the bus dropped messages to this worker. The room stays live;
+        every other holder answers with its state, and a state further ahead than ours
+        (higher version, then higher node id, so all workers pick the same copy) replaces
+        it, with the edits applied here since our request done again on top.
+        """
+        self.resyncs += 1
+        try:
+            await self._publish(room.room_id, {"kind": "sync_request", "resync": True})
+        except BusUnavailable:
+            # down again: the next reconnect retries
+            return
+        await asyncio.sleep(settings.PUBSUB_SYNC_TIMEOUT_MS / 1000)
+        room.resync_key = room.resync_log = None
+
+    def _adopt_state(self, room: RoomState, event: dict):
+        history = EditHistory.from_state(event["history"])
+        if (history.version, event["node"]) <= room.resync_key:
+            return
+        room.resync_key = (history.version, event["node"])
+        room.code = event["code"]
+        room.history = history
+        for edit in room.resync_log:
+            if edit["kind"] == "patch":
+                ops = room.history.rebase(edit["base"], normalize(tuple(op) for op in edit["edits"]))
+                if ops is not None and room.apply_edits(ops):
+                    room.history.record(ops)
+            else:
+                room.code = edit["code"]
+                room.history.reset()
+        # what local clients hold may be based on the copy we just replaced
+        room.broadcast(room.snapshot_message())
+
+    def _finish_sync(self, room: RoomState):
+        buffered, room.sync_buffer = room.sync_buffer or [], None
+        room.synced.set_result(None)
+        for event in buffered:
+            if event["kind"] != "sync_request":
+                self._apply_event(room, event)
+
+    # --- eviction --------------------------------------------------------------
+
+    def resident_bytes(self) -> int:
+        # document lengths in characters, which is bytes for ASCII source
+        return sum(len(room.document) for room in self.rooms.values())
+
+    def _idle_rooms(self) -> List[RoomState]:
+        """
+        Rooms nobody on this process is connected to and that the next join can reload
+        from the database, least recently active first.
+        """
+        idle = [
+            room for room in self.rooms.values()
+            if not room.connections and room.synced.done() and room.persisted
+            and room.room_id not in self._joining
+        ]
+        idle.sort(key=lambda room: room.last_active)
+        return idle
+
+    async def _run_evictor(self):
+        while True:
+            await asyncio.sleep(settings.ROOM_EVICT_INTERVAL_S)
+            try:
+                await self.evict_idle()
+            except Exception:
+                logger.exception("Room eviction failed")
+
+    async def evict_idle(self) -> int:
+        """
+        Drop rooms idle for longer than the TTL, then the least recently active idle
+        rooms until the documents fit the memory budget. Returns how many were dropped.
+        """
+        if self._evicting:
+            return 0
+        self._evicting = True
+        try:
+            cutoff = time.monotonic() - self.idle_ttl
+            expired = [room for room in self._idle_rooms() if room.last_active <= cutoff]
+            evicted_idle = await self._drop_rooms(expired)
+            self.evicted_idle += evicted_idle
+
+            excess = self.resident_bytes() - self.memory_budget
+            victims = []
+            for room in self._idle_rooms():
+                if excess <= 0:
+                    break
+                victims.append(room)
+                excess -= len(room.document)
+            evicted_for_memory = await self._drop_rooms(victims)
+            self.evicted_for_memory += evicted_for_memory
+            excess = self.resident_bytes() - self.memory_budget
+            if excess > 0:
+                logger.warning("Resident rooms exceed the memory budget by %d bytes", excess)
+            return evicted_idle + evicted_for_memory
+        finally:
+            self._evicting = False
+
+    async def _drop_rooms(self, rooms: List[RoomState]) -> int:
+        if not rooms:
+            return 0
+        started = time.monotonic()
+        # the DB copy must be current before ours goes; the next join reloads from it
+        try:
+            await self.flusher.flush([room.room_id for room in rooms])
+        except Exception:
+            logger.exception("Could not save rooms before eviction; keeping them")
+            return 0
+        evicted = 0
+        for room in rooms:
+            room_id = room.room_id
+            # skip rooms joined or edited again while the flush ran
+            if (room.connections or room_id in self._joining or self.rooms.get(room_id) is not room
+                    or room.last_active >= started or room_id in self.flusher.pending):
+                continue
+            del self.rooms[room_id]
+            room.close()
+            self.flusher.forget(room_id)
+            handler = self._handlers.pop(room_id, None)
+            if handler is not None:
+                await self.bus.unsubscribe(self._channel(room_id), handler)
+            evicted += 1
+        if evicted:
+            logger.info("Evicted %d idle room(s), %d resident", evicted, len(self.rooms))
+        return evicted
+
+    def stats(self) -> dict:
+        return {
+            "resident_rooms": len(self.rooms),
+            "connections": len(self.users),
+            "resident_bytes": self.resident_bytes(),
+            "memory_budget_bytes": self.memory_budget,
+            "idle_rooms": sum(1 for room in self.rooms.values() if not room.connections),
+            "evicted_idle": self.evicted_idle,
+            "evicted_for_memory": self.evicted_for_memory,
+            "hydrations": self.hydrations,
+            "joins_coalesced": self.joins_coalesced,
+            "resyncs": self.resyncs,
+            "dirty_rooms": len(self.flusher.pending),
+        }
+
+    @staticmethod
+    def _channel(room_id: str) -> str:
+        return f"room:{room_id}"
+
+    async def _publish(self, room_id: str, event: dict) -> int:
+        event["node"] = self.node_id
+        return await self.bus.publish(self._channel(room_id), dumps(event))
+
+    def connect(self, room: RoomState, ws: WebSocket, user_id: str, codec: Codec = JSON) -> Connection:
+        """Register a socket that has joined `room`; see RoomState.add_connection."""
+        connection = room.add_connection(ws, user_id, codec)
+        self.users[user_id] = connection
+        self.release_join(room.room_id)
+        return connection
+
+    def remove_connection(self, room_id: str, ws: WebSocket, user_id: str | None = None):
+        connection = self.users.get(user_id) if user_id else None
+        if connection is not None and connection.websocket is ws:
+            del self.users[user_id]
         room = self.rooms.get(room_id)
         if not room:
             return
-        room.connections.discard(ws)
+        room.discard_connection(ws)
+
+    def find_user(self, user_id: str) -> Connection | None:
+        return self.users.get(user_id)
+
+    def members(self, room_id: str) -> List[str]:
+        """User ids connected to the room through this process."""
+        room = self.rooms.get(room_id)
+        return list(room.members) if room else []
 
     def connection_count(self, room_id: str) -> int:
         room = self.rooms.get(room_id)
-        return len(room.connections) if room else 0
+        return room.connection_count if room else 0
 
     def get_code(self, room_id: str) -> str:
         room = self.rooms.get(room_id)
         return room.code if room else ""
 
-    async def update_code(self, room_id: str, new_code: str):
-        room = self.get(room_id)
-        if not room:
-            # create if missing
-            room = self.get_or_create(room_id, new_code)
-        async with room.lock:
-            room.code = new_code
+    # --- publishing side: called by the WebSocket endpoint -------------------
+
+    async def announce_join(self, room_id: str, user_id: str, version: int):
+        room = self.rooms[room_id]
+        try:
+            await self._publish(room_id, {
+                "kind": "join", "user": user_id, "version": version, "count": len(room.connections)
+            })
+        except BusUnavailable as e:
+            # presence only: the user is connected here either way
+            logger.warning("Could not announce %s joining room %s: %s", user_id, room_id, e)
+
+    async def leave(self, room_id: str, ws: WebSocket, user_id: str) -> int:
+        """Drop a local connection and tell the other nodes; returns this node's remaining count."""
+        self.remove_connection(room_id, ws, user_id)
+        room = self.rooms.get(room_id)
+        count = len(room.connections) if room else 0
+        try:
+            await self._publish(room_id, {"kind": "leave", "user": user_id, "count": count})
+        except BusUnavailable as e:
+            logger.warning("Could not announce %s leaving room %s: %s", user_id, room_id, e)
+        return count
+
+    async def update_code(self, room_id: str, new_code: str, user_id: str | None = None, cursor: int | None = None):
+        """Replace the whole document (CODE_UPDATE)."""
+        await self._publish(room_id, {"kind": "replace", "user": user_id, "code": new_code, "cursor": cursor})
+
+    async def apply_patch(
+        self, room_id: str, user_id: str, base_version: int, edits: Iterable[Op], cursor: int | None = None
+    ):
+        """
+        Submit edits made against `base_version`. When the bus delivers them they are
+        rebased over everything accepted since; the sender then gets CODE_PATCH_ACK,
+        or a SNAPSHOT if it is too far behind.
+        """
+        await self._publish(room_id, {
+            "kind": "patch", "user": user_id, "base": base_version, "edits": list(edits), "cursor": cursor
+        })
+
+    async def move_cursor(self, room_id: str, user_id: str, cursor: dict):
+        await self._publish(room_id, {"kind": "cursor", "user": user_id, "cursor": cursor})
+
+    # --- applying side: runs for every event, in channel order ---------------
+
+    def _on_event(self, room_id: str, data: bytes):
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        event = loads(data)
+
+        if event["kind"] == "sync_request":
+            if event["node"] == self.node_id:
+                # our own request: the state we get covers what came before it, so that
+                # part of the buffer is dropped if a state arrives and replayed if none does
+                if room.sync_buffer is not None:
+                    room.sync_buffer.append(event)
+                elif event.get("resync"):
+                    room.resync_key = (room.version, self.node_id)
+                    room.resync_log = []
+            elif room.synced.done():
+                state = {"kind": "state", "to": event["node"], "code": room.code, "history": room.history.to_state()}
+                asyncio.create_task(self._send_state(room_id, state))
+            return
+
+        if event["kind"] == "state":
+            if event["to"] != self.node_id:
+                return
+            if room.resync_log is not None:
+                self._adopt_state(room, event)
+            elif not room.synced.done():
+                room.code = event["code"]
+                room.history = EditHistory.from_state(event["history"])
+                requests = [i for i, buffered in enumerate(room.sync_buffer) if buffered["kind"] == "sync_request"]
+                if requests:
+                    room.sync_buffer = room.sync_buffer[requests[-1] + 1:]
+                self._finish_sync(room)
+            return
+
+        if room.sync_buffer is not None:
+            room.sync_buffer.append(event)
+            return
+        if room.resync_log is not None and event["kind"] in ("patch", "replace"):
+            room.resync_log.append(event)
+        self._apply_event(room, event)
+
+    async def _send_state(self, room_id: str, state: dict):
+        try:
+            await self._publish(room_id, state)
+        except BusUnavailable as e:
+            # the requester times out and keeps its own copy
+            logger.warning("Could not send the state of room %s: %s", room_id, e)
+
+    def _apply_event(self, room: RoomState, event: dict):
+        kind = event["kind"]
+        user_id = event.get("user")
+        local = event["node"] == self.node_id
+        sender = room.members.get(user_id) if local else None
+        origin = sender.websocket if sender else None
+
+        if kind == "patch":
+            ops = room.history.rebase(event["base"], normalize(tuple(edit) for edit in event["edits"]))
+            if ops is None or not room.apply_edits(ops):
+                # Base version no longer in history or out-of-range edit: resync the sender
+                room.history.seen(user_id, room.version)
+                outbox = room.outbox_for(user_id) if local else None
+                if outbox:
+                    outbox.send_message(room.snapshot_message())
+                return
+            version = room.history.record(ops)
+            room.history.seen(user_id, version)
+            room.touch()
+            outbox = room.outbox_for(user_id) if local else None
+            if outbox:
+                outbox.send_message({"type": "CODE_PATCH_ACK", "roomId": room.room_id, "payload": {"version": version}})
+            # Broadcast only the delta to the others
+            room.broadcast({
+                "type": "CODE_PATCH",
+                "roomId": room.room_id,
+                "payload": {
+                    "version": version,
+                    "edits": [
+                        {"offset": offset, "deleteLength": delete_length, "insertText": insert_text}
+                        for offset, delete_length, insert_text in ops
+                    ],
+                    "cursor": event.get("cursor")
+                },
+                "userId": user_id,
+                "timestamp": datetime.utcnow().isoformat()
+            }, exclude=origin)
+            self.log_edit(room.room_id, version, ops)
+
+        elif kind == "replace":
+            # logged as one op replacing the whole old text
+            replaced = len(room.document)
+            room.code = event["code"]
+            version = room.history.reset()
+            room.touch()
+            room.broadcast({
+                "type": "CODE_UPDATE",
+                "roomId": room.room_id,
+                "payload": {
+                    "code": event["code"],
+                    "cursor": event.get("cursor"),
+                    "version": version
+                },
+                "timestamp": datetime.utcnow().isoformat()
+            }, exclude=origin)
+            self.log_edit(room.room_id, version, [(0, replaced, event["code"])])
+
+        elif kind == "cursor":
+            # Coalesced per user and broadcast as a CURSOR_BATCH at CURSOR_FLUSH_HZ
+            room.queue_cursor(user_id, event["cursor"])
+
+        elif kind == "join":
+            room.history.seen(user_id, event["version"])
+            if not local:
+                room.remote_counts[event["node"]] = event["count"]
+            room.broadcast({
+                "type": "USER_JOINED",
+                "roomId": room.room_id,
+                "payload": {"userId": user_id},
+                "connectionCount": room.connection_count
+            }, exclude=origin)
+
+        elif kind == "leave":
+            room.history.forget(user_id)
+            room.drop_cursor(user_id)
+            if not room.connections:
+                # nobody here to autocomplete for; rebuilt on the next lookup
+                room.symbols = None
+            if not local:
+                if event["count"]:
+                    room.remote_counts[event["node"]] = event["count"]
+                else:
+                    room.remote_counts.pop(event["node"], None)
+            room.broadcast({
+                "type": "USER_LEFT",
+                "roomId": room.room_id,
+                "payload": {"userId": user_id},
+                "connectionCount": room.connection_count
+            })
 
 # single global manager
 manager = RoomManager()
@@ -1,9 +1,17 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.core.config import settings
+from app.core.metrics import registry
+import time
 
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=True,      # you can turn this off later
+    echo=settings.DB_ECHO,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
     future=True
 )
 
@@ -16,3 +24,43 @@ AsyncSessionLocal = async_sessionmaker(
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+# Statements are labelled by their verb only, so the number of series stays fixed
+STATEMENT_KINDS = ("select", "insert", "update", "delete")
+
+query_seconds = registry.histogram("db_query_seconds", "Database statements, from send to result", ("statement",))
+query_errors = registry.counter("db_query_errors_total", "Database statements that raised", ("statement",))
+
+
+def _statement_kind(statement: str) -> str:
+    verb = statement.lstrip()[:6].lower()
+    return verb if verb in STATEMENT_KINDS else "other"
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    query_seconds.observe(time.perf_counter() - started, _statement_kind(statement))
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _query_failed(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+    query_errors.inc(_statement_kind(context.statement or ""))
+
+
+@registry.collector
+def _pool_metrics():
+    pool = engine.pool
+    yield "db_pool_size", "gauge", "Connections the pool keeps open", [({}, pool.size())]
+    yield "db_pool_checked_out", "gauge", "Connections in use", [({}, pool.checkedout())]
+    yield "db_pool_checked_in", "gauge", "Idle connections in the pool", [({}, pool.checkedin())]
+    yield "db_pool_overflow", "gauge", "Connections open beyond pool_size (negative while the pool fills)", [({}, pool.overflow())]
@@ -1,12 +1,28 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from app.api.routers import router
+from app.core.compression import COMPRESS_MIN_LENGTH, WIRE_LEVEL
 from app.core.config import settings
+from app.core.websocket_manager import manager
 from app.api import websocket as websocket_router
 from app.api import rooms as rooms_router
 from app.api import autocomplete as autocomplete_router
+from app.api import metrics as metrics_router
 
-app = FastAPI(title="Realtime Code Backend", version="1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # connects the room event bus and starts the write-behind flusher
+    await manager.start()
+    yield
+    # write out everything still pending before the process exits
+    await manager.stop()
+    autocomplete_router.suggestion_pool.shutdown()
+
+
+app = FastAPI(title="Realtime Code Backend", version="1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,11 +31,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# large room documents in GET /rooms/{room_id}, for clients that send Accept-Encoding: gzip;
+# it compresses on the event loop, where level 9 costs ~10x level 1 for ~25% fewer bytes
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_LENGTH, compresslevel=WIRE_LEVEL)
 
 app.include_router(router)
 app.include_router(autocomplete_router.router)
 app.include_router(rooms_router.router)
 app.include_router(websocket_router.router)
+app.include_router(metrics_router.router)
 
 
 @app.get("/")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, LargeBinary, String, Text, func
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from app.db.base import Base
@@ -9,5 +9,36 @@ class Room(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     room_id = Column(String(32), unique=True, nullable=False)
+    # no longer written: the document lives in room_snapshots + room_edits, and
+    # migration 002 copied what was here into each room's first snapshot
     code = Column(Text, default="")
     language = Column(String(20), default="python")
+
+
+class RoomSnapshot(Base):
+    """The whole document of a room as of `version`; recovery replays room_edits after it."""
+
+    __tablename__ = "room_snapshots"
+
+    room_id = Column(String(32), ForeignKey("rooms.room_id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, primary_key=True)
+    # exactly one of these is set: large documents are kept zlib-compressed
+    # (see app/core/compression.py), the rest as plain text
+    code = Column(Text, nullable=True)
+    compressed = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class RoomEdit(Base):
+    """
+    Append-only log of accepted edits: the ops that took the room from version - 1 to
+    `version`, as a compact JSON list of [offset, delete_length, insert_text]; large
+    ones (pastes) are kept zlib-compressed in `compressed` instead.
+    """
+
+    __tablename__ = "room_edits"
+
+    room_id = Column(String(32), ForeignKey("rooms.room_id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, primary_key=True)
+    ops = Column(Text, nullable=True)
+    compressed = Column(LargeBinary, nullable=True)
@@ -1,10 +1,35 @@
-from pydantic import BaseModel
+from typing import List
+from pydantic import BaseModel, Field
+
+# Upper bounds for one bulk create and one batch lookup request
+MAX_BULK_ROOMS = 10000
+MAX_BATCH_LOOKUP = 1000
 
 
 class RoomCreateResponse(BaseModel):
     roomId: str
 
 
+class RoomBulkCreateRequest(BaseModel):
+    count: int = Field(gt=0, le=MAX_BULK_ROOMS)
+    language: str = Field("python", max_length=20)
+
+
+class RoomBulkCreateResponse(BaseModel):
+    roomIds: List[str]
+
+
+class RoomMeta(BaseModel):
+    roomId: str
+    language: str | None = "python"
+
+
+class RoomBatchResponse(BaseModel):
+    # in the order asked for; ids with no room are listed in `missing` instead
+    rooms: List[RoomMeta]
+    missing: List[str]
+
+
 class AutoCompleteRequest(BaseModel):
     code: str
     cursorPosition: int
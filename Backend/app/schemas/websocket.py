@@ -1,10 +1,16 @@
-from pydantic import BaseModel
-from typing import Optional, Literal
+from pydantic import BaseModel, Field
+from typing import List, Optional, Literal, Union
 
 # Message Types
 MessageType = Literal[
     "CODE_UPDATE",
+    "CODE_PATCH",
+    "CODE_PATCH_ACK",
+    "SNAPSHOT",
     "CURSOR_UPDATE", 
+    "CURSOR_BATCH",
+    "AUTOCOMPLETE_REQUEST",
+    "AUTOCOMPLETE_RESULT",
     "INIT",
     "USER_JOINED",
     "USER_LEFT",
@@ -17,12 +23,35 @@ MessageType = Literal[
 class CodeUpdatePayload(BaseModel):
     code: str
     cursor: Optional[int] = None
+    version: Optional[int] = None
+
+# Monaco-style range edit: delete `deleteLength` chars at `offset`, then insert `insertText` there
+class TextEdit(BaseModel):
+    offset: int = Field(ge=0)
+    deleteLength: int = Field(default=0, ge=0)
+    insertText: str = ""
+
+class CodePatchPayload(BaseModel):
+    # Document version the edits were made against
+    version: int = Field(ge=0)
+    # Applied in order, each offset relative to the document after the previous edit
+    edits: List[TextEdit]
+    cursor: Optional[int] = None
 
 class CursorUpdatePayload(BaseModel):
     cursor: int
     selectionStart: Optional[int] = None
     selectionEnd: Optional[int] = None
 
+class AutocompleteRequestPayload(BaseModel):
+    # Echoed on every result so the client can tell which request it answers
+    requestId: Union[str, int]
+    cursor: int = Field(ge=0)
+    # Document version the cursor refers to (default: the current one)
+    version: Optional[int] = None
+    # Suggestion engine to use (default: the room's language)
+    language: Optional[str] = None
+
 class ClientMessage(BaseModel):
     type: MessageType
     roomId: str
@@ -35,17 +64,65 @@ class CodeUpdateResponse(BaseModel):
     payload: CodeUpdatePayload
     timestamp: Optional[str] = None
 
+class CodePatchResponse(BaseModel):
+    type: Literal["CODE_PATCH"] = "CODE_PATCH"
+    roomId: str
+    payload: CodePatchPayload  # version is the document version *after* the edits
+    userId: Optional[str] = None
+    timestamp: Optional[str] = None
+
+class VersionPayload(BaseModel):
+    version: int
+
+class CodePatchAckResponse(BaseModel):
+    type: Literal["CODE_PATCH_ACK"] = "CODE_PATCH_ACK"
+    roomId: str
+    payload: VersionPayload
+
+class SnapshotPayload(BaseModel):
+    code: str
+    version: int
+
+class SnapshotResponse(BaseModel):
+    type: Literal["SNAPSHOT"] = "SNAPSHOT"
+    roomId: str
+    payload: SnapshotPayload
+
 class CursorUpdateResponse(BaseModel):
     type: Literal["CURSOR_UPDATE"] = "CURSOR_UPDATE"
     roomId: str
     payload: CursorUpdatePayload
     userId: Optional[str] = None  # For multi-user cursor tracking
 
+class UserCursor(CursorUpdatePayload):
+    cursor: Optional[int] = None
+    userId: str
+
+class CursorBatchPayload(BaseModel):
+    cursors: List[UserCursor]
+
+class CursorBatchResponse(BaseModel):
+    type: Literal["CURSOR_BATCH"] = "CURSOR_BATCH"
+    roomId: str
+    payload: CursorBatchPayload  # latest cursor per user since the previous batch
+
+class AutocompleteResultPayload(BaseModel):
+    requestId: Union[str, int]
+    suggestion: str
+    version: int  # document version the suggestion was computed against
+    done: bool  # no more results follow for this request
+
+class AutocompleteResultResponse(BaseModel):
+    type: Literal["AUTOCOMPLETE_RESULT"] = "AUTOCOMPLETE_RESULT"
+    roomId: str
+    payload: AutocompleteResultPayload
+
 class InitResponse(BaseModel):
     type: Literal["INIT"] = "INIT"
     roomId: str
     payload: CodeUpdatePayload
     connectionCount: int
+    userId: Optional[str] = None  # this connection's id, to skip it in CURSOR_BATCH
 
 class UserJoinedResponse(BaseModel):
     type: Literal["USER_JOINED"] = "USER_JOINED"
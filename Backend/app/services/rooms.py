@@ -1,34 +1,220 @@
+import asyncio
+import logging
 import uuid
-from sqlalchemy import select
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+from sqlalchemy import Integer, LargeBinary, String, Text, cast, column, delete, func, select, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.room import Room
+from app.core.cache import LRUCache
+from app.core.codec import dumps, loads
+from app.core.compression import COMPRESS_MIN_LENGTH, pack, unpack
+from app.core.config import settings
+from app.core.document import Rope
+from app.core.ot import Op
+from app.models.room import Room, RoomEdit, RoomSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Rows per multi-row INSERT; asyncpg allows at most 32767 bind parameters per statement
+INSERT_BATCH_ROWS = 5000
+
+# Rounds of fresh ids create_rooms tries; only ids taken by existing rooms are redrawn
+CREATE_ATTEMPTS = 5
+
+# room_id -> get_room_meta row, or None for ids with no room; see lookup_room
+room_directory = LRUCache(settings.ROOM_CACHE_SIZE, settings.ROOM_CACHE_TTL_S)
+_UNKNOWN = object()
+
+
+class StoredDocument(NamedTuple):
+    code: str
+    version: int
+    # version of the snapshot it was rebuilt from; everything after it came from room_edits
+    snapshot_version: int
+    # False for a room with no `rooms` row (opened by id only): its edits are never
+    # stored, so it must stay in memory
+    persisted: bool = True
+
+
+def new_room_id() -> str:
+    return uuid.uuid4().hex[:8]
 
 
 async def create_room(db: AsyncSession) -> str:
     """
     Generates a roomId, saves to DB, returns it.
     """
-    room_id = uuid.uuid4().hex[:8]
+    room_ids = await create_rooms(db, 1)
+    return room_ids[0]
 
-    room = Room(room_id=room_id, code="", language="python")
-    db.add(room)
+
+async def create_rooms(db: AsyncSession, count: int, language: str = "python") -> List[str]:
+    """
+    Create `count` rooms with random ids in multi-row INSERT ... ON CONFLICT DO NOTHING
+    RETURNING statements and one commit. Ids that turn out to be taken are redrawn and
+    inserted again, so a collision never fails the batch.
+    """
+    created: List[str] = []
+    for _ in range(CREATE_ATTEMPTS):
+        missing = count - len(created)
+        if not missing:
+            break
+        room_ids = set()
+        while len(room_ids) < missing:
+            room_ids.add(new_room_id())
+        rows = [{"room_id": room_id, "code": "", "language": language} for room_id in room_ids]
+        for start in range(0, len(rows), INSERT_BATCH_ROWS):
+            result = await db.execute(
+                insert(Room)
+                .values(rows[start:start + INSERT_BATCH_ROWS])
+                .on_conflict_do_nothing(index_elements=["room_id"])
+                .returning(Room.room_id)
+            )
+            created.extend(result.scalars())
+    if len(created) < count:
+        await db.rollback()
+        raise RuntimeError(f"No free room ids after {CREATE_ATTEMPTS} attempts")
     await db.commit()
+    # in case an id was looked up (and cached as missing) before it existed
+    for room_id in created:
+        room_directory.discard(room_id)
+    return created
 
-    return room_id
 
+async def load_document(db: AsyncSession, room_id: str) -> StoredDocument:
+    """The room's newest snapshot with the edits logged after it replayed on top."""
+    result = await db.execute(
+        select(RoomSnapshot.version, RoomSnapshot.code, RoomSnapshot.compressed)
+        .where(RoomSnapshot.room_id == room_id)
+        .order_by(RoomSnapshot.version.desc())
+        .limit(1)
+    )
+    snapshot = result.one_or_none()
+    base, code = (snapshot.version, unpack(snapshot.code, snapshot.compressed)) if snapshot else (0, "")
 
-async def get_room_code(db: AsyncSession, room_id: str) -> str:
-    result = await db.execute(select(Room).where(Room.room_id == room_id))
-    room = result.scalar_one_or_none()
-    return room.code if room else ""
-    
+    result = await db.execute(
+        select(RoomEdit.version, RoomEdit.ops, RoomEdit.compressed)
+        .where(RoomEdit.room_id == room_id, RoomEdit.version > base)
+        .order_by(RoomEdit.version)
+    )
+    document = Rope(code)
+    version = base
+    for edit_version, ops, compressed in result:
+        if edit_version != version + 1:
+            logger.warning("Edit log of room %s skips from version %d to %d; recovered up to %d",
+                           room_id, version, edit_version, version)
+            break
+        for offset, delete_length, insert_text in loads(unpack(ops, compressed)):
+            document.replace(offset, delete_length, insert_text)
+        version = edit_version
+    return StoredDocument(str(document), version, base)
 
-async def save_room_code(db: AsyncSession, room_id: str, code: str):
-    result = await db.execute(select(Room).where(Room.room_id == room_id))
-    room = result.scalar_one_or_none()
-    if room:
-        room.code = code
-        await db.commit()
+
+def _pack_rows(rows: List[Tuple[str, int, str]]) -> List[Tuple[str, int, str | None, bytes | None]]:
+    return [(room_id, version, *pack(text)) for room_id, version, text in rows]
+
+
+async def _insert_new(db: AsyncSession, model, payload: str, rows: List[Tuple[str, int, str]]) -> int:
+    # INSERT ... SELECT FROM (VALUES ...) JOIN rooms, so rows of unknown rooms are dropped
+    if any(len(text) >= COMPRESS_MIN_LENGTH for _, _, text in rows):
+        # compressing multi-MB documents would stall the event loop; zlib releases the GIL
+        rows = await asyncio.to_thread(_pack_rows, rows)
+    else:
+        rows = [(room_id, version, text, None) for room_id, version, text in rows]
+    inserted = 0
+    for start in range(0, len(rows), INSERT_BATCH_ROWS):
+        batch = values(
+            column("room_id", String),
+            column("version", Integer),
+            column(payload, Text),
+            column("compressed", LargeBinary),
+            name="batch",
+        ).data(rows[start:start + INSERT_BATCH_ROWS])
+        result = await db.execute(
+            insert(model)
+            .from_select(
+                ["room_id", "version", payload, "compressed"],
+                # a column of NULLs only would come out of VALUES as text
+                select(batch.c.room_id, batch.c.version, batch.c[payload], cast(batch.c.compressed, LargeBinary))
+                .join(Room, Room.room_id == batch.c.room_id),
+            )
+            .on_conflict_do_nothing(index_elements=["room_id", "version"])
+        )
+        inserted += result.rowcount
+    return inserted
+
+
+async def save_room_log(
+    db: AsyncSession,
+    edits: Iterable[Tuple[str, int, List[Op]]],
+    snapshots: Dict[str, Tuple[str, int]],
+) -> Tuple[int, int]:
+    """
+    Append (room_id, version, ops) edits to the log and write {room_id: (code, version)}
+    snapshots, in one transaction with one multi-row INSERT each; large payloads are stored
+    compressed. Rows already there (another worker holding the same room logs the same versions) and rooms missing from
+    `rooms` are skipped. Returns how many edit and snapshot rows were inserted.
+    """
+    edit_rows = [(room_id, version, dumps(ops).decode("utf-8")) for room_id, version, ops in edits]
+    snapshot_rows = [(room_id, version, code) for room_id, (code, version) in snapshots.items()]
+    logged = await _insert_new(db, RoomEdit, "ops", edit_rows)
+    snapshotted = await _insert_new(db, RoomSnapshot, "code", snapshot_rows)
+    await db.commit()
+    return logged, snapshotted
+
+
+async def compact_room_logs(db: AsyncSession, room_ids: Iterable[str]) -> int:
+    """
+    Delete the edits and older snapshots that each room's newest snapshot already covers.
+    Returns the number of edit rows deleted.
+    """
+    room_ids = list(room_ids)
+    if not room_ids:
+        return 0
+    newest = (
+        select(RoomSnapshot.room_id, func.max(RoomSnapshot.version).label("version"))
+        .where(RoomSnapshot.room_id.in_(room_ids))
+        .group_by(RoomSnapshot.room_id)
+        .subquery()
+    )
+    result = await db.execute(
+        delete(RoomEdit)
+        .where(RoomEdit.room_id == newest.c.room_id, RoomEdit.version <= newest.c.version)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(RoomSnapshot)
+        .where(RoomSnapshot.room_id == newest.c.room_id, RoomSnapshot.version < newest.c.version)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
+
+async def get_room_meta(db: AsyncSession, room_id: str) -> Row | None:
+    """room_id and language without loading the whole entity."""
+    result = await db.execute(select(Room.room_id, Room.language).where(Room.room_id == room_id))
+    return result.one_or_none()
+
+async def lookup_room(db: AsyncSession, room_id: str) -> Row | None:
+    """get_room_meta through the room directory cache; a miss either way is cached too."""
+    room = room_directory.get(room_id, _UNKNOWN)
+    if room is _UNKNOWN:
+        room = await get_room_meta(db, room_id)
+        room_directory.put(room_id, room, None if room else settings.ROOM_CACHE_NEGATIVE_TTL_S)
+    return room
+
+async def lookup_rooms(db: AsyncSession, room_ids: Iterable[str]) -> Dict[str, Row | None]:
+    """lookup_room for many ids at once, in order; the ones not cached are fetched in one query."""
+    rooms = {room_id: room_directory.get(room_id, _UNKNOWN) for room_id in room_ids}
+    uncached = [room_id for room_id, room in rooms.items() if room is _UNKNOWN]
+    if uncached:
+        result = await db.execute(select(Room.room_id, Room.language).where(Room.room_id.in_(uncached)))
+        found = {row.room_id: row for row in result}
+        for room_id in uncached:
+            room = rooms[room_id] = found.get(room_id)
+            room_directory.put(room_id, room, None if room else settings.ROOM_CACHE_NEGATIVE_TTL_S)
+    return rooms
 
 async def get_room_by_room_id(db: AsyncSession, room_id: str) -> Room | None:
     result = await db.execute(select(Room).where(Room.room_id == room_id))
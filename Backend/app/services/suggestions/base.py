@@ -0,0 +1,112 @@
+from typing import Dict, FrozenSet, List, Tuple
+import re
+from app.core.matcher import RuleMatcher
+
+
+def get_indentation(line: str) -> str:
+    """Get the indentation string for a line."""
+    return re.match(r'^(\s*)', line).group(1) if line else ""
+
+def indent_suggestion(suggestion: str, indentation: str) -> str:
+    """Apply indentation if suggestion spans multiple lines."""
+    if '\n' not in suggestion:
+        return suggestion
+    lines = suggestion.split('\n')
+    return '\n'.join([lines[0]] + [indentation + line for line in lines[1:]])
+
+_CALL_OPEN = re.compile(r'\w\(')
+
+def open_call(line: str) -> bool:
+    # Same as re.search(r'\w+\([^)]*$', line), without the backtracking: the
+    # "(" must come after the last ")", so only that tail needs scanning
+    return _CALL_OPEN.search(line, line.rfind(")") + 1) is not None
+
+def unterminated(quote: str):
+    """Predicate for lines with an odd number of `quote`s that don't end in an escaped one."""
+    escaped = "\\" + quote
+    return lambda line: line.count(quote) % 2 == 1 and not line.endswith(escaped)
+
+
+class SuggestionEngine:
+    """
+    Line-local suggestions for one language.
+
+    A language is described by the class attributes below; the rule table is built
+    from them once, when the registry first loads the engine. This base class is
+    also the engine for languages without one: it only closes brackets and quotes.
+    """
+
+    language = "plaintext"
+    # closing text suggested after an opening bracket
+    BRACKETS: Tuple[Tuple[str, str], ...] = (("(", ")"), ("[", "]"), ("{", "}"))
+    QUOTES: Tuple[str, ...] = ('"', "'")
+    # line suffix -> template; patterns ending in a space also match the bare word
+    PATTERNS: Dict[str, str] = {}
+    # last word on the line -> template
+    KEYWORDS: Dict[str, str] = {}
+    # words never offered as identifier completions
+    RESERVED: FrozenSet[str] = frozenset()
+    # suggestions for an empty line, at the top of the document and elsewhere
+    FIRST_LINE = ""
+    BLANK_LINE = ""
+
+    def __init__(self):
+        self.rules = self.build_rules()
+
+    def build_rules(self) -> RuleMatcher:
+        """
+        The context rules, in priority order; the first one that matches wins.
+        They run on the right-stripped line, so rules ending in whitespace only
+        ever match through `or_equals`.
+        """
+        rules = RuleMatcher()
+
+        # Incomplete brackets
+        for opener, closer in self.BRACKETS:
+            rules.suffix(opener, closer)
+
+        # Unterminated string quotes
+        for quote in self.QUOTES:
+            rules.test(unterminated(quote), quote)
+
+        # Common patterns
+        for pattern, suggestion in self.PATTERNS.items():
+            rules.suffix(pattern, suggestion, or_equals=pattern.rstrip())
+
+        self.add_rules(rules)
+        return rules
+
+    def add_rules(self, rules: RuleMatcher):
+        """Language-specific rules, ranked below brackets, quotes and patterns."""
+
+    def detect_context(self, current_line: str) -> str | None:
+        """Detect what the user is trying to write based on context."""
+        return self.rules.match(current_line.rstrip())
+
+    def suggest(self, current_line: str, first_line: bool) -> str:
+        """Generate a suggestion from the current line (up to the cursor) alone."""
+        indentation = get_indentation(current_line)
+
+        # Try to detect context
+        suggestion = self.detect_context(current_line)
+
+        if suggestion:
+            return indent_suggestion(suggestion, indentation)
+
+        # Fallback: analyze the last few words
+        words = current_line.strip().split()
+        if not words:
+            # Empty line - suggest common patterns
+            return self.FIRST_LINE if first_line else self.BLANK_LINE
+
+        last_word = words[-1].lower()
+
+        if last_word in self.KEYWORDS:
+            return indent_suggestion(self.KEYWORDS[last_word], indentation)
+
+        # Default: no suggestion
+        return ""
+
+    def scan_line(self, line: str) -> List[str]:
+        """Names a single line defines, for the room's symbol index."""
+        return []
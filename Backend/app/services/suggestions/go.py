@@ -0,0 +1,82 @@
+from typing import List
+import re
+from app.core.matcher import RuleMatcher
+from app.services.suggestions.base import SuggestionEngine, open_call
+
+# One anchored match per line: func (or method), type, var/const, import or a := declaration
+_DEFINITION = re.compile(
+    r"\s*(?:"
+    r"func\s+(?:\([^)]*\)\s*)?(?P<fn>\w+)"
+    r"|type\s+(?P<typ>\w+)"
+    r"|(?:var|const)\s+(?P<var>\w+(?:\s*,\s*\w+)*)"
+    r"|import\s+(?P<imp>\w+\s+)?\"(?P<path>[^\"]+)\""
+    r"|(?:(?:for|if|switch)\s+)?(?P<short>\w+(?:\s*,\s*\w+)*)\s*:="
+    r")"
+)
+
+
+class GoEngine(SuggestionEngine):
+    language = "go"
+
+    QUOTES = ('"', "'", "`")
+
+    # Keyword-based suggestions for the last word on the line
+    KEYWORDS = {
+        "package": " main",
+        "import": " \"fmt\"",
+        "func": " name() {\n    \n}",
+        "type": " Name struct {\n    \n}",
+        "struct": " {\n    \n}",
+        "interface": " {\n    \n}",
+        "if": " condition {\n    \n}",
+        "else": " {\n    \n}",
+        "for": " i := 0; i < n; i++ {\n    \n}",
+        "range": " items",
+        "switch": " value {\ncase x:\n}",
+        "select": " {\ncase msg := <-ch:\n}",
+        "go": " func() {\n    \n}()",
+        "defer": " f.Close()",
+        "var": " name type",
+        "const": " name = value",
+        "return": " nil",
+    }
+
+    # The same templates right after the keyword and its space
+    PATTERNS = {
+        **{word + " ": template[1:] for word, template in KEYWORDS.items()},
+        "fmt.": "Println()",
+        "// ": "",  # Comment - no suggestion
+    }
+
+    RESERVED = frozenset((
+        "break", "case", "chan", "const", "continue", "default", "defer", "else",
+        "fallthrough", "for", "func", "go", "goto", "if", "import", "interface", "map",
+        "package", "range", "return", "select", "struct", "switch", "type", "var",
+        "nil", "true", "false", "iota",
+    ))
+
+    FIRST_LINE = "package main\n\nimport \"fmt\"\n\nfunc main() {\n    fmt.Println(\"hello\")\n}"
+    BLANK_LINE = "// Add your code here"
+
+    def add_rules(self, rules: RuleMatcher):
+        # The error check that follows most calls
+        rules.suffix("err != nil", " {\n    return err\n}")
+
+        # Incomplete function calls
+        rules.test(open_call, ")")
+
+        # Incomplete assignment (= and :=)
+        rules.suffix("=", " value", unless=("==", "!=", "<=", ">="))
+
+    def scan_line(self, line: str) -> List[str]:
+        match = _DEFINITION.match(line)
+        if match is None:
+            return []
+        if match.group("path") is not None:
+            # `import "net/http"` binds http, `import h "net/http"` binds h
+            alias = match.group("imp")
+            names = [alias.strip() if alias else match.group("path").rsplit("/", 1)[-1]]
+        else:
+            names = match.group(match.lastgroup).split(",")
+        names = [name.strip() for name in names]
+        return [name for name in names if name.isidentifier() and name != "_" and name not in self.RESERVED]
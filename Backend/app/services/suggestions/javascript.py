@@ -0,0 +1,149 @@
+from typing import List
+import re
+from app.core.matcher import RuleMatcher
+from app.services.suggestions.base import SuggestionEngine, open_call
+
+_NAME = r"[A-Za-z_$][\w$]*"
+
+# One anchored match per line: function, class, variable declaration or import.
+# TypeScript-only declarations are recognised too; they never start a JavaScript line.
+_DEFINITION = re.compile(
+    r"\s*(?:export\s+(?:default\s+)?)?(?:declare\s+)?(?:"
+    rf"(?:async\s+)?function\s*\*?\s*(?P<fn>{_NAME})"
+    rf"|(?:abstract\s+)?class\s+(?P<cls>{_NAME})"
+    r"|(?:const|let|var)\s+(?P<var>[^;]+)"
+    r"|import\s+(?:type\s+)?(?P<imp>[^'\"]+?)\s+from\b"
+    rf"|(?:interface|type|enum|namespace)\s+(?P<typ>{_NAME})"
+    r")"
+)
+
+def _bindings(declarations: str) -> List[str]:
+    """
+    The binding of each declarator in a list like `a = f(1, 2), { b, c } = d, e`: the
+    text before its initializer. Commas inside brackets, strings and type arguments
+    don't separate declarators.
+    """
+    bindings = []
+    depth, quote, start, end = 0, None, 0, None
+    for i, char in enumerate(declarations):
+        if quote is not None:
+            if char == quote and declarations[i - 1] != "\\":
+                quote = None
+        elif char in "\"'`":
+            quote = char
+        elif char in "([{" or (char == "<" and end is None):
+            depth += 1
+        elif char in ")]}" or (char == ">" and end is None):
+            depth -= 1
+        elif depth == 0 and char == "=" and end is None:
+            end = i
+        elif depth == 0 and char == ",":
+            bindings.append(declarations[start:i if end is None else end])
+            start, end = i + 1, None
+    bindings.append(declarations[start:end])
+    return bindings
+
+def _bound_names(clause: str) -> List[str]:
+    """Names bound by a declarator list, a destructuring pattern or an import clause."""
+    # `{ key: name }` binds name, `name: Type` binds name
+    destructured = clause.lstrip().startswith("{")
+    names = []
+    for part in re.split(r"[{},\[\]]", clause):
+        part = part.split("=", 1)[0].strip().lstrip(".")
+        if " as " in part:
+            part = part.rsplit(" as ", 1)[1]
+        elif ":" in part:
+            part = part.split(":", 1)[1 if destructured else 0]
+        names.append(part.strip())
+    return [name for name in names if name.isidentifier()]
+
+
+class JavaScriptEngine(SuggestionEngine):
+    language = "javascript"
+
+    QUOTES = ('"', "'", "`")
+
+    # Keyword-based suggestions for the last word on the line
+    KEYWORDS = {
+        "if": " (condition) {\n    \n}",
+        "else": " {\n    \n}",
+        "for": " (let i = 0; i < n; i++) {\n    \n}",
+        "while": " (condition) {\n    \n}",
+        "do": " {\n    \n} while (condition);",
+        "switch": " (value) {\n    case x:\n        break;\n}",
+        "function": " name() {\n    \n}",
+        "class": " ClassName {\n    constructor() {\n    }\n}",
+        "try": " {\n    \n} catch (error) {\n    \n}",
+        "catch": " (error) {\n    \n}",
+        "finally": " {\n    \n}",
+        "import": " { name } from 'module';",
+        "export": " default ",
+        "const": " name = value;",
+        "let": " name = value;",
+        "return": " value;",
+        "throw": " new Error('message');",
+        "await": " promise;",
+    }
+
+    # The same templates right after the keyword and its space
+    PATTERNS = {
+        **{word + " ": template[1:] for word, template in KEYWORDS.items()},
+        "console.": "log()",
+        "// ": "",  # Comment - no suggestion
+    }
+
+    RESERVED = frozenset((
+        "await", "break", "case", "catch", "class", "const", "continue", "debugger",
+        "default", "delete", "do", "else", "export", "extends", "false", "finally",
+        "for", "function", "if", "import", "in", "instanceof", "let", "new", "null",
+        "return", "super", "switch", "this", "throw", "true", "try", "typeof",
+        "undefined", "var", "void", "while", "with", "yield",
+    ))
+
+    FIRST_LINE = "function main() {\n    \n}\n\nmain();"
+    BLANK_LINE = "// Add your code here"
+
+    def add_rules(self, rules: RuleMatcher):
+        # Arrow function body
+        rules.suffix("=>", " {\n    \n}")
+
+        # Incomplete function calls
+        rules.test(open_call, ")")
+
+        # Incomplete assignment
+        rules.suffix("=", " value;", unless=("==", "!=", "<=", ">="))
+
+    def scan_line(self, line: str) -> List[str]:
+        match = _DEFINITION.match(line)
+        if match is None:
+            return []
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "var":
+            names = [name for binding in _bindings(value) for name in _bound_names(binding)]
+        elif kind == "imp":
+            names = _bound_names(value)
+        else:
+            return [value] if value.isidentifier() else []
+        return [name for name in names if name not in self.RESERVED]
+
+
+class TypeScriptEngine(JavaScriptEngine):
+    language = "typescript"
+
+    KEYWORDS = {
+        **JavaScriptEngine.KEYWORDS,
+        "interface": " Name {\n    \n}",
+        "type": " Name = ;",
+        "enum": " Name {\n    \n}",
+    }
+
+    PATTERNS = {
+        **JavaScriptEngine.PATTERNS,
+        **{word + " ": template[1:] for word, template in KEYWORDS.items()},
+    }
+
+    RESERVED = JavaScriptEngine.RESERVED | frozenset((
+        "any", "boolean", "enum", "implements", "interface", "keyof", "never",
+        "number", "private", "protected", "public", "readonly", "string", "unknown",
+    ))
@@ -0,0 +1,117 @@
+from typing import List
+import keyword
+import re
+from app.core.matcher import RuleMatcher
+from app.services.suggestions.base import SuggestionEngine, open_call
+
+# Common Python imports
+COMMON_IMPORTS = [
+    "os", "sys", "json", "datetime", "random", "math", "collections",
+    "itertools", "functools", "operator", "re", "pathlib", "typing"
+]
+
+# One anchored match per line: def, class, import, from-import or a plain assignment target list
+_DEFINITION = re.compile(
+    r"\s*(?:"
+    r"(?:async\s+)?def\s+(?P<def>[A-Za-z_]\w*)"
+    r"|class\s+(?P<cls>[A-Za-z_]\w*)"
+    r"|import\s+(?P<imp>.+)"
+    r"|from\s+[\w.]+\s+import\s+(?P<frm>.+)"
+    r"|(?P<asg>[A-Za-z_]\w*(?:\s*,\s*[A-Za-z_]\w*)*)\s*(?::[^=]*)?=(?!=)"
+    r")"
+)
+
+
+def _imported_names(clause: str, from_import: bool) -> List[str]:
+    names = []
+    for part in clause.split("#", 1)[0].strip("()\\ ").split(","):
+        words = part.split()
+        if not words:
+            continue
+        if len(words) == 3 and words[1] == "as":
+            names.append(words[2])
+        elif from_import:
+            names.append(words[0])
+        else:
+            # `import os.path` binds `os`
+            names.append(words[0].split(".", 1)[0])
+    return [name for name in names if name.isidentifier()]
+
+
+def _open_comprehension(line: str, opener: str) -> bool:
+    # Same as re.search(r'\[.*for.*$', line): "for" anywhere after the first opener
+    start = line.find(opener)
+    return start != -1 and line.find("for", start + 1) != -1
+
+
+class PythonEngine(SuggestionEngine):
+    language = "python"
+
+    # Common Python patterns
+    PATTERNS = {
+        "import ": COMMON_IMPORTS[0],  # Default to first common import
+        "from ": "module import ",
+        "def ": "function_name():\n    pass",
+        "class ": "ClassName:\n    def __init__(self):\n        pass",
+        "if ": "condition:\n    pass",
+        "elif ": "condition:\n    pass",
+        "else:": "\n    pass",
+        "for ": "item in iterable:\n    pass",
+        "while ": "condition:\n    pass",
+        "try:": "\n    pass\nexcept Exception as e:\n    pass",
+        "with ": "open('file.txt') as f:\n    pass",
+        "async def ": "function_name():\n    return",
+        "lambda ": "x: x",
+        "@": "decorator\n",
+        "# ": "",  # Comment - no suggestion
+    }
+
+    # Keyword-based suggestions for the last word on the line
+    KEYWORDS = {
+        "if": " condition:\n    pass",
+        "elif": " condition:\n    pass",
+        "else": ":",
+        "for": " item in iterable:\n    pass",
+        "while": " condition:\n    pass",
+        "def": " function_name():\n    pass",
+        "class": " ClassName:\n    def __init__(self):\n        pass",
+        "try": ":",
+        "except": " Exception as e:\n    pass",
+        "finally": ":",
+        "with": " open('file.txt') as f:\n    pass",
+        "import": " os",
+        "from": " module import ",
+        "return": " value",
+        "yield": " value",
+        "raise": " Exception('message')",
+        "assert": " condition, 'message'",
+    }
+
+    RESERVED = frozenset(keyword.kwlist)
+
+    FIRST_LINE = "def main():\n    pass\n\nif __name__ == '__main__':\n    main()"
+    BLANK_LINE = "# Add your code here"
+
+    def add_rules(self, rules: RuleMatcher):
+        # Incomplete function calls and comprehensions
+        rules.test(open_call, ")")
+        rules.test(lambda line: _open_comprehension(line, "["), " in iterable]")
+        rules.test(lambda line: _open_comprehension(line, "{"), " in iterable}")
+
+        # Incomplete assignment
+        rules.suffix("=", " value", unless=("==", "!="))
+
+    def scan_line(self, line: str) -> List[str]:
+        # functions, classes, imports and assignment targets
+        match = _DEFINITION.match(line)
+        if match is None:
+            return []
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ("def", "cls"):
+            return [value]
+        if kind == "imp":
+            return _imported_names(value, from_import=False)
+        if kind == "frm":
+            return _imported_names(value, from_import=True)
+        return [name.strip() for name in value.split(",") if not keyword.iskeyword(name.strip())]
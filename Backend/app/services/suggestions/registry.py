@@ -0,0 +1,62 @@
+from typing import Dict, List
+import importlib
+import logging
+from app.services.suggestions.base import SuggestionEngine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = "python"
+# Languages without an engine of their own get bracket and quote completion only
+FALLBACK_LANGUAGE = "plaintext"
+
+# language -> "module:Class"; the module is imported and the engine built on first use
+ENGINES: Dict[str, str] = {
+    "plaintext": "app.services.suggestions.base:SuggestionEngine",
+    "python": "app.services.suggestions.python:PythonEngine",
+    "javascript": "app.services.suggestions.javascript:JavaScriptEngine",
+    "typescript": "app.services.suggestions.javascript:TypeScriptEngine",
+    "go": "app.services.suggestions.go:GoEngine",
+}
+
+# other names editors and clients use for the same languages
+ALIASES: Dict[str, str] = {
+    "py": "python",
+    "js": "javascript",
+    "jsx": "javascript",
+    "ts": "typescript",
+    "tsx": "typescript",
+    "golang": "go",
+    "text": "plaintext",
+}
+
+# language -> loaded engine
+_engines: Dict[str, SuggestionEngine] = {}
+
+
+def resolve_language(language: str | None) -> str:
+    """Canonical engine name for a client-supplied language (default: python)."""
+    if not language:
+        return DEFAULT_LANGUAGE
+    name = language.strip().lower()
+    name = ALIASES.get(name, name)
+    return name if name in ENGINES else FALLBACK_LANGUAGE
+
+
+def get_engine(language: str | None) -> SuggestionEngine:
+    name = resolve_language(language)
+    engine = _engines.get(name)
+    if engine is None:
+        module_name, class_name = ENGINES[name].split(":")
+        engine = getattr(importlib.import_module(module_name), class_name)()
+        _engines[name] = engine
+        logger.info("Loaded %s suggestion engine (%d rules)", name, len(engine.rules.results))
+    return engine
+
+
+def suggest(language: str, current_line: str, first_line: bool) -> str:
+    """Engine suggestion by language name; a plain function so a process pool can run it."""
+    return get_engine(language).suggest(current_line, first_line)
+
+
+def loaded_languages() -> List[str]:
+    return sorted(_engines)
@@ -0,0 +1,35 @@
+# benchmarks/autocomplete.py
+"""
+Cost of one Python suggestion (user-011): the endswith chain and per-request regexes
+it replaced, against the engine's compiled RuleMatcher, on ordinary lines and on
+10,000-character lines built to make the old regexes backtrack.
+
+    python -m benchmarks.autocomplete
+"""
+from benchmarks.common import per_call_us, print_table
+from app.services.suggestions.registry import get_engine
+from tests import legacy_autocomplete
+
+LINES = {
+    "def handler(request, ": "def handler(request, ",
+    "    for item in ": "    for item in ",
+    "'a' * 10000 + '!'": "a" * 10_000 + "!",
+    "'[' + 'fo' * 5000": "[" + "fo" * 5_000,
+    "'f(x) ' * 2000": "f(x) " * 2_000,
+    "'{' + 'x for ' * 1600": "{" + "x for " * 1_600,
+}
+
+
+def main():
+    engine = get_engine("python")
+    rows = []
+    for label, line in LINES.items():
+        number = 2_000 if len(line) < 100 else 5
+        before = per_call_us(lambda: legacy_autocomplete.get_smart_suggestion(line, len(line)), number)
+        after = per_call_us(lambda: engine.suggest(line, False), number)
+        rows.append([label, len(line), f"{before:.1f}", f"{after:.1f}", f"{before / after:.0f}x"])
+    print_table(["line", "chars", "before µs", "after µs", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/codec.py
+"""
+Encode and decode cost of one CODE_UPDATE frame (user-010), for documents from a short
+snippet to a large file: the stdlib json the endpoint used before, against the JSON
+(orjson when installed) and MessagePack codecs connections now negotiate.
+
+    python -m benchmarks.codec
+"""
+from benchmarks.common import per_call_us, print_table
+from app.core.codec import JSON, MSGPACK
+import json
+import random
+import string
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def source(size: int, rng: random.Random) -> str:
+    """Indented lines of identifiers, quotes and brackets, about the shape of real code."""
+    alphabet = string.ascii_letters + string.digits + "    ()[]=:.,'\"_"
+    lines, total = [], 0
+    while total < size:
+        line = "    " * rng.randint(0, 3) + "".join(rng.choice(alphabet) for _ in range(rng.randint(10, 70)))
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def main():
+    rng = random.Random(1)
+    rows = []
+    for size in SIZES:
+        message = {
+            "type": "CODE_UPDATE",
+            "roomId": "c9122af7",
+            "payload": {"code": source(size, rng), "cursor": 22, "version": 41},
+            "timestamp": "2026-10-16T12:00:00",
+        }
+        number = max(5, 2_000_000 // size)
+        stdlib = json.dumps(message)
+        row = [
+            f"{size // 1000} KB",
+            f"{per_call_us(lambda: json.dumps(message), number):.1f}",
+            f"{per_call_us(lambda: json.loads(stdlib), number):.1f}",
+        ]
+        for codec in (JSON, MSGPACK):
+            if codec is None:
+                row += ["-", "-", "-"]
+                continue
+            frame = codec.encode(message)
+            row += [
+                f"{per_call_us(lambda: codec.encode(message), number):.1f}",
+                f"{per_call_us(lambda: codec.decode(frame), number):.1f}",
+                len(frame),
+            ]
+        rows.append(row)
+    print_table(
+        ["document", "json enc µs", "json dec µs", "JSON codec enc µs", "JSON codec dec µs", "bytes",
+         "msgpack enc µs", "msgpack dec µs", "bytes"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
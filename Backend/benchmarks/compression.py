@@ -0,0 +1,95 @@
+# benchmarks/compression.py
+"""
+Bytes stored, bytes on the wire and CPU cost of document compression (user-022), for the
+app's own source, synthetic access logs and numeric CSV of 100 KB to 5 MB:
+
+- stored: what pack() keeps in room_snapshots / room_edits, and its pack and unpack time
+- INIT: the document field of a ?compress=zlib INIT under JSON (base64) and msgpack
+- GET: the /rooms/{id} body through GZipMiddleware at WIRE_LEVEL, which the app uses,
+  and at level 9, the middleware's default
+
+Sizes in MB, times in milliseconds per call.
+
+    python -m benchmarks.compression
+"""
+from benchmarks.common import print_table
+from app.core.compression import WIRE_LEVEL, compress_for_wire, pack, unpack
+from pathlib import Path
+import gzip
+import json
+import random
+import time
+
+SIZES = (100_000, 1_000_000, 5_000_000)
+APP = Path(__file__).resolve().parent.parent / "app"
+
+
+def source(size: int, rng: random.Random) -> str:
+    text = "".join(path.read_text() for path in sorted(APP.rglob("*.py")))
+    return (text * (size // len(text) + 1))[:size]
+
+
+def access_log(size: int, rng: random.Random) -> str:
+    lines = (
+        f"2026-10-16T12:{n % 60:02d}:{n * 7 % 60:02d}Z INFO api.worker-{n % 7} "
+        f"GET /rooms/{rng.getrandbits(32):08x} 200 {rng.randint(1, 900)}ms\n"
+        for n in range(size // 80 + 1)
+    )
+    return "".join(lines)[:size]
+
+
+def numeric_csv(size: int, rng: random.Random) -> str:
+    lines = (
+        f"{n},{rng.random():.6f},{rng.randint(0, 10 ** 6)},{rng.choice(['alpha', 'beta', 'gamma'])}\n"
+        for n in range(size // 30 + 1)
+    )
+    return "".join(lines)[:size]
+
+
+KINDS = {"source": source, "logs": access_log, "csv": numeric_csv}
+
+
+def timed(fn, *args, repeat: int = 5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(*args)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    rng = random.Random(7)
+    rows = []
+    for kind, generate in KINDS.items():
+        for size in SIZES:
+            text = generate(size, rng)
+            (plain, compressed), pack_ms = timed(pack, text)
+            _, unpack_ms = timed(unpack, plain, compressed)
+            stored = len(compressed) if compressed is not None else len(text.encode("utf-8"))
+            init_json, wire_ms = timed(compress_for_wire, text, False)
+            init_msgpack = compress_for_wire(text, True)
+            body = json.dumps({"roomId": "c9122af7", "code": text, "language": "python"}).encode("utf-8")
+            gzipped, gzip_ms = timed(gzip.compress, body, WIRE_LEVEL)
+            _, gzip9_ms = timed(gzip.compress, body, 9, repeat=2)
+            rows.append([
+                kind,
+                f"{size / 1e6:.1f}",
+                f"{stored / 1e6:.2f}",
+                f"{size / stored:.1f}x",
+                f"{pack_ms:.1f}",
+                f"{unpack_ms:.1f}",
+                f"{len(init_json['code']) / 1e6:.2f}",
+                f"{len(init_msgpack['code']) / 1e6:.2f}",
+                f"{wire_ms:.1f}",
+                f"{len(gzipped) / 1e6:.2f}",
+                f"{gzip_ms:.1f}",
+                f"{gzip9_ms:.1f}",
+            ])
+    print_table(
+        ["kind", "MB", "stored", "ratio", "pack", "unpack", "INIT json", "INIT msgpack", "INIT ms",
+         "GET", "GET ms", "gzip-9 ms"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# benchmarks/cursor_window.py
+"""
+One suggestion with the cursor near the end of documents from 1 KB to 10 MB (user-012).
+Before, the whole text up to the cursor was sliced and split into lines; now only the
+cursor's line is read, from a str (HTTP) or from the room's rope (WebSocket), so the
+cost stays flat as the document grows.
+
+    python -m benchmarks.cursor_window
+"""
+from benchmarks.common import per_call_us, print_table
+from app.api.autocomplete import get_cursor_window, get_rope_cursor_window
+from app.core.document import Rope
+from app.services.suggestions.registry import get_engine
+from tests import legacy_autocomplete
+
+SIZES = (1_000, 100_000, 1_000_000, 10_000_000)
+LINE = "    result = compute(value, other) + helper(x)\n"
+
+
+def main():
+    engine = get_engine("python")
+    rows = []
+    for size in SIZES:
+        code = (LINE * (size // len(LINE) + 1))[:size]
+        rope = Rope(code)
+        cursor = size - 10
+        number = max(5, 2_000_000 // size)
+        before = per_call_us(lambda: legacy_autocomplete.get_smart_suggestion(code, cursor), number)
+        after = per_call_us(lambda: engine.suggest(*get_cursor_window(code, cursor)), 2_000)
+        rope_after = per_call_us(lambda: engine.suggest(*get_rope_cursor_window(rope, cursor)), 2_000)
+        rows.append([f"{size // 1000:,} KB", f"{before:.1f}", f"{after:.1f}", f"{rope_after:.1f}"])
+    print_table(["document", "before µs", "str window µs", "rope window µs"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/cursors.py
+"""
+Cursor frames sent per second in one room (user-008): every CURSOR_UPDATE rebroadcast to
+the others as it arrives (before), against per-user coalescing into one CURSOR_BATCH per
+CURSOR_FLUSH_HZ tick (after). Each user moves the caret UPDATE_HZ times a second.
+
+    python -m benchmarks.cursors
+"""
+from benchmarks.common import print_table
+from app.core.config import settings
+from app.core.websocket_manager import RoomState
+import asyncio
+
+UPDATE_HZ = 60
+SECONDS = 2.0
+
+
+class CountingSocket:
+    def __init__(self):
+        self.frames = 0
+
+    async def send_text(self, data: str):
+        self.frames += 1
+
+
+async def frames_per_second(users: int, coalesce: bool) -> float:
+    room = RoomState("bench")
+    sockets = [CountingSocket() for _ in range(users)]
+    for n, socket in enumerate(sockets):
+        room.add_connection(socket, f"user{n}")
+
+    async def move(n: int, socket: CountingSocket):
+        for tick in range(int(SECONDS * UPDATE_HZ)):
+            cursor = {"cursor": tick, "selectionStart": None, "selectionEnd": None}
+            if coalesce:
+                room.queue_cursor(f"user{n}", cursor)
+            else:
+                room.broadcast({"type": "CURSOR_UPDATE", "roomId": "bench", "payload": cursor, "userId": f"user{n}"},
+                               exclude=socket)
+            await asyncio.sleep(1 / UPDATE_HZ)
+
+    await asyncio.gather(*(move(n, socket) for n, socket in enumerate(sockets)))
+    # let the last tick and the writers drain
+    await asyncio.sleep(2 / settings.CURSOR_FLUSH_HZ)
+    for connection in list(room.connections.values()):
+        connection.outbox.close()
+    room.close()
+    return sum(socket.frames for socket in sockets) / SECONDS
+
+
+async def main():
+    rows = []
+    for users in (2, 5, 10):
+        before = await frames_per_second(users, coalesce=False)
+        after = await frames_per_second(users, coalesce=True)
+        rows.append((users, f"{before:,.0f}", f"{after:,.0f}", f"{before / after:.1f}x"))
+    print(f"{UPDATE_HZ} caret moves/s per user, CURSOR_FLUSH_HZ={settings.CURSOR_FLUSH_HZ:g}; frames sent per second")
+    print_table(("users", "before", "after", "fewer"), rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+# benchmarks/edit_log.py
+"""
+Write amplification and recovery time of the edit log (user-021).
+
+Bytes written for a typing session of EDITS single-character edits at TYPING_HZ: before,
+every PERSIST_FLUSH_INTERVAL_MS flush rewrote the whole document; now each edit is one
+small row and the document is written again only as a snapshot every
+PERSIST_SNAPSHOT_EVERY versions. Recovery is load_document on the newest snapshot plus
+the longest tail it can have, PERSIST_SNAPSHOT_EVERY - 1 edits, against building the
+document from the snapshot alone. Log and snapshot rows are stored as save_room_log packs
+them (user-022).
+
+    python -m benchmarks.edit_log
+"""
+from benchmarks.common import print_table
+from app.core.codec import dumps
+from app.core.compression import pack
+from app.core.config import settings
+from app.core.document import Rope
+from app.services.rooms import load_document
+import asyncio
+import random
+import time
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+EDITS = 2_000
+TYPING_HZ = 5
+# room_id, version and row overhead, roughly, per stored row
+ROW_OVERHEAD = 40
+RECOVERIES = 20
+
+
+class Row(tuple):
+    version = property(lambda row: row[0])
+    code = property(lambda row: row[1])
+    compressed = property(lambda row: row[2])
+
+
+class Result(list):
+    def one_or_none(self):
+        return self[0] if self else None
+
+
+class Tables:
+    """Answers load_document's two SELECTs: the snapshot first, then the log tail."""
+
+    def __init__(self, snapshot: Row, tail: list):
+        self.snapshot = snapshot
+        self.tail = tail
+
+    async def execute(self, statement):
+        if statement.get_final_froms()[0].name == "room_snapshots":
+            return Result([self.snapshot])
+        return Result(self.tail)
+
+
+def typing_session(size: int, rng: random.Random):
+    """A document of `size` characters and EDITS mostly-insert single-character edits of it."""
+    base = "".join(rng.choice("abcdefgh    \n") for _ in range(size))
+    document, edits = Rope(base), []
+    for version in range(1, EDITS + 1):
+        offset = rng.randint(0, len(document))
+        if rng.random() < 0.8 or offset == len(document):
+            op = (offset, 0, rng.choice("xyz"))
+        else:
+            op = (offset, 1, "")
+        document.replace(*op)
+        edits.append((version, [op]))
+    return base, edits
+
+
+def stored_bytes(text: str) -> int:
+    plain, compressed = pack(text)
+    return ROW_OVERHEAD + (len(compressed) if compressed is not None else len(plain.encode("utf-8")))
+
+
+async def recovery_ms(base: str, edits: list) -> tuple[float, float]:
+    snapshot = Row((0, *pack(base)))
+    tail = [Row((version, *pack(dumps(ops).decode("utf-8")))) for version, ops in edits[:settings.PERSIST_SNAPSHOT_EVERY - 1]]
+    tables = Tables(snapshot, tail)
+    start = time.perf_counter()
+    for _ in range(RECOVERIES):
+        await load_document(tables, "bench")
+    replayed = (time.perf_counter() - start) / RECOVERIES
+    start = time.perf_counter()
+    for _ in range(RECOVERIES):
+        await load_document(Tables(snapshot, []), "bench")
+    snapshot_only = (time.perf_counter() - start) / RECOVERIES
+    return replayed * 1000, snapshot_only * 1000
+
+
+async def main():
+    rng = random.Random(5)
+    edits_per_flush = TYPING_HZ * settings.PERSIST_FLUSH_INTERVAL_MS / 1000
+    rows = []
+    for size in SIZES:
+        base, edits = typing_session(size, rng)
+        # the old flush wrote rooms.code as plain text
+        before = EDITS / edits_per_flush * (ROW_OVERHEAD + len(base.encode("utf-8")))
+        after = (sum(stored_bytes(dumps(ops).decode("utf-8")) for _, ops in edits)
+                 + EDITS // settings.PERSIST_SNAPSHOT_EVERY * stored_bytes(base))
+        replayed, snapshot_only = await recovery_ms(base, edits)
+        rows.append([
+            f"{size // 1000} KB",
+            f"{before / 1e6:.2f}",
+            f"{after / 1e6:.3f}",
+            f"{before / after:.0f}x",
+            f"{replayed:.2f}",
+            f"{snapshot_only:.2f}",
+        ])
+    print(f"{EDITS} edits at {TYPING_HZ}/s, snapshot every {settings.PERSIST_SNAPSHOT_EVERY} versions")
+    print_table(
+        ["document", "rewrite MB", "log MB", "less written", "recover ms", "snapshot only ms"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
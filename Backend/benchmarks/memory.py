@@ -0,0 +1,82 @@
+# benchmarks/memory.py
+"""
+Memory held per idle room and per connection (user-020), measured with tracemalloc at
+100k idle rooms holding a small document, then 10k of them with one connection each.
+Room ids, documents and each connection's writer task are included. The breakdown lists
+where an idle room's bytes are allocated.
+
+    python -m benchmarks.memory
+"""
+from benchmarks.common import print_table
+from app.core.websocket_manager import RoomState
+import asyncio
+import gc
+import tracemalloc
+
+ROOMS = 100_000
+CONNECTIONS = 10_000
+DOCUMENT = "def main():\n    return 1\n"
+
+
+class IdleSocket:
+    async def send_text(self, data: str):
+        pass
+
+    async def close(self, code: int | None = None):
+        pass
+
+
+def measure(build) -> tuple[object, int, tracemalloc.Snapshot]:
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return result, size, snapshot
+
+
+def idle_rooms() -> list:
+    rooms = []
+    for n in range(ROOMS):
+        # a copy per room, as every room loads its own document
+        room = RoomState(f"{n:08x}", "".join([DOCUMENT]))
+        room.synced.set_result(None)
+        room.sync_buffer = None
+        rooms.append(room)
+    return rooms
+
+
+async def main():
+    rooms, room_bytes, snapshot = measure(idle_rooms)
+
+    async def connect():
+        connections = [room.add_connection(IdleSocket(), f"user{n:07d}") for n, room in enumerate(rooms[:CONNECTIONS])]
+        # let every writer task start and park on its empty queue
+        await asyncio.sleep(0)
+        return connections
+
+    gc.collect()
+    tracemalloc.start()
+    await connect()
+    gc.collect()
+    connection_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print_table(
+        ["", "count", "B each", "total MB"],
+        [
+            ["idle room", ROOMS, f"{room_bytes / ROOMS:.0f}", f"{room_bytes / 1e6:.1f}"],
+            ["connection", CONNECTIONS, f"{connection_bytes / CONNECTIONS:.0f}", f"{connection_bytes / 1e6:.1f}"],
+        ],
+    )
+    print()
+    print_table(
+        ["idle room: B each", "allocated at"],
+        [[f"{stat.size / ROOMS:.0f}", stat.traceback[0]] for stat in snapshot.statistics("lineno")[:8]],
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
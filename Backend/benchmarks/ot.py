@@ -0,0 +1,56 @@
+# benchmarks/ot.py
+"""
+Server-side cost of accepting a CODE_PATCH (user-003): rebase over the versions the
+sender missed, apply to the rope, record. The convergence checks are in tests/test_ot.py.
+
+    python -m benchmarks.ot
+"""
+from benchmarks.common import per_call_us, print_table
+from app.core.document import Rope
+from app.core.ot import HISTORY_LIMIT, EditHistory
+import random
+
+DOC = "def handler(event):\n    return event\n" * 2000
+PATCHES = 20000
+
+
+def rebase_cost(lag: int) -> float:
+    history = EditHistory()
+    for _ in range(HISTORY_LIMIT):
+        history.record([(random.randrange(len(DOC)), 0, "x")])
+    base = history.version - lag
+    return per_call_us(lambda: history.rebase(base, [(100, 0, "y")]), 2000)
+
+
+def patch_throughput(editors: int) -> float:
+    """Patches per second from `editors` clients, each sent against a version up to `editors` behind."""
+    rng = random.Random(editors)
+    document = Rope(DOC)
+    history = EditHistory()
+    for editor in range(editors):
+        history.seen(editor, 0)
+
+    def accept():
+        editor = rng.randrange(editors)
+        base = max(history.floor, history.version - rng.randint(0, editors))
+        # the document only grows, so an offset in the original text is valid in any version
+        ops = history.rebase(base, [(rng.randrange(len(DOC)), 0, "x")])
+        for offset, delete_length, insert_text in ops:
+            document.replace(offset, delete_length, insert_text)
+        version = history.record(ops)
+        history.seen(editor, version)
+
+    return 1e6 / per_call_us(accept, PATCHES)
+
+
+def main():
+    random.seed(3)
+    print("rebase over missed versions, us per patch")
+    print_table(("versions missed", "us"), [(lag, f"{rebase_cost(lag):.1f}") for lag in (0, 1, 10, 100, HISTORY_LIMIT)])
+    print()
+    print(f"accepted patches per second, {len(DOC) // 1024} KB document")
+    print_table(("editors", "patches/s"), [(n, f"{patch_throughput(n):,.0f}") for n in (2, 6, 20)])
+
+
+if __name__ == "__main__":
+    main()
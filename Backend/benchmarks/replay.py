@@ -0,0 +1,71 @@
+# benchmarks/replay.py
+"""
+Replay of a typing session through the autocomplete path (user-014): this repo's own
+Python, typed one keystroke at a time with the odd backspace and retype, asking for a
+suggestion after every key. Each lookup goes through suggest_for_line (LRU cache, then
+the worker pool on a miss), against the same lookups sent straight to the pool.
+
+    python -m benchmarks.replay
+"""
+from benchmarks.common import percentile, print_table
+from app.api.autocomplete import get_cursor_window, suggest_for_line, suggestion_cache, suggestion_pool
+from app.services.suggestions.registry import suggest
+from pathlib import Path
+import asyncio
+import random
+import time
+
+SESSION_BYTES = 60_000
+# chance that a keystroke is followed by deleting and retyping a few characters
+BACKSPACE_RATE = 0.05
+
+
+def keystrokes(text: str, rng: random.Random):
+    """(line up to the cursor, first line) after every key of typing out `text`."""
+    typed = 0
+    while typed < len(text):
+        typed += 1
+        yield get_cursor_window(text, typed)
+        if rng.random() < BACKSPACE_RATE:
+            back = rng.randint(1, 3)
+            for cursor in range(max(0, typed - back), typed + 1):
+                yield get_cursor_window(text, cursor)
+
+
+def session() -> str:
+    sources = sorted(Path(__file__).resolve().parent.parent.joinpath("app").rglob("*.py"))
+    return "".join(path.read_text() for path in sources)[:SESSION_BYTES]
+
+
+async def replay(lookups, cached: bool):
+    """Seconds per lookup, and those of the lookups answered from the cache."""
+    samples, hits = [], []
+    for line, first_line in lookups:
+        before = suggestion_cache.hits
+        started = time.perf_counter()
+        if cached:
+            await suggest_for_line(line, first_line, "python")
+        else:
+            await suggestion_pool.run(suggest, "python", line, first_line)
+        samples.append(time.perf_counter() - started)
+        if suggestion_cache.hits > before:
+            hits.append(samples[-1])
+    return samples, hits
+
+
+async def main():
+    lookups = list(keystrokes(session(), random.Random(3)))
+    rows = []
+    for label, cached in (("pool only", False), ("cache + pool", True)):
+        samples, hits = await replay(lookups, cached)
+        rows.append([
+            label, len(samples), f"{len(hits) / len(samples):.0%}",
+            f"{percentile(samples, 0.5) * 1e6:.1f}", f"{percentile(samples, 0.99) * 1e6:.1f}",
+            f"{percentile(hits, 0.99) * 1e6:.1f}" if hits else "-",
+            f"{sum(samples):.2f}",
+        ])
+    print_table(["lookups", "keystrokes", "hit rate", "p50 µs", "p99 µs", "hit p99 µs", "total s"], rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+# benchmarks/room_creation.py
+"""
+Rooms created per second (user-024): POST /rooms once per room, as events were
+provisioned before, against one POST /rooms/bulk of MAX_BULK_ROOMS. Requests go through
+the app in-process; the database is a session that returns every id as inserted and
+sleeps ROUND_TRIP per statement and commit, so the table shows what batching saves at
+each network latency. Statements are still compiled for asyncpg as they would be.
+
+    python -m benchmarks.room_creation
+"""
+from benchmarks.common import print_table
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects.postgresql import asyncpg
+from app.api import routers
+from app.db.session import get_db
+from app.main import app
+from app.schemas.room import MAX_BULK_ROOMS
+import asyncio
+import time
+
+SINGLE_REQUESTS = 1_000
+ROUND_TRIPS_MS = (0.0, 0.5, 2.0)
+
+
+class _Result(list):
+    def scalars(self):
+        return iter(self)
+
+
+class TimedSession:
+    def __init__(self, round_trip: float):
+        self.round_trip = round_trip
+        self.round_trips = 0
+
+    async def execute(self, statement):
+        compiled = statement.compile(dialect=asyncpg.dialect())
+        await self._round_trip()
+        return _Result(value for name, value in compiled.params.items() if name.startswith("room_id"))
+
+    async def commit(self):
+        await self._round_trip()
+
+    async def rollback(self):
+        await self._round_trip()
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.round_trip)
+
+
+def main():
+    client = TestClient(app)
+    rows = []
+    for round_trip_ms in ROUND_TRIPS_MS:
+        session = TimedSession(round_trip_ms / 1000)
+
+        async def get_session():
+            yield session
+
+        app.dependency_overrides[get_db] = get_session
+        app.dependency_overrides[routers.get_db] = get_session
+
+        start = time.perf_counter()
+        for _ in range(SINGLE_REQUESTS):
+            client.post("/rooms")
+        single = SINGLE_REQUESTS / (time.perf_counter() - start)
+        single_trips, session.round_trips = session.round_trips, 0
+
+        start = time.perf_counter()
+        created = client.post("/rooms/bulk", json={"count": MAX_BULK_ROOMS}).json()["roomIds"]
+        bulk = len(created) / (time.perf_counter() - start)
+
+        rows.append([
+            f"{round_trip_ms:g}",
+            f"{single:.0f}",
+            f"{single_trips / SINGLE_REQUESTS:.0f}",
+            f"{bulk:.0f}",
+            session.round_trips,
+            f"{bulk / single:.0f}x",
+        ])
+    app.dependency_overrides.clear()
+    print_table(
+        ["round trip ms", "POST /rooms rooms/s", "trips/room", f"bulk of {MAX_BULK_ROOMS} rooms/s", "trips", "speedup"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
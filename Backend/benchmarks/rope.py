@@ -0,0 +1,74 @@
+# benchmarks/rope.py
+"""
+Rope against the flat-string document it replaced (user-002), on a 1 MB document.
+
+    python -m benchmarks.rope
+"""
+from benchmarks.common import per_call_us, print_table
+from app.core.document import Rope
+import random
+
+DOC_SIZE = 1024 * 1024
+EDITS = 2000
+
+
+def sample_document(size: int) -> str:
+    line = "    total = compute_total(items, discount=0.1)  # keep in sync\n"
+    return (line * (size // len(line) + 1))[:size]
+
+
+def main():
+    random.seed(1)
+    text = sample_document(DOC_SIZE)
+    offsets = [random.randrange(DOC_SIZE) for _ in range(EDITS)]
+
+    rope = Rope(text)
+    flat = text
+    state = {"i": 0}
+
+    def next_offset() -> int:
+        state["i"] = (state["i"] + 1) % EDITS
+        return offsets[state["i"]]
+
+    def rope_insert():
+        rope.replace(next_offset(), 0, "x")
+
+    def flat_insert():
+        nonlocal flat
+        offset = next_offset()
+        flat = flat[:offset] + "x" + flat[offset:]
+
+    def rope_delete():
+        rope.replace(next_offset(), 1, "")
+
+    def flat_delete():
+        nonlocal flat
+        offset = next_offset()
+        flat = flat[:offset] + flat[offset + 1:]
+
+    def rope_line():
+        rope.offset_to_line(next_offset())
+
+    def flat_line():
+        offset = next_offset()
+        flat.count("\n", 0, offset)
+
+    def rope_materialize():
+        # what INIT, GET /rooms and a snapshot pay after an edit
+        rope.insert(0, "x")
+        str(rope)
+
+    rows = [
+        ("insert 1 char", f"{per_call_us(flat_insert, EDITS):.1f}", f"{per_call_us(rope_insert, EDITS):.1f}"),
+        ("delete 1 char", f"{per_call_us(flat_delete, EDITS):.1f}", f"{per_call_us(rope_delete, EDITS):.1f}"),
+        ("offset -> line", f"{per_call_us(flat_line, EDITS):.1f}", f"{per_call_us(rope_line, EDITS):.1f}"),
+        ("edit + str()", "-", f"{per_call_us(rope_materialize, 200):.1f}"),
+    ]
+    print(f"{DOC_SIZE // 1024} KB document, {EDITS} operations each, us per operation")
+    print_table(("operation", "str", "rope"), rows)
+    # both saw the same inserts and deletes; the rope also the 200 materialize inserts
+    assert len(rope) == len(flat) + 200
+
+
+if __name__ == "__main__":
+    main()
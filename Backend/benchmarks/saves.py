@@ -0,0 +1,76 @@
+# benchmarks/saves.py
+"""
+Latency of room saves (user-005), timed through the path the app uses:
+WriteBehindFlusher.flush -> save_room_log on a session from app.db.session, against the
+Postgres that DATABASE_URL points at. Rows are written under fresh room ids and deleted
+at the end; missing tables are created first.
+
+- edit: a flush holding one typed edit of one room, an INSERT into room_edits
+- edit + snapshot: the same flush when the room is due a snapshot, as one in every
+  PERSIST_SNAPSHOT_EVERY versions is; the whole document goes into room_snapshots
+- batch of ROOMS: one flush holding an edit of each of ROOMS rooms, per room
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.saves
+"""
+from benchmarks.common import percentile, print_table
+from sqlalchemy import delete
+from app.core.persistence import WriteBehindFlusher
+from app.db.base import Base
+from app.db.session import AsyncSessionLocal, engine
+from app.models.room import Room
+from app.services.rooms import new_room_id
+import asyncio
+import time
+
+SAVES = 300
+ROOMS = 50
+SIZES = (10 * 1024, 100 * 1024, 1024 * 1024)
+
+
+async def timed_flushes(flusher: WriteBehindFlusher, documents: dict, room_ids: list) -> list:
+    """ms per room of SAVES flushes, each holding one edit of every room in `room_ids`."""
+    samples = []
+    for n in range(SAVES):
+        for room_id in room_ids:
+            code, version = documents[room_id]
+            # retype the last 8 characters
+            op = (len(code) - 8, 8, f"{n:08d}")
+            documents[room_id] = (code[:op[0]] + op[2], version + 1)
+            flusher.log(room_id, version + 1, [op])
+        start = time.perf_counter()
+        await flusher.flush()
+        samples.append((time.perf_counter() - start) * 1000 / len(room_ids))
+    return samples
+
+
+async def main():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    documents = {}
+    rows = []
+    try:
+        for size in SIZES:
+            cases = (("edit", 1, 10 ** 9), ("edit + snapshot", 1, 1), (f"batch of {ROOMS}", ROOMS, 10 ** 9))
+            for name, room_count, snapshot_every in cases:
+                room_ids = [new_room_id() for _ in range(room_count)]
+                async with AsyncSessionLocal() as db:
+                    db.add_all(Room(room_id=room_id, language="python") for room_id in room_ids)
+                    await db.commit()
+                documents.update((room_id, ("x" * size, 0)) for room_id in room_ids)
+                flusher = WriteBehindFlusher(documents.get, interval=0, snapshot_every=snapshot_every, compact_interval=0)
+                samples = await timed_flushes(flusher, documents, room_ids)
+                assert flusher.edits_written == SAVES * room_count
+                rows.append((f"{size // 1024} KB", name, f"{percentile(samples, 0.5):.2f}", f"{percentile(samples, 0.99):.2f}"))
+    finally:
+        # room_edits and room_snapshots rows go with their room
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Room).where(Room.room_id.in_(list(documents))))
+            await db.commit()
+        await engine.dispose()
+    print(f"{SAVES} flushes each, ms per room saved")
+    print_table(("document", "save", "p50", "p99"), rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
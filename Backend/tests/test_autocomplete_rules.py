@@ -0,0 +1,37 @@
+from app.api.autocomplete import get_cursor_window
+from app.services.suggestions.registry import get_engine
+from tests import legacy_autocomplete
+import random
+import pytest
+
+# short runs of keywords, brackets, quotes and operators hit every rule and their overlaps
+ALPHABET = list("abdefor ()[]{}=!\"'\\:#@\n  \t") + [
+    "for ", "if ", "def ", "import ", "class ", "lambda ", "elif ", "async def ", "return ", "==", "x = ",
+]
+LINES_PER_SEED = 50_000
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_python_engine_matches_the_legacy_rules(seed):
+    engine = get_engine("python")
+    rng = random.Random(seed)
+    mismatches = []
+    for _ in range(LINES_PER_SEED):
+        code = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 15)))
+        cursor = rng.randint(0, len(code))
+        line, first_line = get_cursor_window(code, cursor)
+        expected = legacy_autocomplete.get_smart_suggestion(code, cursor)
+        if engine.suggest(line, first_line) != expected:
+            mismatches.append((code, cursor))
+    assert mismatches[:5] == []
+
+
+@pytest.mark.parametrize("line", [
+    "a" * 10_000 + "!",
+    "[" + "fo" * 5_000,
+    "f(x) " * 2_000,
+    "{" + "x for " * 1_600,
+])
+def test_pathological_lines_agree(line):
+    engine = get_engine("python")
+    assert engine.suggest(line, False) == legacy_autocomplete.get_smart_suggestion(line, len(line))
@@ -0,0 +1,209 @@
+from typing import Dict, Tuple
+import asyncio
+import random
+
+import pytest
+
+from app.core.codec import dumps
+from app.core.compression import COMPRESS_MIN_LENGTH, pack
+from app.core.pubsub import InProcessPubSub
+from app.core.websocket_manager import RoomManager
+from app.services.rooms import load_document
+
+
+class LogTables:
+    """
+    room_snapshots and room_edits kept in dicts, answering the two SELECTs of
+    load_document and standing in for save_room_log and compact_room_logs with the
+    same rules: rows of unknown rooms and existing (room_id, version) rows are skipped,
+    and compaction keeps only what the newest snapshot does not cover.
+    """
+
+    def __init__(self, *room_ids: str):
+        self.room_ids = set(room_ids)
+        # (room_id, version) -> (text, compressed), as pack() stores them
+        self.snapshots: Dict[Tuple[str, int], tuple] = {}
+        self.edits: Dict[Tuple[str, int], tuple] = {}
+        self.down = False
+
+    def session(self):
+        return _Session(self)
+
+    def newest_snapshot(self, room_id: str) -> int | None:
+        return max((version for room, version in self.snapshots if room == room_id), default=None)
+
+    async def save_room_log(self, db, edits, snapshots):
+        if self.down:
+            raise ConnectionError("database unavailable")
+        logged = snapshotted = 0
+        for room_id, version, ops in edits:
+            if room_id in self.room_ids and (room_id, version) not in self.edits:
+                self.edits[room_id, version] = pack(dumps(ops).decode("utf-8"))
+                logged += 1
+        for room_id, (code, version) in snapshots.items():
+            if room_id in self.room_ids and (room_id, version) not in self.snapshots:
+                self.snapshots[room_id, version] = pack(code)
+                snapshotted += 1
+        return logged, snapshotted
+
+    async def compact_room_logs(self, db, room_ids):
+        deleted = 0
+        for room_id in room_ids:
+            newest = self.newest_snapshot(room_id)
+            if newest is None:
+                continue
+            for room, version in list(self.edits):
+                if room == room_id and version <= newest:
+                    del self.edits[room, version]
+                    deleted += 1
+            for room, version in list(self.snapshots):
+                if room == room_id and version < newest:
+                    del self.snapshots[room, version]
+        return deleted
+
+
+class _Result(list):
+    def one_or_none(self):
+        return self[0] if self else None
+
+
+class _Row(tuple):
+    version = property(lambda row: row[0])
+    code = property(lambda row: row[1])
+    compressed = property(lambda row: row[2])
+
+
+class _Session:
+    def __init__(self, tables: LogTables):
+        self.tables = tables
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def execute(self, statement):
+        params = statement.compile().params
+        room_id = params["room_id_1"]
+        if statement.get_final_froms()[0].name == "room_snapshots":
+            newest = self.tables.newest_snapshot(room_id)
+            if newest is None:
+                return _Result()
+            return _Result([_Row((newest, *self.tables.snapshots[room_id, newest]))])
+        return _Result(
+            _Row((version, *self.tables.edits[room, version]))
+            for room, version in sorted(self.tables.edits)
+            if room == room_id and version > params["version_1"]
+        )
+
+
+class Socket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, data: str):
+        self.frames.append(data)
+
+
+@pytest.fixture
+def tables(monkeypatch) -> LogTables:
+    from app.core import persistence
+    tables = LogTables("a")
+    monkeypatch.setattr(persistence, "AsyncSessionLocal", tables.session)
+    monkeypatch.setattr(persistence, "save_room_log", tables.save_room_log)
+    monkeypatch.setattr(persistence, "compact_room_logs", tables.compact_room_logs)
+    return tables
+
+
+def loader(tables: LogTables, room_id: str):
+    async def load():
+        return await load_document(tables.session(), room_id), "python"
+    return load
+
+
+async def random_edits(manager: RoomManager, room_id: str, count: int, rng: random.Random):
+    room = manager.rooms[room_id]
+    for _ in range(count):
+        offset = rng.randint(0, len(room.document))
+        delete = rng.randint(0, min(3, len(room.document) - offset))
+        await manager.apply_patch(room_id, "u", room.version, [(offset, delete, rng.choice(["x", "yz", "\n", ""]))])
+        await asyncio.sleep(0)
+
+
+def test_recovers_snapshot_and_log_tail(tables):
+    async def main():
+        manager = RoomManager(InProcessPubSub())
+        manager.flusher.snapshot_every = 7
+        room = await manager.join("a", loader(tables, "a"))
+        manager.connect(room, Socket(), "u")
+        rng = random.Random(1)
+        for n in range(5):
+            await random_edits(manager, "a", 9, rng)
+            if n == 2:
+                # a whole-document replace lands in the log like any edit
+                await manager.update_code("a", "x" * COMPRESS_MIN_LENGTH + "\n", "u")
+                await asyncio.sleep(0)
+            await manager.flusher.flush()
+        expected = (room.code, room.version)
+
+        recovered = await load_document(tables.session(), "a")
+        assert (recovered.code, recovered.version) == expected
+        assert any(compressed is not None for _, compressed in tables.snapshots.values())
+
+        # compaction leaves one snapshot and only the edits after it, and changes nothing
+        await manager.flusher.compact()
+        newest = tables.newest_snapshot("a")
+        assert [version for _, version in tables.snapshots] == [newest]
+        assert all(version > newest for _, version in tables.edits)
+        recovered = await load_document(tables.session(), "a")
+        assert (recovered.code, recovered.version, recovered.snapshot_version) == (*expected, newest)
+
+        # after eviction the room is rebuilt from the log and its versions carry on
+        await manager.leave("a", next(iter(room.connections)), "u")
+        manager.idle_ttl = 0
+        assert await manager.evict_idle() == 1
+        room = await manager.join("a", loader(tables, "a"))
+        assert (room.code, room.version) == expected
+        assert manager.flusher.snapshot_versions["a"] == newest
+        manager.connect(room, Socket(), "u")
+        await manager.apply_patch("a", "u", room.version, [(0, 0, "#")])
+        await asyncio.sleep(0)
+        await manager.flusher.flush()
+        assert (await load_document(tables.session(), "a")).version == expected[1] + 1
+
+    asyncio.run(main())
+
+
+def test_failed_flush_keeps_edits_in_order(tables):
+    async def main():
+        manager = RoomManager(InProcessPubSub())
+        room = await manager.join("a", loader(tables, "a"))
+        manager.connect(room, Socket(), "u")
+        await manager.apply_patch("a", "u", 0, [(0, 0, "one\n")])
+        await asyncio.sleep(0)
+
+        tables.down = True
+        with pytest.raises(ConnectionError):
+            await manager.flusher.flush()
+        await manager.apply_patch("a", "u", 1, [(0, 0, "two\n")])
+        await asyncio.sleep(0)
+        assert [version for version, _ in manager.flusher.pending["a"]] == [1, 2]
+
+        tables.down = False
+        await manager.flusher.flush()
+        recovered = await load_document(tables.session(), "a")
+        assert (recovered.code, recovered.version) == ("two\none\n", 2)
+
+    asyncio.run(main())
+
+
+def test_replay_stops_at_a_gap(tables):
+    async def main():
+        tables.snapshots["a", 0] = pack("")
+        for version, text in ((1, "a"), (2, "b"), (4, "d")):
+            tables.edits["a", version] = pack(dumps([(0, 0, text)]).decode("utf-8"))
+        recovered = await load_document(tables.session(), "a")
+        assert (recovered.code, recovered.version) == ("ba", 2)
+
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""
+save_room_log, compact_room_logs and load_document against a real Postgres: the edit log
+SQL (INSERT ... FROM VALUES JOIN rooms ON CONFLICT DO NOTHING, DELETE ... USING) is
+Postgres-only. Set TEST_DATABASE_URL to a database the tests may create tables in, e.g.
+
+    TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/postgres pytest -m postgres
+
+Every test works on fresh room ids and deletes its rooms, with their log rows, afterwards.
+"""
+from contextlib import asynccontextmanager
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core import persistence
+from app.core.compression import COMPRESS_MIN_LENGTH
+from app.core.persistence import WriteBehindFlusher
+from app.db.base import Base
+from app.models.room import Room, RoomEdit, RoomSnapshot
+from app.services.rooms import StoredDocument, compact_room_logs, load_document, new_room_id, save_room_log
+
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = [
+    pytest.mark.postgres,
+    pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL is not set"),
+]
+
+
+@asynccontextmanager
+async def rooms(count: int):
+    """A session factory on TEST_DATABASE_URL and `count` new rooms in it."""
+    engine = create_async_engine(DATABASE_URL)
+    sessions = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    room_ids = [new_room_id() for _ in range(count)]
+    async with sessions() as db:
+        db.add_all(Room(room_id=room_id) for room_id in room_ids)
+        await db.commit()
+    try:
+        yield sessions, room_ids
+    finally:
+        async with sessions() as db:
+            await db.execute(delete(Room).where(Room.room_id.in_(room_ids)))
+            await db.commit()
+        await engine.dispose()
+
+
+async def rows(db, model, room_id: str) -> list:
+    result = await db.execute(select(model).where(model.room_id == room_id).order_by(model.version))
+    return list(result.scalars())
+
+
+def test_save_skips_unknown_rooms_and_logged_versions():
+    async def main():
+        async with rooms(1) as (sessions, (room_id,)):
+            async with sessions() as db:
+                edits = [(room_id, 1, [(0, 0, "ab")]), (room_id, 2, [(2, 0, "c")]), ("no-such-room", 1, [(0, 0, "x")])]
+                assert await save_room_log(db, edits, {"no-such-room": ("x", 1)}) == (2, 0)
+                # another worker holding the room logs the same versions: nothing is inserted twice
+                assert await save_room_log(db, edits[:2] + [(room_id, 3, [(0, 1, "")])], {room_id: ("bc", 3)}) == (1, 1)
+                assert [edit.version for edit in await rows(db, RoomEdit, room_id)] == [1, 2, 3]
+                assert [snapshot.version for snapshot in await rows(db, RoomSnapshot, room_id)] == [3]
+
+    asyncio.run(main())
+
+
+def test_large_payloads_are_stored_compressed():
+    async def main():
+        async with rooms(1) as (sessions, (room_id,)):
+            pasted = "def f():\n    return 1\n" * (COMPRESS_MIN_LENGTH // 10)
+            async with sessions() as db:
+                await save_room_log(db, [(room_id, 1, [(0, 0, pasted)]), (room_id, 2, [(0, 0, "#")])], {room_id: ("#" + pasted, 2)})
+                big, small = await rows(db, RoomEdit, room_id)
+                (snapshot,) = await rows(db, RoomSnapshot, room_id)
+                assert big.ops is None and len(big.compressed) < len(pasted)
+                assert small.ops is not None and small.compressed is None
+                assert snapshot.code is None and snapshot.compressed is not None
+                # the snapshot covers everything; with no snapshot the log alone rebuilds it
+                assert await load_document(db, room_id) == StoredDocument("#" + pasted, 2, 2)
+                await db.execute(delete(RoomSnapshot).where(RoomSnapshot.room_id == room_id))
+                await db.commit()
+                assert await load_document(db, room_id) == StoredDocument("#" + pasted, 2, 0)
+
+    asyncio.run(main())
+
+
+def test_load_replays_the_tail_and_stops_at_a_gap():
+    async def main():
+        async with rooms(1) as (sessions, (room_id,)):
+            async with sessions() as db:
+                assert await load_document(db, room_id) == StoredDocument("", 0, 0)
+                await save_room_log(db, [(room_id, 1, [(0, 0, "hello")])], {room_id: ("hello", 1)})
+                await save_room_log(db, [(room_id, 2, [(5, 0, "!")]), (room_id, 3, [(0, 1, "H")]), (room_id, 5, [(0, 0, "lost")])], {})
+                assert await load_document(db, room_id) == StoredDocument("Hello!", 3, 1)
+
+    asyncio.run(main())
+
+
+def test_compaction_keeps_only_the_newest_snapshot_and_its_tail():
+    async def main():
+        async with rooms(2) as (sessions, (room_id, other)):
+            async with sessions() as db:
+                await save_room_log(db, [(room_id, v, [(v - 1, 0, "x")]) for v in range(1, 6)], {room_id: ("xx", 2)})
+                await save_room_log(db, [(other, 1, [(0, 0, "y")])], {room_id: ("xxxx", 4)})
+                assert await compact_room_logs(db, [room_id, other]) == 4
+                assert [edit.version for edit in await rows(db, RoomEdit, room_id)] == [5]
+                assert [snapshot.version for snapshot in await rows(db, RoomSnapshot, room_id)] == [4]
+                # rooms without a snapshot keep their whole log
+                assert [edit.version for edit in await rows(db, RoomEdit, other)] == [1]
+                assert await load_document(db, room_id) == StoredDocument("xxxxx", 5, 4)
+                assert await load_document(db, other) == StoredDocument("y", 1, 0)
+
+    asyncio.run(main())
+
+
+def test_flusher_round_trips_through_the_database(monkeypatch):
+    async def main():
+        async with rooms(1) as (sessions, (room_id,)):
+            monkeypatch.setattr(persistence, "AsyncSessionLocal", sessions)
+            documents = {room_id: ("", 0)}
+            flusher = WriteBehindFlusher(documents.get, interval=60, snapshot_every=4, compact_interval=60)
+            for version in range(1, 11):
+                code, _ = documents[room_id]
+                op = (len(code), 0, str(version % 10))
+                documents[room_id] = (code + op[2], version)
+                flusher.log(room_id, version, [op])
+                if version % 3 == 0:
+                    await flusher.flush()
+            await flusher.stop()
+            assert flusher.stats()["failures"] == 0
+            async with sessions() as db:
+                assert (await load_document(db, room_id))[:2] == ("1234567890", 10)
+                # compaction left the newest snapshot and only the edits after it
+                (snapshot,) = await rows(db, RoomSnapshot, room_id)
+                assert [edit.version for edit in await rows(db, RoomEdit, room_id)] == list(range(snapshot.version + 1, 11))
+
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+import asyncio
+
+from app.core.pubsub import InProcessPubSub
+from app.core.websocket_manager import RoomManager
+from app.services.rooms import StoredDocument
+
+BUDGET = 150
+
+
+def loader(code: str):
+    async def load():
+        return StoredDocument(code, 0, 0), "python"
+    return load
+
+
+class Socket:
+    async def send_text(self, data: str):
+        pass
+
+
+def test_room_joined_but_not_connected_is_not_evicted(fake_db):
+    async def main():
+        manager = RoomManager(InProcessPubSub())
+        manager.memory_budget = BUDGET
+        manager.idle_ttl = 0
+        # over budget on its own, so hydrating it starts an eviction sweep
+        room = await manager.join("big", loader("x" * 200))
+        # the endpoint has work to do between join and connect
+        await asyncio.sleep(0.05)
+        assert await manager.evict_idle() == 0
+        assert manager.rooms["big"] is room
+
+        # a second join meanwhile gets the same copy, not a reload
+        assert await manager.join("big", loader("")) is room
+        assert manager.hydrations == 1
+
+        first, second = Socket(), Socket()
+        manager.connect(room, first, "u1")
+        manager.connect(room, second, "u2")
+        await manager.leave("big", first, "u1")
+        assert await manager.evict_idle() == 0
+        await manager.leave("big", second, "u2")
+        assert await manager.evict_idle() == 1
+        assert "big" not in manager.rooms
+
+    asyncio.run(main())
+
+
+def test_abandoned_join_unpins_the_room(fake_db):
+    async def main():
+        manager = RoomManager(InProcessPubSub())
+        manager.memory_budget = BUDGET
+        manager.idle_ttl = 0
+        await manager.join("big", loader("x" * 200))
+        assert await manager.evict_idle() == 0
+        manager.release_join("big")
+        assert await manager.evict_idle() == 1
+        assert "big" not in manager.rooms
+
+    asyncio.run(main())
+
+
+def test_room_without_a_row_is_never_evicted(fake_db):
+    async def main():
+        manager = RoomManager(InProcessPubSub())
+        manager.memory_budget = BUDGET
+        manager.idle_ttl = 0
+
+        async def load():
+            # what the endpoint loads for an id with no `rooms` row
+            return StoredDocument("", 0, 0, persisted=False), None
+
+        room = await manager.join("adhoc", load)
+        socket = Socket()
+        manager.connect(room, socket, "u")
+        await manager.apply_patch("adhoc", "u", 0, [(0, 0, "x" * 200)])
+        await asyncio.sleep(0)
+        await manager.leave("adhoc", socket, "u")
+
+        assert await manager.evict_idle() == 0
+        assert manager.rooms["adhoc"].code == "x" * 200
+
+    asyncio.run(main())
+
+
+def test_budget_sweep_is_kept_and_its_failure_logged(fake_db, caplog):
+    async def main():
+        manager = RoomManager(InProcessPubSub())
+        manager.memory_budget = BUDGET
+
+        async def failing_sweep():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("sweep failed")
+
+        manager.evict_idle = failing_sweep
+        await manager.join("big", loader("x" * 200))
+        task = manager._budget_task
+        assert task is not None
+        await asyncio.wait([task])
+        assert manager._budget_task is None
+
+    asyncio.run(main())
+    assert "Room eviction failed" in caplog.text
+    assert "sweep failed" in caplog.text
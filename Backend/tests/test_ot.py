@@ -0,0 +1,173 @@
+from typing import List, Tuple
+from app.core.document import Rope
+from app.core.ot import EditHistory, Op, normalize, transform
+import random
+import pytest
+
+
+def apply(doc: str, ops: List[Op]) -> str:
+    for offset, delete_length, insert_text in ops:
+        assert 0 <= offset and offset + delete_length <= len(doc)
+        doc = doc[:offset] + insert_text + doc[offset + delete_length:]
+    return doc
+
+
+def random_ops(rng: random.Random, doc: str, count: int) -> List[Op]:
+    ops = []
+    for _ in range(count):
+        offset = rng.randint(0, len(doc))
+        op = (offset, rng.randint(0, len(doc) - offset), rng.choice(["", "x", "yz", "Q"]))
+        ops.append(op)
+        doc = apply(doc, [op])
+    return normalize(ops)
+
+
+def test_transform_converges_both_ways():
+    # TP1: applying b then a' gives the same document as a then b'
+    rng = random.Random(0)
+    for _ in range(20000):
+        doc = "".join(rng.choice("abcdef") for _ in range(rng.randint(0, 12)))
+        a = random_ops(rng, doc, rng.randint(1, 3))
+        b = random_ops(rng, doc, rng.randint(1, 3))
+        a_after_b, b_after_a = transform(a, b)
+        assert apply(apply(doc, b), a_after_b) == apply(apply(doc, a), b_after_a)
+
+
+def test_transform_orders_concurrent_inserts_second_op_first():
+    a_after_b, b_after_a = transform([(2, 0, "a")], [(2, 0, "b")])
+    assert apply(apply("xxxx", [(2, 0, "b")]), a_after_b) == "xxbaxx"
+    assert apply(apply("xxxx", [(2, 0, "a")]), b_after_a) == "xxbaxx"
+
+
+def test_rebase_maps_ops_and_offsets_over_missed_versions():
+    history = EditHistory()
+    history.record([(0, 0, "abc")])
+    history.record([(1, 1, "")])
+    # "abc" was accepted first, so it stays ahead of a concurrent insert at the same offset
+    assert history.rebase(0, [(0, 0, "X")]) == [(2, 0, "X")]
+    assert history.rebase(1, [(3, 0, "!")]) == [(2, 0, "!")]
+    assert history.rebase_offset(0, 0) == 2
+    assert history.rebase(3, [(0, 0, "x")]) is None
+
+
+def test_history_is_bounded_and_compacted_to_the_oldest_client():
+    history = EditHistory(limit=10)
+    for _ in range(25):
+        history.record([(0, 0, "x")])
+    assert len(history.entries) == 10 and history.floor == 15
+    assert history.rebase(14, [(0, 0, "y")]) is None
+
+    history.seen("a", 20)
+    history.seen("b", 23)
+    assert history.floor == 20 and [version for version, _ in history.entries] == [21, 22, 23, 24, 25]
+    history.forget("a")
+    assert history.floor == 23
+    assert EditHistory.from_state(history.to_state()).to_state() == history.to_state()
+
+
+class Editor:
+    """A client following the one-patch-in-flight protocol, as the frontend does."""
+
+    def __init__(self, editor_id: int, doc: str):
+        self.id = editor_id
+        self.doc = doc
+        self.version = 0
+        self.inflight: List[Op] | None = None
+        self.buffer: List[Op] = []
+        self.inbox: List[Tuple[str, int, object]] = []
+
+    def edit(self, rng: random.Random):
+        if self.doc and rng.random() < 0.4:
+            offset = rng.randrange(len(self.doc))
+            edit = (offset, rng.randint(1, min(5, len(self.doc) - offset)), rng.choice(["", "z", "ab"]))
+        else:
+            edit = (rng.randint(0, len(self.doc)), 0, "".join(rng.choice("abc\n") for _ in range(rng.randint(1, 3))))
+        ops = normalize([edit])
+        self.doc = apply(self.doc, ops)
+        self.buffer += ops
+
+    def send(self, server: "Server"):
+        if self.inflight is None and self.buffer:
+            self.inflight, self.buffer = self.buffer, []
+            server.queue.append((self.id, self.version, self.inflight))
+
+    def receive(self):
+        kind, version, data = self.inbox.pop(0)
+        if kind == "ack":
+            self.inflight = None
+        elif kind == "snapshot":
+            self.doc, self.inflight, self.buffer = data, None, []
+        else:
+            inflight, ops = transform(self.inflight or [], data)
+            self.buffer, ops = transform(self.buffer, ops)
+            if self.inflight is not None:
+                self.inflight = inflight
+            self.doc = apply(self.doc, ops)
+        self.version = version
+
+
+class Server:
+    """The patch path of RoomManager._apply_event, without the sockets."""
+
+    def __init__(self, doc: str, editors: List[Editor]):
+        self.document = Rope(doc)
+        self.history = EditHistory()
+        self.editors = editors
+        self.queue: List[Tuple[int, int, List[Op]]] = []
+        for editor in editors:
+            self.history.seen(editor.id, 0)
+
+    def step(self):
+        editor_id, base, ops = self.queue.pop(0)
+        ops = self.history.rebase(base, ops)
+        if ops is None:
+            self.editors[editor_id].inbox.append(("snapshot", self.history.version, str(self.document)))
+            return
+        for offset, delete_length, insert_text in ops:
+            self.document.replace(offset, delete_length, insert_text)
+        version = self.history.record(ops)
+        self.history.seen(editor_id, version)
+        for editor in self.editors:
+            editor.inbox.append(("ack", version, None) if editor.id == editor_id else ("patch", version, ops))
+
+
+def simulate(editors: int, steps: int, seed: int) -> Tuple[Server, List[Editor]]:
+    rng = random.Random(seed)
+    doc = "hello world\nfoo"
+    clients = [Editor(i, doc) for i in range(editors)]
+    server = Server(doc, clients)
+    for _ in range(steps):
+        editor = rng.choice(clients)
+        roll = rng.random()
+        if roll < 0.4:
+            editor.edit(rng)
+        elif roll < 0.6:
+            editor.send(server)
+        elif roll < 0.85 and server.queue:
+            server.step()
+        elif editor.inbox:
+            editor.receive()
+    # deliver everything still in flight
+    while server.queue or any(editor.inbox or editor.buffer for editor in clients):
+        for editor in clients:
+            editor.send(server)
+        while server.queue:
+            server.step()
+        for editor in clients:
+            while editor.inbox:
+                editor.receive()
+    return server, clients
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_concurrent_editors_converge(seed):
+    server, editors = simulate(random.Random(seed).randint(2, 6), 400, seed)
+    for editor in editors:
+        assert editor.doc == str(server.document)
+
+
+def test_many_editors_converge():
+    server, editors = simulate(20, 5000, 1)
+    assert all(editor.doc == str(server.document) for editor in editors)
+    # compacted to the oldest version a client acknowledged, far below the cap
+    assert len(server.history.entries) < server.history.limit // 10
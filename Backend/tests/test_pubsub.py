@@ -0,0 +1,194 @@
+import asyncio
+import json
+import random
+import time
+
+import pytest
+
+from app.core.pubsub import BusUnavailable, RespBroker, RespPubSub
+from app.core.websocket_manager import RoomManager
+from app.services.rooms import StoredDocument
+
+INITIAL = "def main():\n    pass\n"
+
+
+class RecordingSocket:
+    """Stands in for a client WebSocket; keeps every JSON frame sent to it."""
+
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, data: str):
+        self.frames.append(json.loads(data))
+
+    def of_type(self, message_type: str):
+        return [frame for frame in self.frames if frame["type"] == message_type]
+
+
+async def load():
+    # what the database holds: never the edits made in the tests
+    return StoredDocument(INITIAL, 0, 0), "python"
+
+
+async def eventually(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def start_workers(url: str, count: int = 2):
+    workers = [RoomManager(RespPubSub(url, timeout=0.5)) for _ in range(count)]
+    for worker in workers:
+        await worker.start()
+    return workers
+
+
+async def stop_workers(workers):
+    for worker in workers:
+        await worker.stop()
+
+
+async def edit(worker: RoomManager, room_id: str, user_id: str, rng: random.Random):
+    room = worker.rooms[room_id]
+    offset = rng.randint(0, len(room.document))
+    delete = rng.randint(0, min(3, len(room.document) - offset))
+    await worker.apply_patch(room_id, user_id, room.version, [(offset, delete, rng.choice(["x", "yz", "\n", ""]))])
+
+
+def test_two_workers_converge_and_rejoin(fake_db):
+    async def main():
+        broker = RespBroker()
+        url = await broker.start("redis://127.0.0.1:0")
+        a, b = await start_workers(url)
+        try:
+            room_a = await a.join("r", load)
+            room_b = await b.join("r", load)
+            socket_a, socket_b = RecordingSocket(), RecordingSocket()
+            a.connect(room_a, socket_a, "ua")
+            b.connect(room_b, socket_b, "ub")
+
+            # both edit concurrently, against whatever version they have seen
+            rng = random.Random(7)
+            for _ in range(100):
+                await asyncio.gather(edit(a, "r", "ua", rng), edit(b, "r", "ub", rng))
+            await eventually(lambda: len(socket_a.of_type("CODE_PATCH_ACK")) + len(socket_a.of_type("SNAPSHOT")) == 100
+                             and len(socket_b.of_type("CODE_PATCH_ACK")) + len(socket_b.of_type("SNAPSHOT")) == 100)
+            await eventually(lambda: room_a.version == room_b.version)
+            assert room_a.version > 100
+            assert room_a.code == room_b.code
+
+            # b leaves and drops the room; a keeps editing
+            await b.leave("r", socket_b, "ub")
+            b.idle_ttl = 0
+            assert await b.evict_idle() == 1
+            assert "r" not in b.rooms
+            for _ in range(20):
+                await edit(a, "r", "ua", rng)
+
+            # rejoining loads the stale database copy but takes a's state
+            room_b = await b.join("r", load)
+            assert room_b.version == room_a.version
+            assert room_b.code == room_a.code
+            await edit(b, "r", "ub", rng)
+            await eventually(lambda: room_a.version == room_b.version and room_a.code == room_b.code)
+        finally:
+            await stop_workers([a, b])
+            await broker.stop()
+
+    asyncio.run(main())
+
+
+def test_broker_restart_fails_fast_then_reconnects(fake_db):
+    async def main():
+        broker = RespBroker()
+        url = await broker.start("redis://127.0.0.1:0")
+        a, b = await start_workers(url)
+        try:
+            room_a = await a.join("r", load)
+            room_b = await b.join("r", load)
+
+            await broker.stop()
+            await eventually(lambda: not a.bus.connected and not b.bus.connected)
+
+            started = time.monotonic()
+            with pytest.raises(BusUnavailable):
+                await a.apply_patch("r", "ua", room_a.version, [(0, 0, "x")])
+            with pytest.raises(BusUnavailable):
+                await a.join("other", load)
+            assert time.monotonic() - started < 0.1
+            # a room that never synced is not left behind for the next join to wait on
+            assert "other" not in a.rooms
+
+            broker = RespBroker()
+            await broker.start(url)
+            await eventually(lambda: a.bus.connected and b.bus.connected)
+
+            await a.apply_patch("r", "ua", room_a.version, [(0, 0, "# restarted\n")])
+            await eventually(lambda: room_b.code.startswith("# restarted\n"))
+            assert room_a.code == room_b.code
+            assert (await a.join("other", load)).code == INITIAL
+        finally:
+            await stop_workers([a, b])
+            await broker.stop()
+
+    asyncio.run(main())
+
+
+def test_resubscribed_worker_catches_up(fake_db):
+    async def main():
+        broker = RespBroker()
+        url = await broker.start("redis://127.0.0.1:0")
+        a, b = await start_workers(url)
+        try:
+            room_a = await a.join("r", load)
+            room_b = await b.join("r", load)
+            socket_b = RecordingSocket()
+            b.connect(room_b, socket_b, "ub")
+
+            # only b's subscriber connection drops, so b misses what a publishes meanwhile
+            b.bus._sub_writer.transport.abort()
+            await a.apply_patch("r", "ua", room_a.version, [(0, 0, "# missed\n")])
+
+            await eventually(lambda: room_b.code == room_a.code)
+            assert b.resyncs == 1
+            assert room_b.version == room_a.version
+            # b's clients get the document they missed edits of
+            await eventually(lambda: socket_b.of_type("SNAPSHOT"))
+            assert socket_b.of_type("SNAPSHOT")[-1]["payload"]["code"] == room_a.code
+        finally:
+            await stop_workers([a, b])
+            await broker.stop()
+
+    asyncio.run(main())
+
+
+def test_joins_racing_a_failed_attach_all_fail(fake_db):
+    async def main():
+        broker = RespBroker()
+        url = await broker.start("redis://127.0.0.1:0")
+        (a,) = await start_workers(url, 1)
+        publish = a.bus.publish
+
+        async def stalled_publish(channel, data):
+            # the sync request goes out just as the broker stops answering
+            await asyncio.sleep(0.05)
+            raise BusUnavailable("no reply")
+
+        try:
+            a.bus.publish = stalled_publish
+            first = asyncio.create_task(a.join("r", load))
+            # arrives while the loaded room is attaching
+            await eventually(lambda: "r" in a.rooms)
+            second = asyncio.create_task(a.join("r", load))
+            results = await asyncio.wait_for(asyncio.gather(first, second, return_exceptions=True), 2)
+            assert [type(result) for result in results] == [BusUnavailable, BusUnavailable]
+            assert "r" not in a.rooms
+
+            a.bus.publish = publish
+            assert (await a.join("r", load)).code == INITIAL
+        finally:
+            await stop_workers([a])
+            await broker.stop()
+
+    asyncio.run(main())
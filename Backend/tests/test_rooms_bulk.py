@@ -0,0 +1,134 @@
+from types import SimpleNamespace
+from typing import List, Set
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.api import routers
+from app.db.session import get_db
+from app.main import app
+from app.services.rooms import CREATE_ATTEMPTS, INSERT_BATCH_ROWS, create_rooms, room_directory
+
+# asyncpg's limit on bind parameters per statement
+MAX_PARAMETERS = 32767
+
+
+class _Result(list):
+    def scalars(self):
+        return iter(self)
+
+
+class RoomsTable:
+    """
+    The rooms table behind a session that runs the two statements the bulk paths use:
+    INSERT ... ON CONFLICT DO NOTHING RETURNING room_id, and SELECT ... WHERE room_id IN.
+    `taken_by_others` ids of the next inserts are claimed by someone else first.
+    """
+
+    def __init__(self):
+        self.room_ids: Set[str] = set()
+        self.taken_by_others = 0
+        self.statements: List[str] = []
+        # the ids each SELECT asked for
+        self.looked_up: List[List[str]] = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def execute(self, statement):
+        compiled = statement.compile(dialect=asyncpg.dialect())
+        assert len(compiled.params) <= MAX_PARAMETERS
+        sql = str(compiled)
+        self.statements.append(sql)
+        if sql.startswith("INSERT INTO rooms"):
+            inserted = _Result()
+            for name, room_id in compiled.params.items():
+                if not name.startswith("room_id"):
+                    continue
+                if self.taken_by_others:
+                    self.taken_by_others -= 1
+                    self.room_ids.add(room_id)
+                elif room_id not in self.room_ids:
+                    self.room_ids.add(room_id)
+                    inserted.append(room_id)
+            return inserted
+        (room_ids,) = statement.compile().params.values()
+        self.looked_up.append(list(room_ids))
+        return _Result(SimpleNamespace(room_id=room_id, language="python") for room_id in room_ids if room_id in self.room_ids)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def table():
+    table = RoomsTable()
+
+    async def session():
+        yield table
+
+    room_directory.clear()
+    app.dependency_overrides[get_db] = session
+    app.dependency_overrides[routers.get_db] = session
+    yield table
+    app.dependency_overrides.clear()
+    room_directory.clear()
+
+
+def test_collisions_are_redrawn_in_the_same_transaction(table):
+    async def main():
+        count = 2 * INSERT_BATCH_ROWS + 7
+        table.taken_by_others = 7
+        room_ids = await create_rooms(table, count, "go")
+        assert len(set(room_ids)) == count
+        assert set(room_ids) <= table.room_ids
+        # three batches, then one more for the redrawn ids; a single commit
+        assert len(table.statements) == 4
+        assert table.commits == 1
+
+    asyncio.run(main())
+
+
+def test_no_free_ids_rolls_back(table):
+    async def main():
+        table.taken_by_others = 10 ** 6
+        with pytest.raises(RuntimeError):
+            await create_rooms(table, 3)
+        assert len(table.statements) == CREATE_ATTEMPTS
+        assert (table.commits, table.rollbacks) == (0, 1)
+
+    asyncio.run(main())
+
+
+def test_bulk_create_validates_count(table):
+    client = TestClient(app)
+    response = client.post("/rooms/bulk", json={"count": 5, "language": "go"})
+    assert response.status_code == 200
+    assert len(response.json()["roomIds"]) == 5
+    assert client.post("/rooms/bulk", json={"count": 0}).status_code == 422
+    assert client.post("/rooms/bulk", json={"count": 10001}).status_code == 422
+    assert client.post("/rooms/bulk", json={"count": 1, "language": "x" * 21}).status_code == 422
+    assert len(client.post("/rooms").json()["roomId"]) == 8
+
+
+def test_batch_lookup(table):
+    client = TestClient(app)
+    made = client.post("/rooms/bulk", json={"count": 4}).json()["roomIds"]
+
+    # blanks and repeats are dropped, and rooms come back in the order asked for
+    response = client.get("/rooms", params={"ids": ",".join([made[2], "nope", made[0], " ", made[2]])})
+    assert response.status_code == 200
+    assert [room["roomId"] for room in response.json()["rooms"]] == [made[2], made[0]]
+    assert response.json()["missing"] == ["nope"]
+
+    # cached ids, found or not, are not queried again
+    table.looked_up.clear()
+    response = client.get("/rooms", params={"ids": ",".join([made[0], made[1], "nope"])})
+    assert response.json()["missing"] == ["nope"]
+    assert table.looked_up == [[made[1]]]
+
+    assert client.get("/rooms", params={"ids": ",".join(f"r{n}" for n in range(1001))}).status_code == 400
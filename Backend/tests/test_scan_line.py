@@ -0,0 +1,30 @@
+from app.services.suggestions.registry import get_engine
+import pytest
+
+
+@pytest.mark.parametrize("line, names", [
+    ("let x = 1, y = 2", ["x", "y"]),
+    ("const a = f(1, 2), b = [3, 4], c = { d: 5, e }", ["a", "b", "c"]),
+    ("var s = 'a, t = 1', u", ["s", "u"]),
+    ("let i, j, k;", ["i", "j", "k"]),
+    ("const { a, b: renamed, c = 1 } = obj, [first, ...rest] = list", ["a", "renamed", "c", "first", "rest"]),
+    ("export const handler = async (req, res) => {", ["handler"]),
+    ("let count: Map<string, number> = new Map(), total = 0", ["count", "total"]),
+    ("import Default, { named as alias, other } from 'module'", ["Default", "alias", "other"]),
+    ("export default async function* generate() {", ["generate"]),
+    ("export abstract class Shape {", ["Shape"]),
+    ("for (let i = 0, n = 3; i < n; i++) {", []),
+])
+def test_javascript_definitions(line, names):
+    assert get_engine("typescript").scan_line(line) == names
+
+
+@pytest.mark.parametrize("language, line, names", [
+    ("python", "def compute_total(x):", ["compute_total"]),
+    ("python", "    total, count = 0, 0", ["total", "count"]),
+    ("go", "func (s *Server) Handle(w http.ResponseWriter) {", ["Handle"]),
+    ("go", "var a, b = 1, 2", ["a", "b"]),
+    ("plaintext", "let x = 1", []),
+])
+def test_other_languages(language, line, names):
+    assert get_engine(language).scan_line(line) == names
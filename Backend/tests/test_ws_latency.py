@@ -0,0 +1,71 @@
+from app.api.autocomplete import suggestion_pool
+from app.main import app
+from tests.wsclient import WebSocketClient
+import asyncio
+import statistics
+import time
+
+# 10,000 lines of definitions for the symbol index, then one long line the cache skips
+DOCUMENT = "".join(f"def function_{n}(value):\n    return value + {n}\n" for n in range(5_000)) + "result = " + "f(x) " * 2_000
+LOADERS = 80
+PINGS = 40
+
+
+async def ping_times(client: WebSocketClient, count: int):
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await client.send_json({"type": "PING", "roomId": "busy"})
+        await client.receive_type("PONG")
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.005)
+    return samples
+
+
+async def request_suggestions(client: WebSocketClient, stop: asyncio.Event):
+    request = 0
+    while not stop.is_set():
+        request += 1
+        # a different point in the long line each time, so every request reaches the pool
+        await client.send_json({"type": "AUTOCOMPLETE_REQUEST", "roomId": "busy", "payload": {
+            "requestId": request, "cursor": len(DOCUMENT) - request % 5_000,
+        }})
+        while True:
+            message = await client.receive_json()
+            if message["type"] == "ERROR" or (message["type"] == "AUTOCOMPLETE_RESULT" and message["payload"]["done"]):
+                break
+
+
+def test_echo_latency_stays_flat_while_autocomplete_is_saturated(fake_db, room_manager):
+    fake_db.rooms["busy"] = (DOCUMENT, "python")
+
+    async def main():
+        await room_manager.start()
+        probe = WebSocketClient(app, "/ws/busy")
+        await probe.connect()
+        idle = await ping_times(probe, PINGS)
+
+        loaders = [WebSocketClient(app, "/ws/busy") for _ in range(LOADERS)]
+        await asyncio.gather(*(loader.connect() for loader in loaders))
+        rejected = suggestion_pool.stats()["rejected"]
+        stop = asyncio.Event()
+        load = [asyncio.create_task(request_suggestions(loader, stop)) for loader in loaders]
+        # the first requests also build the room's symbol index
+        await asyncio.sleep(0.2)
+        busy = await ping_times(probe, PINGS)
+        stop.set()
+        await asyncio.gather(*load)
+
+        # the pool turned work away rather than queue it, and the loop kept answering
+        assert suggestion_pool.stats()["rejected"] > rejected
+        assert room_manager.rooms["busy"].symbols is not None
+        # PONGs wait behind the loaders' own traffic on this loop, but never behind a
+        # suggestion or an index build
+        assert statistics.median(idle) < 0.005
+        assert statistics.median(busy) < 0.025
+        assert max(busy) < 0.25
+
+        await asyncio.gather(*(client.close() for client in [probe, *loaders]))
+        await room_manager.stop()
+
+    asyncio.run(main())
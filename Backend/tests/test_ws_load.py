@@ -0,0 +1,32 @@
+from app.main import app
+from tests.wsclient import WebSocketClient
+import asyncio
+
+ROOMS = 20
+SOCKETS = 1000
+
+
+def test_thousand_sockets_take_one_db_checkout_per_room_load(fake_db, room_manager):
+    fake_db.load_delay = 0.01
+    for n in range(ROOMS):
+        fake_db.rooms[f"load{n}"] = ("print('hello')\n", "python")
+
+    async def main():
+        await room_manager.start()
+        clients = [WebSocketClient(app, f"/ws/load{n % ROOMS}") for n in range(SOCKETS)]
+        inits = await asyncio.gather(*(client.connect() for client in clients))
+        assert all(init["type"] == "INIT" and init["payload"]["code"] == "print('hello')\n" for init in inits)
+
+        # joins of a cold room share one load, which is the only checkout; connected
+        # sockets hold none
+        assert room_manager.stats()["connections"] == SOCKETS
+        assert fake_db.loads == ROOMS
+        assert fake_db.checkouts == ROOMS
+        assert fake_db.in_use == 0
+
+        await asyncio.gather(*(client.close() for client in clients))
+        assert room_manager.stats()["connections"] == 0
+        assert fake_db.in_use == 0
+        await room_manager.stop()
+
+    asyncio.run(main())
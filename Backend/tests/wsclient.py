@@ -0,0 +1,55 @@
+from typing import Sequence
+import asyncio
+import json
+
+
+class WebSocketClient:
+    """
+    One WebSocket session against an ASGI app, run on the test's own event loop. Unlike
+    TestClient it needs no thread per socket, so a test can hold a thousand of them.
+    """
+
+    def __init__(self, app, url: str, subprotocols: Sequence[str] = ()):
+        path, _, query = url.partition("?")
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+            "subprotocols": list(subprotocols),
+        }
+        self.to_app: asyncio.Queue = asyncio.Queue()
+        self.from_app: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(app(scope, self.to_app.get, self.from_app.put))
+
+    async def connect(self) -> dict:
+        """Open the socket and return the INIT message."""
+        await self.to_app.put({"type": "websocket.connect"})
+        accepted = await self.from_app.get()
+        assert accepted["type"] == "websocket.accept", accepted
+        return await self.receive_json()
+
+    async def send_json(self, message: dict):
+        await self.to_app.put({"type": "websocket.receive", "text": json.dumps(message)})
+
+    async def receive_json(self) -> dict:
+        message = await self.from_app.get()
+        assert message["type"] == "websocket.send", message
+        return json.loads(message["text"])
+
+    async def receive_type(self, message_type: str) -> dict:
+        """Skip messages until one of `message_type` arrives."""
+        while True:
+            message = await self.receive_json()
+            if message["type"] == message_type:
+                return message
+
+    async def close(self):
+        await self.to_app.put({"type": "websocket.disconnect", "code": 1000})
+        await self.task
@@ -25,12 +25,10 @@ export default function CodeEditor() {
   const handleEditorChange = useCallback(
     (value?: string) => {
       if (value !== undefined) {
-        setLocalCode(value); // update local state only
-        // debounce Redux update
-        if (debounceTimer.current) clearTimeout(debounceTimer.current);
-        debounceTimer.current = window.setTimeout(() => {
-          dispatch(updateCode(value));
-        }, 500); // adjust debounce time as needed
+        setLocalCode(value);
+        // straight to Redux: remote patches are rebased onto the store's code, so it
+        // must hold every keystroke; useWebSocket debounces what goes on the wire
+        dispatch(updateCode(value));
       }
     },
     [dispatch]
@@ -1,8 +1,13 @@
-import { useEffect, useRef } from "react";
+import { useCallback, useEffect, useRef } from "react";
+import { useStore } from "react-redux";
 import { useAppDispatch, useAppSelector } from "../store";
-import { updateCode, setCursor, setConnectionCount } from "../store/roomSlice";
+import type { RootState } from "../store";
+import { updateCode, setConnectionCount } from "../store/roomSlice";
+import { Op, apply, diff, toEdits, toOps, transform } from "../utils/ot";
 
 const WS_BASE_URL = import.meta.env.VITE_WS_URL || "ws://localhost:8000";
+// Local edits are sent as one CODE_PATCH after this long without typing
+const PATCH_DEBOUNCE_MS = 500;
 
 interface WebSocketMessage {
   type: string;
@@ -17,14 +22,52 @@ interface WebSocketMessage {
 
 export const useWebSocket = (roomId: string) => {
   const dispatch = useAppDispatch();
+  // read in message handlers, so they always see the latest local edits
+  const store = useStore<RootState>();
   const { code, cursor } = useAppSelector((state) => state.room);
   const wsRef = useRef<WebSocket | null>(null);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const reconnectAttempts = useRef(0);
   const maxReconnectAttempts = 5;
-  const isLocalUpdateRef = useRef(false);
-  const lastSentCodeRef = useRef<string>("");
   const debounceTimeoutRef = useRef<NodeJS.Timeout | null>(null);
+  const userIdRef = useRef<string | null>(null);
+
+  // One patch in flight at a time (see Backend/app/core/ot.py): the document as of the
+  // last server version we know, that version (null until INIT), and the ops sent
+  // against it that the server has not acknowledged yet. Local edits beyond those are
+  // the diff between shadow + in-flight ops and the editor's code.
+  const shadowRef = useRef("");
+  const versionRef = useRef<number | null>(null);
+  const inFlightRef = useRef<Op[] | null>(null);
+
+  // Resets to the server's copy; unsent local edits are dropped
+  const resetTo = useCallback(
+    (serverCode: string, version: number) => {
+      shadowRef.current = serverCode;
+      versionRef.current = version;
+      inFlightRef.current = null;
+      dispatch(updateCode(serverCode));
+    },
+    [dispatch]
+  );
+
+  const sendPendingEdits = useCallback(() => {
+    const ws = wsRef.current;
+    if (!ws || ws.readyState !== WebSocket.OPEN || versionRef.current === null || inFlightRef.current) {
+      return;
+    }
+    const { code: localCode, cursor: localCursor } = store.getState().room;
+    const ops = diff(shadowRef.current, localCode);
+    if (!ops.length) return;
+    inFlightRef.current = ops;
+    ws.send(
+      JSON.stringify({
+        type: "CODE_PATCH",
+        roomId: roomId,
+        payload: { version: versionRef.current, edits: toEdits(ops), cursor: localCursor },
+      })
+    );
+  }, [roomId, store]);
 
   useEffect(() => {
     if (!roomId) return;
@@ -45,8 +88,11 @@ export const useWebSocket = (roomId: string) => {
 
             switch (message.type) {
               case "INIT":
+                if (message.userId) {
+                  userIdRef.current = message.userId;
+                }
                 if (message.payload?.code !== undefined) {
-                  dispatch(updateCode(message.payload.code));
+                  resetTo(message.payload.code, message.payload.version ?? 0);
                 }
                 if (message.connectionCount !== undefined) {
                   dispatch(setConnectionCount(message.connectionCount));
@@ -54,17 +100,58 @@ export const useWebSocket = (roomId: string) => {
                 break;
 
               case "CODE_UPDATE":
-                // Only update if this is not from our own local update
-                if (!isLocalUpdateRef.current && message.payload?.code !== undefined) {
-                  dispatch(updateCode(message.payload.code));
+                // Someone replaced the whole document. A patch of ours still in flight
+                // can't be rebased over that and gets a SNAPSHOT, so keep waiting for it.
+                if (message.payload?.code !== undefined) {
+                  const inFlight = inFlightRef.current;
+                  resetTo(message.payload.code, message.payload.version);
+                  inFlightRef.current = inFlight;
                 }
-                // Reset the flag after processing
-                isLocalUpdateRef.current = false;
                 if (message.connectionCount !== undefined) {
                   dispatch(setConnectionCount(message.connectionCount));
                 }
                 break;
 
+              case "CODE_PATCH": {
+                // Someone else's edits, against the version before message.payload.version
+                if (versionRef.current === null) break;
+                if (message.payload.version !== versionRef.current + 1) {
+                  // missed an update: reconnecting gets a fresh INIT
+                  console.warn("Out of sync with the server, reconnecting");
+                  ws.close();
+                  break;
+                }
+                const remote = toOps(message.payload.edits);
+                const inFlight = inFlightRef.current ?? [];
+                const pending = diff(apply(shadowRef.current, inFlight), store.getState().room.code);
+                // the server's ops win ties, as they do when it rebases our patch
+                const [inFlightAfter, remoteAfterInFlight] = transform(inFlight, remote);
+                const [, remoteLocal] = transform(pending, remoteAfterInFlight);
+                shadowRef.current = apply(shadowRef.current, remote);
+                versionRef.current = message.payload.version;
+                if (inFlightRef.current) inFlightRef.current = inFlightAfter;
+                dispatch(updateCode(apply(store.getState().room.code, remoteLocal)));
+                break;
+              }
+
+              case "CODE_PATCH_ACK":
+                // Our patch is in, rebased exactly as inFlightRef was; send what piled up since
+                if (inFlightRef.current) {
+                  shadowRef.current = apply(shadowRef.current, inFlightRef.current);
+                  inFlightRef.current = null;
+                }
+                versionRef.current = message.payload.version;
+                sendPendingEdits();
+                break;
+
+              case "SNAPSHOT":
+                // Whole document, sent in place of updates this client fell too far behind on,
+                // or of the ACK for a patch too old to rebase
+                if (message.payload?.code !== undefined) {
+                  resetTo(message.payload.code, message.payload.version);
+                }
+                break;
+
               case "CURSOR_UPDATE":
                 if (message.payload?.cursor !== undefined) {
                   // Update cursor from other users (optional - you might want to show their cursors)
@@ -72,6 +159,15 @@ export const useWebSocket = (roomId: string) => {
                 }
                 break;
 
+              case "CURSOR_BATCH":
+                // Latest cursor per user since the last batch; our own entry is included
+                for (const entry of message.payload?.cursors ?? []) {
+                  if (entry.userId !== userIdRef.current) {
+                    console.log("Cursor update from user:", entry.userId, entry.cursor);
+                  }
+                }
+                break;
+
               case "USER_JOINED":
                 if (message.connectionCount !== undefined) {
                   dispatch(setConnectionCount(message.connectionCount));
@@ -109,6 +205,9 @@ export const useWebSocket = (roomId: string) => {
         ws.onclose = () => {
           console.log("WebSocket disconnected");
           wsRef.current = null;
+          // nothing is sent until the next INIT says where the document is
+          versionRef.current = null;
+          inFlightRef.current = null;
 
           // Attempt to reconnect
           if (reconnectAttempts.current < maxReconnectAttempts) {
@@ -139,16 +238,12 @@ export const useWebSocket = (roomId: string) => {
         wsRef.current = null;
       }
     };
-  }, [roomId, dispatch]);
+  }, [roomId, dispatch, resetTo, sendPendingEdits, store]);
 
-  // Send code updates when code changes (debounced) - separate effect
+  // Send local edits as a CODE_PATCH once typing pauses - separate effect. Remote edits
+  // change `code` too, but they are in the shadow already, so on their own send nothing.
   useEffect(() => {
-    if (!roomId || !wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) {
-      return;
-    }
-
-    // Don't send if code hasn't actually changed
-    if (code === lastSentCodeRef.current) {
+    if (!roomId) {
       return;
     }
 
@@ -157,30 +252,14 @@ export const useWebSocket = (roomId: string) => {
       clearTimeout(debounceTimeoutRef.current);
     }
 
-    // Debounce code updates (send after 500ms of no changes)
-    debounceTimeoutRef.current = setTimeout(() => {
-      if (wsRef.current?.readyState === WebSocket.OPEN && roomId && code !== lastSentCodeRef.current) {
-        isLocalUpdateRef.current = true;
-        lastSentCodeRef.current = code;
-        
-        const message = {
-          type: "CODE_UPDATE",
-          roomId: roomId,
-          payload: {
-            code: code,
-            cursor: cursor,
-          },
-        };
-        wsRef.current.send(JSON.stringify(message));
-      }
-    }, 500);
+    debounceTimeoutRef.current = setTimeout(sendPendingEdits, PATCH_DEBOUNCE_MS);
 
     return () => {
       if (debounceTimeoutRef.current) {
         clearTimeout(debounceTimeoutRef.current);
       }
     };
-  }, [roomId, code, cursor]);
+  }, [roomId, code, sendPendingEdits]);
 
   // Send cursor updates
   useEffect(() => {
@@ -0,0 +1,156 @@
+// Client half of the CODE_PATCH protocol: the same normalize/transform as
+// Backend/app/core/ot.py, so a client rebases its pending edits exactly as the server
+// rebases patches. Offsets and lengths count Unicode code points, like the server's
+// Python strings, not the UTF-16 units of JavaScript strings.
+
+// [offset, deleteLength, insertText]; after normalize() either a pure delete or a pure insert
+export type Op = [number, number, string];
+
+export interface PatchEdit {
+  offset: number;
+  deleteLength: number;
+  insertText: string;
+}
+
+export const toOps = (edits: PatchEdit[]): Op[] =>
+  edits.map((edit) => [edit.offset, edit.deleteLength, edit.insertText]);
+
+export const toEdits = (ops: Op[]): PatchEdit[] =>
+  ops.map(([offset, deleteLength, insertText]) => ({ offset, deleteLength, insertText }));
+
+const codePoints = (text: string): number => {
+  let count = 0;
+  for (let i = 0; i < text.length; i++) {
+    const unit = text.charCodeAt(i);
+    // the low half of a surrogate pair belongs to the code point already counted
+    if (unit < 0xdc00 || unit > 0xdfff) count++;
+  }
+  return count;
+};
+
+// UTF-16 index of the code point at `offset`
+const unitIndex = (text: string, offset: number): number => {
+  let index = 0;
+  for (let n = 0; n < offset && index < text.length; n++) {
+    const unit = text.charCodeAt(index);
+    index += unit >= 0xd800 && unit <= 0xdbff ? 2 : 1;
+  }
+  return index;
+};
+
+// Split replace edits into pure deletes and inserts, dropping no-ops
+export const normalize = (edits: Op[]): Op[] => {
+  const ops: Op[] = [];
+  for (const [offset, deleteLength, insertText] of edits) {
+    if (deleteLength) ops.push([offset, deleteLength, ""]);
+    if (insertText) ops.push([offset, 0, insertText]);
+  }
+  return ops;
+};
+
+export const apply = (text: string, ops: Op[]): string => {
+  for (const [offset, deleteLength, insertText] of ops) {
+    const start = unitIndex(text, offset);
+    const end = start + unitIndex(text.slice(start), deleteLength);
+    text = text.slice(0, start) + insertText + text.slice(end);
+  }
+  return text;
+};
+
+// The ops turning `before` into `after`: one replace of the span between their common
+// prefix and suffix, normalized
+export const diff = (before: string, after: string): Op[] => {
+  if (before === after) return [];
+  const limit = Math.min(before.length, after.length);
+  let prefix = 0;
+  while (prefix < limit && before.charCodeAt(prefix) === after.charCodeAt(prefix)) prefix++;
+  // never split a surrogate pair
+  if (prefix > 0 && prefix < limit) {
+    const unit = before.charCodeAt(prefix - 1);
+    if (unit >= 0xd800 && unit <= 0xdbff) prefix--;
+  }
+  let suffix = 0;
+  while (
+    suffix < limit - prefix &&
+    before.charCodeAt(before.length - 1 - suffix) === after.charCodeAt(after.length - 1 - suffix)
+  ) {
+    suffix++;
+  }
+  if (suffix > 0) {
+    const unit = before.charCodeAt(before.length - suffix);
+    if (unit >= 0xdc00 && unit <= 0xdfff) suffix--;
+  }
+  const deleted = before.slice(prefix, before.length - suffix);
+  const inserted = after.slice(prefix, after.length - suffix);
+  return normalize([[codePoints(before.slice(0, prefix)), codePoints(deleted), inserted]]);
+};
+
+// the part of a delete that survives another delete, in post-delete coordinates
+const shrinkDelete = (offset: number, length: number, otherOffset: number, otherLength: number): Op[] => {
+  const end = offset + length;
+  const otherEnd = otherOffset + otherLength;
+  if (end <= otherOffset) return [[offset, length, ""]];
+  if (offset >= otherEnd) return [[offset - otherLength, length, ""]];
+  const remaining = length - (Math.min(end, otherEnd) - Math.max(offset, otherOffset));
+  return remaining ? [[Math.min(offset, otherOffset), remaining, ""]] : [];
+};
+
+// [a', b']: a' applies after b, b' after a; b's text goes first at the same offset
+const transformPair = (a: Op, b: Op): [Op[], Op[]] => {
+  const [aOffset, aDelete, aText] = a;
+  const [bOffset, bDelete, bText] = b;
+  const aLength = codePoints(aText);
+  const bLength = codePoints(bText);
+
+  if (aText && bText) {
+    if (aOffset < bOffset) return [[a], [[bOffset + aLength, 0, bText]]];
+    return [[[aOffset + bLength, 0, aText]], [b]];
+  }
+
+  if (aText) {
+    const bEnd = bOffset + bDelete;
+    if (aOffset <= bOffset) return [[a], [[bOffset + aLength, bDelete, ""]]];
+    if (aOffset >= bEnd) return [[[aOffset - bDelete, 0, aText]], [b]];
+    // insert lands inside the deleted range: keep it, delete around it
+    return [
+      [[bOffset, 0, aText]],
+      [[bOffset, aOffset - bOffset, ""], [bOffset + aLength, bEnd - aOffset, ""]],
+    ];
+  }
+
+  if (bText) {
+    const aEnd = aOffset + aDelete;
+    if (bOffset <= aOffset) return [[[aOffset + bLength, aDelete, ""]], [b]];
+    if (bOffset >= aEnd) return [[a], [[bOffset - aDelete, 0, bText]]];
+    return [
+      [[aOffset, bOffset - aOffset, ""], [aOffset + bLength, aEnd - bOffset, ""]],
+      [[aOffset, 0, bText]],
+    ];
+  }
+
+  return [shrinkDelete(aOffset, aDelete, bOffset, bDelete), shrinkDelete(bOffset, bDelete, aOffset, aDelete)];
+};
+
+// [a', b'] for two op sequences made against the same document; b wins ties
+export const transform = (aOps: Op[], bOps: Op[]): [Op[], Op[]] => {
+  if (!aOps.length || !bOps.length) return [aOps.slice(), bOps.slice()];
+  if (aOps.length === 1 && bOps.length === 1) return transformPair(aOps[0], bOps[0]);
+  if (bOps.length === 1) {
+    let bParts = bOps;
+    const aOut: Op[] = [];
+    for (const a of aOps) {
+      const [aParts, rest] = transform([a], bParts);
+      aOut.push(...aParts);
+      bParts = rest;
+    }
+    return [aOut, bParts];
+  }
+  let aParts = aOps;
+  const bOut: Op[] = [];
+  for (const b of bOps) {
+    const [rest, bParts] = transform(aParts, [b]);
+    aParts = rest;
+    bOut.push(...bParts);
+  }
+  return [aParts, bOut];
+};